@@ -1,18 +1,174 @@
-from sqlalchemy import create_engine
+import functools
+import inspect
+import os
+import sqlite3
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 
 # Load environment variables from .env
 load_dotenv()
 
-# Database URL from .env
-DATABASE_URL = "sqlite:///inventory.db"
+# Database URL from .env: SQLite or PostgreSQL (e.g. postgresql://...)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///inventory.db")
+
+# Usage writes rely on upserts (ON CONFLICT) and RETURNING, and analytics on
+# each backend's date functions, so only these are supported
+SUPPORTED_BACKENDS = ("sqlite", "postgresql")
+MIN_SQLITE_VERSION = (3, 35)  # RETURNING
+
+# SQLite profile. WAL lets readers run alongside the single writer, and
+# synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Wait for the write lock instead of failing
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))  # Page cache per connection
+
+# SQLite has one writer at a time, so a big pool only adds lock contention:
+# keep enough connections for concurrent WAL readers and queue the rest.
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "10"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Async handlers on aiosqlite/asyncpg: "true", "false" or "auto" (PostgreSQL
+# only). They pay off when requests wait on a network database; against a
+# local SQLite file benchmarks/bench_async_load.py measured them slower than
+# the sync handlers, so SQLite stays on the sync stack unless asked.
+ASYNC_DB = os.getenv("ASYNC_DB", "auto").lower()
+
+# Pool instrumentation (see pool_debug.py); off by default, it records a
+# stack trace on every checkout
+DB_POOL_DEBUG = os.getenv("DB_POOL_DEBUG", "false").lower() in ("1", "true", "yes")
+DB_POOL_DEBUG_HOLD_SECONDS = float(os.getenv("DB_POOL_DEBUG_HOLD_SECONDS", "5"))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    # Off by default in SQLite; the models rely on ON DELETE CASCADE
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def check_database_url(url: str):
+    """
+    Fail at startup, rather than on the first write, for a database the
+    app can't run on.
+    """
+    backend = make_url(url).get_backend_name()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported database {backend!r} in DATABASE_URL; use one of {', '.join(SUPPORTED_BACKENDS)}")
+    if backend == "sqlite" and sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise ValueError(f"SQLite {sqlite3.sqlite_version} is too old; {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required")
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    Engine with the pool and connection settings that suit `url`'s backend.
+    """
+    check_database_url(url)
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=SQLITE_POOL_SIZE,
+            max_overflow=SQLITE_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+
+
+def async_db_enabled(url: str = DATABASE_URL, setting: str = ASYNC_DB) -> bool:
+    if setting == "auto":
+        return make_url(url).get_backend_name() == "postgresql"
+    return setting in ("1", "true", "yes")
+
+
+# Async drivers for the same databases
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+', 1)[0], scheme)}://{rest}"
+
+
+def create_async_db_engine(url: str = DATABASE_URL):
+    check_database_url(url)
+    async_url = async_database_url(url)
+    if async_url.startswith("sqlite"):
+        engine = create_async_engine(
+            async_url,
+            pool_size=SQLITE_POOL_SIZE,
+            max_overflow=SQLITE_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+        return engine
+    return create_async_engine(
+        async_url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+
+
+class AppSession(Session):
+    """
+    The app's sessions (SessionLocal, AsyncSessionLocal). Listeners that
+    track the app's own writes, like the analytics data version, attach
+    here rather than to every Session in the process.
+    """
+
 
 # SQLAlchemy engine and session factory
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, pool_size=30, max_overflow=50)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_db_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AppSession)
+
+# Async engine and session factory, only built when the async stack is on.
+# Objects stay usable after commit so handlers can return them without
+# another query.
+ASYNC_DB_ENABLED = async_db_enabled()
+async_engine = create_async_db_engine(DATABASE_URL) if ASYNC_DB_ENABLED else None
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, sync_session_class=AppSession) if ASYNC_DB_ENABLED else None
+
+# Every engine the app runs queries on
+engines = (engine,) if async_engine is None else (engine, async_engine.sync_engine)
+
+pool_monitor = None
+if DB_POOL_DEBUG:
+    from .pool_debug import PoolMonitor
+
+    pool_monitor = PoolMonitor(hold_threshold=DB_POOL_DEBUG_HOLD_SECONDS)
+    pool_monitor.attach(engine, "sync")
+    if async_engine is not None:
+        pool_monitor.attach(async_engine.sync_engine, "async")
 
 # Base class for models
 Base = declarative_base()
@@ -28,6 +184,58 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency; the session is closed on every path, including errors
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def db_handler(handler):
+    """
+    Serve a sync handler taking `db: Session = Depends(get_db)` on the
+    configured stack. By default FastAPI runs it on the threadpool; with the
+    async stack on, an async endpoint runs the same code on an AsyncSession
+    through run_sync instead.
+    """
+    if not ASYNC_DB_ENABLED:
+        @functools.wraps(handler)
+        def endpoint(**kwargs):
+            try:
+                return handler(**kwargs)
+            finally:
+                # Give the connection back before FastAPI validates the
+                # response on the threadpool: with every thread taken by
+                # handlers waiting for a connection, that would deadlock
+                kwargs["db"].close()
+        return endpoint
+    signature = inspect.signature(handler)
+
+    async def endpoint(db: AsyncSession, **kwargs):
+        return await db.run_sync(lambda session: handler(db=session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=[
+        parameter.replace(annotation=AsyncSession, default=Depends(get_async_db)) if parameter.name == "db" else parameter
+        for parameter in signature.parameters.values()
+    ])
+    endpoint.__name__, endpoint.__qualname__, endpoint.__doc__ = handler.__name__, handler.__qualname__, handler.__doc__
+    return endpoint
+
+
+async def run_in_session(work, *args, **kwargs):
+    """
+    work(session, *args, **kwargs) on a short-lived session, for async
+    handlers: through run_sync on the async stack, on the threadpool
+    otherwise. Returned objects stay usable after commit.
+    """
+    if ASYNC_DB_ENABLED:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(work, *args, **kwargs)
+
+    def run():
+        with SessionLocal(expire_on_commit=False) as db:
+            return work(db, *args, **kwargs)
+    return await run_in_threadpool(run)
+
 # Initialize database (for migrations or setup)
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -1,7 +1,14 @@
-from sqlalchemy.orm import Session
-from ..database.db import engine, Base
+from ..database.db import AppSession, engine, Base
 from ..models.supplies import Supplies, UsageHistory
 from ..models.users import Users
+from ..models.pricing import SupplyPriceHistory
+from ..models.alerts import AlertThreshold
+from ..models.forecasts import ForecastSnapshot
+from ..models.data_version import DataVersionCounter
+from ..models.leases import JobLease
+from ..services.alert_state import sweep_alert_state
+from ..services.forecasts import refresh_forecasts
+from ..services.rollups import apply_usage_to_rollups, ensure_rollups
 from dotenv import load_dotenv
 from ..utils.auth import hash_password
 from datetime import datetime, timedelta
@@ -14,8 +21,16 @@ def init_db():
     # Create tables
     Base.metadata.create_all(bind=engine)
 
+    # create_all skips indexes added to tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
     # Create a new database session
-    with Session(engine) as session:
+    with AppSession(engine) as session:
+        # Backfill rollups for usage recorded before they existed
+        ensure_rollups(session)
+
         # Add sample supplies
         
         supplies = [
@@ -179,10 +194,16 @@ def init_db():
         ]
 
         session.add_all(usage)
+        session.flush()
+        apply_usage_to_rollups(session, [(u.supply_id, u.quantity_used, u.timestamp) for u in usage])
 
         # Commit changes
         session.commit()
 
+        # Evaluate alerts and forecasts for the sample data
+        sweep_alert_state(session)
+        refresh_forecasts(session)
+
 if __name__ == "__main__":
     init_db()
     print("Database initialized with sample data.")
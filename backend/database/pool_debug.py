@@ -0,0 +1,87 @@
+"""
+Connection pool instrumentation for debugging session leaks.
+
+Enabled with DB_POOL_DEBUG=true. Every checkout records when and where
+(stack trace) a connection was taken; every checkin feeds a duration
+histogram. Connections held longer than DB_POOL_DEBUG_HOLD_SECONDS are
+logged with the stack that checked them out, and GET /debug/pool lists
+the ones still out, which is where a leaked session shows up.
+"""
+import logging
+import threading
+import time
+import traceback
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the checkout-duration histogram buckets
+HISTOGRAM_BOUNDS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class PoolMonitor:
+    def __init__(self, hold_threshold: float = 5.0):
+        self.hold_threshold = hold_threshold
+        self.checkouts = 0
+        self.long_held = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self._checked_out = {}  # id(connection record) -> (engine name, started, stack)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def attach(self, engine, name: str):
+        """
+        Instrument `engine`'s pool (for an AsyncEngine pass .sync_engine).
+        """
+        listeners = [
+            ("checkout", lambda dbapi_connection, record, proxy: self._on_checkout(name, record)),
+            ("checkin", lambda dbapi_connection, record: self._on_checkin(record)),
+        ]
+        for identifier, listener in listeners:
+            event.listen(engine, identifier, listener)
+        self._listeners.append((engine, listeners))
+
+    def detach(self):
+        for engine, listeners in self._listeners:
+            for identifier, listener in listeners:
+                event.remove(engine, identifier, listener)
+        self._listeners.clear()
+
+    def _on_checkout(self, name, record):
+        stack = "".join(traceback.format_stack(limit=25)[:-2])
+        with self._lock:
+            self.checkouts += 1
+            self._checked_out[id(record)] = (name, time.monotonic(), stack)
+
+    def _on_checkin(self, record):
+        with self._lock:
+            entry = self._checked_out.pop(id(record), None)
+            if entry is None:
+                return
+            name, started, stack = entry
+            held = time.monotonic() - started
+            self.histogram[bisect_left(HISTOGRAM_BOUNDS, held)] += 1
+            if held > self.hold_threshold:
+                self.long_held += 1
+        if held > self.hold_threshold:
+            logger.warning("%s connection held for %.2fs, checked out at:\n%s", name, held, stack)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            outstanding = sorted(self._checked_out.values(), key=lambda entry: entry[1])
+            labels = [f"<={bound}s" for bound in HISTOGRAM_BOUNDS] + [f">{HISTOGRAM_BOUNDS[-1]}s"]
+            return {
+                "checked_out": len(outstanding),
+                "checkouts": self.checkouts,
+                "long_held": self.long_held,
+                "hold_threshold_seconds": self.hold_threshold,
+                "checkout_duration_histogram": dict(zip(labels, self.histogram)),
+                "held_too_long": [
+                    {"engine": name, "held_seconds": round(now - started, 3), "stack": stack}
+                    for name, started, stack in outstanding
+                    if now - started > self.hold_threshold
+                ],
+            }
@@ -3,7 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from .routes.inventory import router as inventory_router
 from .routes.auth import router as auth_router
 from .utils.error_handlers import register_error_handlers
+from .database.db import pool_monitor
 from .database.init_db import init_db
+from .services.alert_state import alert_sweeper
+from .services.forecasts import forecast_scheduler
+from .services.report_jobs import report_jobs
+from .services.usage_buffer import usage_buffer
+from .utils.passwords import password_pool
 
 # Initialize FastAPI app
 app = FastAPI(title="Smart Office Inventory API")
@@ -15,6 +21,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Forecast-Computed-At"],
 )
 
 # Include routers
@@ -28,11 +35,30 @@ register_error_handlers(app)
 @app.on_event("startup")
 def startup_event():
     init_db()
+    alert_sweeper.start()
+    forecast_scheduler.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Add any cleanup logic if necessary
-    pass
+    password_pool.shutdown()
+    report_jobs.shutdown()
+    alert_sweeper.shutdown()
+    forecast_scheduler.shutdown()
+    # Commit buffered usage events before the process exits
+    if usage_buffer is not None:
+        usage_buffer.shutdown()
+
+# Pool statistics and long-held connections (DB_POOL_DEBUG=true only)
+if pool_monitor is not None:
+    @app.get("/debug/pool")
+    def pool_stats():
+        return pool_monitor.snapshot()
+
+# Write-behind buffer depth and flush latency (USAGE_BUFFER=true only)
+if usage_buffer is not None:
+    @app.get("/debug/usage-buffer")
+    def usage_buffer_stats():
+        return usage_buffer.stats()
 
 # Root endpoint
 @app.get("/")
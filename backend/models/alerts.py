@@ -0,0 +1,54 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from ..database.db import Base
+from datetime import datetime
+
+# Per-category waste alert thresholds. A NULL column (or a category without
+# a row) falls back to the defaults in services/alerts.py.
+class AlertThreshold(Base):
+    __tablename__ = "alert_thresholds"
+
+    category = Column(String, primary_key=True)
+    overstock_above = Column(Integer, nullable=True)
+    low_stock_below = Column(Integer, nullable=True)
+    expiry_days = Column(Integer, nullable=True)  # "Nearing expiration" window
+    slow_usage_ratio = Column(Float, nullable=True)  # Weekly usage below this share of stock is slow
+
+# Currently active alerts, one row per supply and rule. Kept up to date by
+# the writes that change a supply (services/alert_state.py) plus a periodic
+# sweep, so GET /alerts is a plain read.
+class AlertState(Base):
+    __tablename__ = "alert_state"
+
+    supply_id = Column(Integer, ForeignKey("supplies.id", ondelete="CASCADE"), primary_key=True)
+    alert = Column(String, primary_key=True)
+    name = Column(String)
+    quantity = Column(Integer)
+    expiration_date = Column(DateTime, nullable=True)
+    recent_weekly_usage = Column(Integer, nullable=True)
+    raised_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+# Append-only log of alert changes; its id is the GET /alerts?since= cursor.
+# AUTOINCREMENT so ids are never reused after old events are pruned.
+class AlertEvent(Base):
+    __tablename__ = "alert_events"
+
+    id = Column(Integer, primary_key=True)
+    supply_id = Column(Integer, nullable=False)
+    alert = Column(String, nullable=False)
+    state = Column(String, nullable=False)  # raised, updated or cleared
+    name = Column(String)
+    quantity = Column(Integer)
+    expiration_date = Column(DateTime, nullable=True)
+    recent_weekly_usage = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# One row per full re-evaluation of alert_state (startup build and sweeps)
+class AlertSweep(Base):
+    __tablename__ = "alert_sweeps"
+
+    id = Column(Integer, primary_key=True)
+    finished_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    changes = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,31 @@
+from uuid import uuid4
+
+from sqlalchemy import BigInteger, Column, Integer, Sequence, String, event, insert
+from ..database.db import Base
+
+
+def new_epoch() -> str:
+    return uuid4().hex[:8]
+
+
+# The analytics data version (services/data_version.py), shared by every
+# worker and CLI on the database. One row, bumped by each transaction that
+# writes something analytics read. The epoch is drawn when the table is
+# created, so a recreated database never reuses an old version's ETags.
+# PostgreSQL counts in data_version_seq instead of the value column.
+class DataVersionCounter(Base):
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    epoch = Column(String, nullable=False)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+def _insert_counter(table, connection, **kw):
+    connection.execute(insert(table).values(id=1, epoch=new_epoch(), value=0))
+
+
+event.listen(DataVersionCounter.__table__, "after_create", _insert_counter)
+
+# Only created on backends with sequences
+data_version_sequence = Sequence("data_version_seq", metadata=Base.metadata)
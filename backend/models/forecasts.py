@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from ..database.db import Base
+
+# Usage forecast and trend statistics per supply, recomputed in bulk by the
+# nightly job (services/forecasts.py). Every row of a snapshot shares its
+# computed_at.
+class ForecastSnapshot(Base):
+    __tablename__ = "forecast_snapshots"
+
+    supply_id = Column(Integer, ForeignKey("supplies.id", ondelete="CASCADE"), primary_key=True)
+    computed_at = Column(DateTime, nullable=False, index=True)
+    # Last 30 days: usage entries and spike-filtered average weekly usage
+    recent_entries = Column(Integer, nullable=False, default=0)
+    avg_weekly_usage = Column(Float, nullable=True)  # NULL when unused in the window
+    # All-time trend statistics, served by the usage-trends report
+    entries = Column(Integer, nullable=False, default=0)
+    average_usage = Column(Float, nullable=True)
+    min_usage = Column(Integer, nullable=True)
+    max_usage = Column(Integer, nullable=True)
+    std_dev = Column(Float, nullable=True)
+    variability = Column(String, nullable=True)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, DateTime, String
+from ..database.db import Base
+
+# Which process may run a background job (services/leases.py): one row per
+# job, held by `holder` until `expires_at`
+class JobLease(Base):
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer
+from ..database.db import Base
+from datetime import datetime
+
+# Time-versioned unit prices; the newest row effective at a given time wins
+class SupplyPriceHistory(Base):
+    __tablename__ = "supply_price_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    supply_id = Column(Integer, ForeignKey("supplies.id", ondelete="CASCADE"), nullable=False)
+    cost_per_unit = Column(Float, nullable=False)
+    effective_from = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_supply_price_history_supply_effective", "supply_id", "effective_from"),)
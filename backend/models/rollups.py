@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, Column, Date, ForeignKey, Integer, String
+from ..database.db import Base
+
+# Per-supply usage totals for one calendar day, maintained by record_usage
+class UsageDailyRollup(Base):
+    __tablename__ = "usage_daily_rollup"
+
+    supply_id = Column(Integer, ForeignKey("supplies.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    total_used = Column(BigInteger, nullable=False, default=0)
+    entries = Column(Integer, nullable=False, default=0)
+    sum_squares = Column(BigInteger, nullable=False, default=0)  # For stdev without the raw rows
+    min_used = Column(Integer, nullable=True)
+    max_used = Column(Integer, nullable=True)
+
+# Per-supply usage totals for one calendar month ("YYYY-MM")
+class UsageMonthlyRollup(Base):
+    __tablename__ = "usage_monthly_rollup"
+
+    supply_id = Column(Integer, ForeignKey("supplies.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String(7), primary_key=True, index=True)
+    total_used = Column(BigInteger, nullable=False, default=0)
+    entries = Column(Integer, nullable=False, default=0)
+    sum_squares = Column(BigInteger, nullable=False, default=0)
+    min_used = Column(Integer, nullable=True)
+    max_used = Column(Integer, nullable=True)
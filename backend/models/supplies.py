@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Float, Index, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from ..database.db import Base
 from datetime import datetime, timedelta
@@ -16,8 +16,20 @@ class Supplies(Base):
     primary_supplier = Column(String)
     cost_per_unit = Column(Float, nullable=True)  # ✅ New
 
-    # Relationship to UsageHistory
-    usage_history = relationship("UsageHistory", back_populates="supply", lazy="selectin", cascade="all, delete-orphan")
+    # Relationship to UsageHistory. Never loaded implicitly: a query that needs
+    # it must ask with .options(selectinload(Supplies.usage_history)).
+    # passive_deletes lets the ON DELETE CASCADE remove usage rows without
+    # loading them first.
+    usage_history = relationship(
+        "UsageHistory",
+        back_populates="supply",
+        lazy="raise_on_sql",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    # Covers category-filtered keyset pages (WHERE category = ? AND id > ? ORDER BY id)
+    __table_args__ = (Index("ix_supplies_category_id", "category", "id"),)
 
 # UsageHistory model
 class UsageHistory(Base):
@@ -1,18 +1,18 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from ..database.db import get_db
+from ..database.db import run_in_session
 from ..schemas.user import UserCreate, UserLogin, UserResponse
 from ..models.users import Users
-from ..utils.auth import create_jwt_token, get_current_user, get_user_by_email
+from ..utils.auth import create_jwt_token, get_current_user, get_user_by_email, invalidate_user, load_user
+from ..utils.passwords import password_pool
 from jose import JWTError, jwt
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 24 hours
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def require_admin(user: Users = Depends(get_current_user)):
@@ -32,16 +32,36 @@ def require_authenticated(request: Request, user: dict = Depends(get_current_use
 
 
 
+# Login/register use short sessions (run_in_session, load_user included) so
+# no connection is held while bcrypt runs on password_pool
+def _update_password_hash(db: Session, user_id: int, password_hash: str):
+    db.execute(update(Users).where(Users.id == user_id).values(password_hash=password_hash))
+    db.commit()
+
+def _create_user(db: Session, user: UserCreate, password_hash: str):
+    new_user = Users(first_name=user.first_name, last_name=user.last_name, username=user.username, password_hash=password_hash, role=user.role)
+    db.add(new_user)
+    db.commit()
+    db.refresh(new_user)
+    return new_user
+
 # POST /login: Authenticate user and return JWT token
 @router.post("/login")
-def login(user: UserLogin, response: Response = None):
-    db = next(get_db())
-    db_user = db.query(Users).filter(Users.username == user.username).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.password_hash):
+async def login(user: UserLogin, response: Response = None):
+    db_user = await load_user(user.username)
+    verified, new_hash = (False, None)
+    if db_user:
+        verified, new_hash = await password_pool.verify_and_update(user.password, db_user.password_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
         )
+    if new_hash:
+        # Stored hash used an old bcrypt cost; upgrade it now that we know the password
+        await run_in_session(_update_password_hash, db_user.id, new_hash)
+        # The cached row still carries the old hash
+        invalidate_user(db_user.username)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(db_user.id), "username": db_user.username, "first_name": db_user.first_name, "last_name": db_user.last_name, "role": db_user.role.value}, expires_delta=access_token_expires
@@ -56,7 +76,6 @@ def login(user: UserLogin, response: Response = None):
         samesite="lax"
     )
     # logger.info(f"User {user.email} logged in successfully")
-    db.close()
     return {"message": "Login successful"}
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -72,20 +91,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 # POST /register: Register user (admin only)
 @router.post("/register", response_model=UserResponse)
 # def register(user: UserCreate, current_user=Depends(require_admin)):
-def register(user: UserCreate):
-    db = next(get_db())
-    db_user = db.query(Users).filter(Users.username == user.username).first()
-    if db_user:
+async def register(user: UserCreate):
+    if await load_user(user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists",
         )
-    hashed_password = pwd_context.hash(user.password)
-    new_user = Users(first_name=user.first_name, last_name=user.last_name, username=user.username, password_hash=hashed_password, role=user.role)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    db.close()
+    hashed_password = await password_pool.hash(user.password)
+    new_user = await run_in_session(_create_user, user, hashed_password)
+    # Drop any cached "user does not exist" status for this username
+    invalidate_user(new_user.username)
     return new_user
 
 # GET /users/me: Return current user details
@@ -117,6 +132,6 @@ def logout():
     return response
 
 @router.get("/role/{username}")
-def get_user_role(username: str):
-    user = get_user_by_email(username)
+async def get_user_role(username: str):
+    user = await get_user_by_email(username)
     return {"role": user.role.value}
\ No newline at end of file
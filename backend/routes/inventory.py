@@ -1,23 +1,43 @@
 
-from collections import defaultdict
-from datetime import datetime
-from typing import Dict, List
+import asyncio
+import os
+from datetime import date
+from typing import Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi import Response, Query
-from fastapi.responses import StreamingResponse
-from sqlalchemy import extract, func
+from fastapi import Request, Response, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..database.db import get_db
-from ..schemas.supply import SupplyCreate, SupplyUpdate, UsageCreate
+from ..database.db import db_handler, get_db, run_in_session
+from ..schemas.alert import AlertThresholdResponse, AlertThresholdUpdate
+from ..schemas.report import ReportJobCreate, ReportJobResponse
+from ..schemas.supply import SupplyCreate, SupplyUpdate, UsageBatchItemResult, UsageBatchResponse, UsageCreate
+from ..models.alerts import AlertThreshold
 from ..models.supplies import Supplies, UsageHistory
 from ..routes.auth import require_admin, require_authenticated
 from ..services.recommendations import (
-    calculate_order_recommendation,
-    detect_waste_alerts,
+    calculate_savings_history,
     estimate_cost_savings,
-    get_dynamic_cost_per_unit,
 )
-from ..services.procurement import generate_usage_report_excel, generate_usage_report_pdf
+from ..services.alert_state import (
+    active_alerts,
+    alert_changes,
+    latest_event_id,
+    oldest_event_id,
+    refresh_alert_state,
+    refresh_category_alerts,
+)
+from ..services.analytics import usage_series
+from ..services.data_version import data_version, etag_matches, memoize
+from ..services.exports import EXPORT_FILENAMES, EXPORT_MEDIA_TYPES, stream_usage_export
+from ..services.forecasts import order_recommendations, usage_trends
+from ..services.push import push_broker, stage_push
+from ..services.report_jobs import report_jobs
+from ..services.usage import parse_usage_batch, record_usage_entry
+from ..services.usage import record_usage_batch as store_usage_batch
+from ..services.usage_buffer import usage_buffer
+from ..utils.pagination import decode_cursor, encode_cursor
 
 import logging
 logging.basicConfig()    
@@ -25,28 +45,69 @@ logging.getLogger("sqlalchemy.engine").setLevel(logging.DEBUG)
 
 router = APIRouter()
 
+# Handlers that only talk to the database are sync and take `db` from
+# get_db; @db_handler moves them onto AsyncSession when the async stack is
+# on (ASYNC_DB, see database/db.py). Async handlers that also await other
+# work use run_in_session.
+
+# Fields a /supplies list view may project with ?fields=
+SUPPLY_FIELDS = ("id", "name", "category", "quantity", "expiration_date", "primary_supplier", "cost_per_unit")
+
 # GET /supplies: List all supplies
 @router.get("/supplies", response_model=list[SupplyCreate])
+@db_handler
 def list_supplies(
+    response: Response,
     category: str = None,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, le=500),  # Prevent abuse
+    limit: int = Query(100, ge=1, le=500),  # Prevent abuse
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
 ):
-    db = next(get_db())
-    query = db.query(Supplies)
+    # Keyset pagination: ?cursor= (from X-Next-Cursor) or ?after_id= replace ?skip=
+    if cursor:
+        after_id = decode_cursor(cursor)
+
+    projection = None
+    if fields:
+        projection = ["id"] + [field.strip() for field in fields.split(",") if field.strip() and field.strip() != "id"]
+        unknown = [field for field in projection if field not in SUPPLY_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    if projection:
+        query = select(*[getattr(Supplies, field) for field in projection])
+    else:
+        query = select(Supplies)
     if category:
-        query = query.filter(Supplies.category == category)
-
-    supplies = query.offset(skip).limit(limit).all()
-    db.close()
-    return supplies
+        query = query.where(Supplies.category == category)
+    query = query.order_by(Supplies.id)
+    if after_id is not None:
+        query = query.where(Supplies.id > after_id)
+    else:
+        query = query.offset(skip)
+
+    # One extra row tells us whether there is a next page
+    result = db.execute(query.limit(limit + 1))
+    rows = result.all() if projection else result.scalars().all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+
+    if projection:
+        return JSONResponse(content=jsonable_encoder([dict(row._mapping) for row in rows]), headers=headers)
+    response.headers.update(headers)
+    return rows
 
 # GET /supplies/{id}: Get supply by ID
 @router.get("/supplies/{id}", response_model=SupplyCreate)
-def get_supply_by_id(id: int):
-    db = next(get_db())
-    supply = db.query(Supplies).filter(Supplies.id == id).first()
-    db.close()
+@db_handler
+def get_supply_by_id(id: int, db: Session = Depends(get_db)):
+    supply = db.get(Supplies, id)
     if not supply:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Supply not found")
     return supply
@@ -54,82 +115,107 @@ def get_supply_by_id(id: int):
 
 # POST /supplies: Add supply (admin only)
 @router.post("/supplies", response_model=SupplyCreate)
-def add_supply(supply: SupplyCreate, user: dict = Depends(require_admin)):
-    db = next(get_db())
+@db_handler
+def add_supply(supply: SupplyCreate, user: dict = Depends(require_admin), db: Session = Depends(get_db)):
     new_supply = Supplies(**supply.dict())
     db.add(new_supply)
+    db.flush()
+    stage_push(db, "supply", {**supply.dict(), "id": new_supply.id})
+    refresh_alert_state(db, [new_supply.id])
     db.commit()
     db.refresh(new_supply)
-    db.close()
     return new_supply
 
 # PUT /supplies/{id}: Update supply (admin only)
 @router.put("/supplies/{id}", response_model=SupplyCreate)
-def update_supply(id: int, supply: SupplyUpdate, user: dict = Depends(require_admin)):
-    db = next(get_db())
-    existing_supply = db.query(Supplies).filter(Supplies.id == id).first()
+@db_handler
+def update_supply(id: int, supply: SupplyUpdate, user: dict = Depends(require_admin), db: Session = Depends(get_db)):
+    existing_supply = db.get(Supplies, id)
     if not existing_supply:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Supply not found")
-    for key, value in supply.dict(exclude_unset=True).items():
+    changes = supply.dict(exclude_unset=True)
+    for key, value in changes.items():
         setattr(existing_supply, key, value)
+    db.flush()
+    stage_push(db, "supply", {"id": id, **changes})
+    refresh_alert_state(db, [id])
     db.commit()
     db.refresh(existing_supply)
-    db.close()
     return existing_supply
 
 # POST /usage: Record usage and update quantity
 @router.post("/usage", response_model=UsageCreate)
-def record_usage(usage: UsageCreate, user: dict = Depends(require_authenticated)):
+async def record_usage(usage: UsageCreate, response: Response, user: dict = Depends(require_authenticated)):
     try:
-        db = next(get_db())
-        supply = db.query(Supplies).filter(Supplies.id == usage.supply_id).first()
-        if not supply:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Supply not found")
-        if supply.quantity < usage.quantity_used:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Insufficient supply quantity")
-        supply.quantity -= usage.quantity_used
-        usage_record = UsageHistory(**usage.dict())
-        db.add(usage_record)
-        db.commit()
-        db.refresh(usage_record)
-        db.close()
-        return usage_record
+        if usage_buffer is None:
+            return await run_in_session(record_usage_entry, usage.supply_id, usage.quantity_used)
+        # Group commit through the write-behind buffer (USAGE_BUFFER=true)
+        recorded = usage_buffer.submit(usage.supply_id, usage.quantity_used)
+        if usage_buffer.ack == "enqueue":
+            response.status_code = status.HTTP_202_ACCEPTED
+        else:
+            await asyncio.wrap_future(recorded)
+        return usage
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@router.get("/usage/history")
-def get_usage_history_all(db: Session = Depends(get_db)):
-    # Query all usage entries
-    usage_entries = db.query(UsageHistory).all()
-
-    # Group usage by date
-    usage_by_date = defaultdict(int)
-    for entry in usage_entries:
-        usage_date = entry.timestamp.strftime('%Y-%m-%d')  # format as string
-        usage_by_date[usage_date] += entry.quantity_used
-
-    # Sort by date
-    sorted_dates = sorted(usage_by_date.keys())
-    values = [usage_by_date[dt] for dt in sorted_dates]
+# Content types read as one JSON usage event per line
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# POST /usage/batch: Record many usage events (JSON array or NDJSON) in one transaction.
+# mode=atomic applies all events or none (422 if any is rejected); mode=partial
+# applies the ones that validate and fit the stock.
+@router.post("/usage/batch", response_model=UsageBatchResponse)
+async def record_usage_batch(
+    request: Request,
+    response: Response,
+    mode: str = Query("atomic", pattern="^(atomic|partial)$"),
+    user: dict = Depends(require_authenticated),
+):
+    ndjson = request.headers.get("content-type", "").split(";")[0].strip() in NDJSON_TYPES
+    events, rejected = parse_usage_batch(await request.body(), ndjson)
+    total = len(events) + len(rejected)
+    atomic = mode == "atomic"
+    accepted = {}
+    if events and not (atomic and rejected):
+        accepted, store_rejected = await run_in_session(store_usage_batch, events, atomic)
+        rejected.update(store_rejected)
+
+    results = []
+    for index in range(total):
+        if index in accepted:
+            results.append(UsageBatchItemResult(index=index, status="accepted", id=accepted[index]))
+        elif index in rejected:
+            results.append(UsageBatchItemResult(index=index, status="rejected", error=rejected[index]))
+        else:
+            results.append(UsageBatchItemResult(index=index, status="skipped"))
+    if atomic and rejected:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    return UsageBatchResponse(mode=mode, accepted=len(accepted), rejected=len(rejected), results=results)
 
-    return {
-        "dates": sorted_dates,
-        "values": values
-    }
+@router.get("/usage/history")
+@db_handler
+def get_usage_history_all(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    db: Session = Depends(get_db),
+):
+    return usage_series(db, start=start, end=end, granularity=granularity)
 
 # GET /usage/history: Get usage history for a supply
 @router.get("/usage/history", response_model=list[UsageCreate])
-def get_usage_history(supply_id: int):
-    db = next(get_db())
-
+@db_handler
+def get_usage_history(supply_id: int, db: Session = Depends(get_db)):
     # Check if supply exists
-    supply = db.query(Supplies).filter(Supplies.id == supply_id).first()
+    supply = db.get(Supplies, supply_id)
     if not supply:
         raise HTTPException(status_code=404, detail="Supply not found")
 
     try:
-        usage = db.query(UsageHistory).filter(UsageHistory.supply_id == supply_id).all()
+        usage = db.execute(select(UsageHistory).where(UsageHistory.supply_id == supply_id)).scalars().all()
 
         if not usage:
             return []  # No data, but valid response
@@ -140,90 +226,183 @@ def get_usage_history(supply_id: int):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
-    finally:
-        db.close()
 
 
-# GET /recommendations: Get order recommendations
-@router.get("/recommendations", response_model=list[dict])
-def get_recommendations():
-    db = next(get_db())
-    return calculate_order_recommendation(db)
+# Analytics responses are memoized per data version and carry an ETag; a
+# client sending it back in If-None-Match gets 304 before any query runs
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
 
-# GET /alerts: Get waste alerts
-@router.get("/alerts")
-def get_alerts():
-    db = next(get_db())
-    return detect_waste_alerts(db)
+def _json_entry(etag: str, entry) -> Response:
+    body, headers = entry
+    return Response(content=body, media_type="application/json", headers={**headers, "ETag": etag, "Cache-Control": "no-cache"})
 
-# GET /savings: Get cost savings estimates
-@router.get("/savings")
-def get_savings():
-    db = next(get_db())
-    return estimate_cost_savings(db)
+def _versioned(request: Request, db: Session, key, compute) -> Response:
+    # A stale version is re-read through the handler's own session
+    etag = data_version.etag(db)
+    return _not_modified(request, etag) or _json_entry(etag, memoize(key, etag, compute))
 
-@router.get("/savings/history")
-def get_savings_history(db: Session = Depends(get_db)) -> Dict:
-    savings_by_month = defaultdict(float)
-
-    # Query usage joined with supplies
-    usage_data = (
-        db.query(
-            extract("year", UsageHistory.timestamp).label("year"),
-            extract("month", UsageHistory.timestamp).label("month"),
-            UsageHistory.supply_id,
-            func.sum(UsageHistory.quantity_used).label("total_used")
-        )
-        .group_by("year", "month", UsageHistory.supply_id)
-        .all()
-    )
-
-    for record in usage_data:
-        year = int(record.year)
-        month = int(record.month)
-        total_used = record.total_used or 0
 
-        supply = db.query(Supplies).filter(Supplies.id == record.supply_id).first()
-        if not supply:
-            continue
+# The pandas-backed analytics handlers (recommendations, savings, reports)
+# stay plain sync handlers on either stack: their work is CPU-bound and
+# would stall the event loop, so FastAPI runs them on the threadpool
 
-        optimal_stock = total_used * 1.5
-        overstock = supply.quantity - optimal_stock
-        cost_per_unit = get_dynamic_cost_per_unit(supply)
-        estimated_savings = max(overstock, 0) * cost_per_unit
+# GET /recommendations: Get order recommendations. Usage forecasts come from
+# the nightly snapshot while it is recent enough (X-Forecast-Computed-At
+# says when it was computed); fresh=true computes them now.
+@router.get("/recommendations", response_model=list[dict])
+def get_recommendations(request: Request, fresh: bool = False, db: Session = Depends(get_db)):
+    def load():
+        recommendations, computed_at = order_recommendations(db, fresh=fresh)
+        return recommendations, {"X-Forecast-Computed-At": computed_at.isoformat()}
+    return _versioned(request, db, ("recommendations", fresh), load)
+
+# GET /alerts: Active waste alerts, read from the maintained alert state.
+# X-Next-Cursor is the position in the alert change feed; pass it back as
+# ?since= to get only the alerts raised, updated or cleared after it.
+@router.get("/alerts")
+@db_handler
+def get_alerts(
+    request: Request,
+    response: Response,
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    if since is None:
+        def load():
+            # Cursor first: a change landing in between is then re-sent, never lost
+            cursor = latest_event_id(db)
+            alerts = active_alerts(db)
+            return alerts, {"X-Next-Cursor": encode_cursor(cursor)}
+        return _versioned(request, db, "alerts", load)
+
+    after_id = decode_cursor(since)
+    oldest = oldest_event_id(db)
+    if oldest is not None and after_id < oldest - 1:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor expired, reload /alerts without since")
+    changes = alert_changes(db, after_id, limit)
+    response.headers["X-Next-Cursor"] = encode_cursor(changes[-1]["event_id"] if changes else after_id)
+    return changes
+
+# GET /events: Server-Sent Events stream of supply quantity changes and alert
+# transitions (see services/push.py). On connect or a resync event, reload
+# /supplies and /alerts; alert event ids work as /alerts?since= cursors.
+@router.get("/events")
+async def stream_events():
+    subscriber = push_broker.subscribe()
+    if subscriber is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many subscribers", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        push_broker.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        month_label = f"{datetime(year, month, 1).strftime('%b %Y')}"
-        savings_by_month[month_label] += estimated_savings
+# GET /alerts/thresholds: Per-category alert thresholds
+@router.get("/alerts/thresholds", response_model=list[AlertThresholdResponse])
+@db_handler
+def list_alert_thresholds(db: Session = Depends(get_db)):
+    return db.execute(select(AlertThreshold).order_by(AlertThreshold.category)).scalars().all()
+
+# PUT /alerts/thresholds/{category}: Set a category's alert thresholds (admin only)
+@router.put("/alerts/thresholds/{category}", response_model=AlertThresholdResponse)
+@db_handler
+def set_alert_threshold(category: str, thresholds: AlertThresholdUpdate, user: dict = Depends(require_admin), db: Session = Depends(get_db)):
+    threshold = db.get(AlertThreshold, category) or AlertThreshold(category=category)
+    for key, value in thresholds.model_dump().items():
+        setattr(threshold, key, value)
+    db.add(threshold)
+    db.flush()
+    refresh_category_alerts(db, category)
+    db.commit()
+    db.refresh(threshold)
+    return threshold
 
-    # Sort the result by month
-    sorted_months = sorted(savings_by_month.keys(), key=lambda m: datetime.strptime(m, "%b %Y"))
-    values = [round(savings_by_month[m], 2) for m in sorted_months]
+# GET /savings: Get cost savings estimates
+@router.get("/savings")
+def get_savings(request: Request, db: Session = Depends(get_db)):
+    return _versioned(request, db, "savings", lambda: (estimate_cost_savings(db), {}))
 
-    return {
-        "months": sorted_months,
-        "values": values
-    }
+@router.get("/savings/history")
+@db_handler
+def get_savings_history(
+    request: Request,
+    from_month: Optional[str] = Query(None, alias="from", pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    to_month: Optional[str] = Query(None, alias="to", pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    db: Session = Depends(get_db),
+) -> Dict:
+    # One GROUP BY in SQL, so it is I/O-bound and safe on the event loop
+    def load():
+        return calculate_savings_history(db, from_month=from_month, to_month=to_month), {}
+    return _versioned(request, db, ("savings/history", from_month, to_month), load)
 
 
 @router.get("/reports/usage/export")
-def export_usage_report(format: str = Query("excel", enum=["excel", "pdf"]), db: Session = Depends(get_db)):
-    if format == "excel":
-        report = generate_usage_report_excel(db)
-        return StreamingResponse(
-            report,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=usage_report.xlsx"}
-        )
-    elif format == "pdf":
-        report = generate_usage_report_pdf(db)
+def export_usage_report(
+    format: str = Query("excel", enum=["excel", "csv", "pdf"]),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    supply_id: Optional[int] = None,
+    summary: bool = False,  # PDF only: per-supply summary pages computed in SQL
+    detail: bool = True,  # PDF only: false for a summary-only report
+):
+    if format in EXPORT_MEDIA_TYPES:
+        # Rows are read in batches and written while the response is sent
         return StreamingResponse(
-            report,
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=usage_report.pdf"}
+            stream_usage_export(format, summary=summary, detail=detail, start=start, end=end, supply_id=supply_id),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f"attachment; filename={EXPORT_FILENAMES[format]}"}
         )
 
+def _report_job_response(request: Request, job):
+    return {
+        "id": job.id,
+        "format": job.options["format"],
+        "status": job.status,
+        "cached": job.cached,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "error": job.error,
+        "download_url": str(request.url_for("download_report_job", job_id=job.id)) if job.status == "done" else None,
+    }
+
+def _get_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+# POST /reports/jobs: Render an export in the background (or reuse a cached one)
+@router.post("/reports/jobs", response_model=ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_report_job(job_request: ReportJobCreate, request: Request):
+    job = report_jobs.submit(job_request.model_dump())
+    return _report_job_response(request, job)
+
+# GET /reports/jobs/{job_id}: Poll a report job
+@router.get("/reports/jobs/{job_id}", response_model=ReportJobResponse)
+def get_report_job(job_id: str, request: Request):
+    return _report_job_response(request, _get_report_job(job_id))
+
+# GET /reports/jobs/{job_id}/download: Download a finished report
+@router.get("/reports/jobs/{job_id}/download", name="download_report_job")
+def download_report_job(job_id: str):
+    job = _get_report_job(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=job.error or "Report is not ready yet")
+    if not os.path.exists(job.path):
+        # Replaced by a newer rendering of the same report
+        raise HTTPException(status_code=410, detail="Report expired, please request it again")
+    return FileResponse(job.path, media_type=job.media_type, filename=job.filename)
+
+# GET /reports/usage-trends: Usage statistics per supply, from the nightly
+# snapshot like /recommendations (fresh=true computes them now)
 @router.get("/reports/usage-trends")
-def usage_report(db: Session = Depends(get_db)):
-    from ..services.recommendations import generate_usage_report
-    return generate_usage_report(db)
+def usage_report(request: Request, fresh: bool = False, db: Session = Depends(get_db)):
+    def load():
+        report, computed_at = usage_trends(db, fresh=fresh)
+        return report, {"X-Forecast-Computed-At": computed_at.isoformat()}
+    return _versioned(request, db, ("reports/usage-trends", fresh), load)
 
@@ -0,0 +1,13 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+# AlertThresholdUpdate schema: omitted/null fields use the default thresholds
+class AlertThresholdUpdate(BaseModel):
+    overstock_above: Optional[int] = Field(None, ge=0)
+    low_stock_below: Optional[int] = Field(None, ge=0)
+    expiry_days: Optional[int] = Field(None, ge=0)
+    slow_usage_ratio: Optional[float] = Field(None, ge=0)
+
+# AlertThresholdResponse schema
+class AlertThresholdResponse(AlertThresholdUpdate):
+    category: str
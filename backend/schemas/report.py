@@ -0,0 +1,23 @@
+from datetime import date, datetime
+from typing import Literal, Optional
+from pydantic import BaseModel
+
+# ReportJobCreate schema: same options as GET /reports/usage/export
+class ReportJobCreate(BaseModel):
+    format: Literal["excel", "csv", "pdf"] = "excel"
+    start: Optional[date] = None
+    end: Optional[date] = None
+    supply_id: Optional[int] = None
+    summary: bool = False
+    detail: bool = True
+
+# ReportJobResponse schema
+class ReportJobResponse(BaseModel):
+    id: str
+    format: str
+    status: Literal["pending", "running", "done", "failed"]
+    cached: bool
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
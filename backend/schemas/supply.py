@@ -1,7 +1,7 @@
 from uuid import uuid4
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 # SupplyBase schema
 class SupplyBase(BaseModel):
@@ -44,6 +44,20 @@ class UsageResponse(UsageCreate):
     class Config:
         orm_mode = True
 
+# UsageBatchItemResult schema: outcome of one event in POST /usage/batch
+class UsageBatchItemResult(BaseModel):
+    index: int
+    status: Literal["accepted", "rejected", "skipped"]  # skipped: valid, but an atomic batch was rejected
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+# UsageBatchResponse schema
+class UsageBatchResponse(BaseModel):
+    mode: Literal["atomic", "partial"]
+    accepted: int
+    rejected: int
+    results: list[UsageBatchItemResult]
+
 # RecommendationResponse schema
 class RecommendationResponse(BaseModel):
     supply_id: int
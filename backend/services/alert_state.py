@@ -0,0 +1,235 @@
+"""
+Incrementally maintained alert state.
+
+alert_state holds the alerts that are currently active. Writes that change
+a supply (usage, add/update supply, category thresholds) re-evaluate the
+rules for just those supplies inside their own transaction, and every
+difference is appended to alert_events: raised, updated (quantity or other
+details changed) or cleared. GET /alerts reads alert_state, and
+GET /alerts?since=<cursor> reads alert_events after the client's cursor.
+Committed events are also pushed to /inventory/events subscribers.
+
+Some alerts change with time alone: a supply drifts into its expiry
+window, and usage drops out of the 7-day window. AlertSweeper re-evaluates
+every supply every ALERT_SWEEP_SECONDS for those, and to repair state
+after writes that bypass the API. It also prunes events older than
+ALERT_EVENT_RETENTION_DAYS. Every worker runs a sweeper; the "alert-sweep"
+lease (services/leases.py) lets one of them sweep per interval.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from ..database.db import SessionLocal
+from ..models.alerts import AlertEvent, AlertState, AlertSweep
+from ..models.supplies import Supplies
+from ..utils.pagination import encode_cursor
+from .alerts import ALERT_RULES, evaluate_alert_rules
+from .leases import claim_lease, new_holder
+from .push import push_broker, stage_push
+
+logger = logging.getLogger(__name__)
+
+ALERT_SWEEP_SECONDS = float(os.getenv("ALERT_SWEEP_SECONDS", "300"))  # 0 disables the sweeper
+ALERT_EVENT_RETENTION_DAYS = int(os.getenv("ALERT_EVENT_RETENTION_DAYS", "7"))
+
+# Columns that make up an alert besides its (supply_id, alert) key
+DETAIL_COLUMNS = ("name", "quantity", "expiration_date", "recent_weekly_usage")
+RULE_FIELDS = {rule.name: rule.fields for rule in ALERT_RULES}
+RULE_ORDER = {rule.name: index for index, rule in enumerate(ALERT_RULES)}
+
+
+def refresh_alert_state(db: Session, supply_ids: Optional[Iterable[int]] = None, now: Optional[datetime] = None) -> int:
+    """
+    Re-evaluate the rules for `supply_ids` (every supply when None) and
+    record the differences, in the caller's transaction. Returns the
+    number of events written.
+    """
+    now = now or datetime.utcnow()
+    supply_ids = None if supply_ids is None else set(supply_ids)
+    if supply_ids == set():
+        return 0
+    current = {(alert["supply_id"], alert["alert"]): alert for alert in evaluate_alert_rules(db, now=now, supply_ids=supply_ids)}
+    query = select(AlertState)
+    if supply_ids is not None:
+        query = query.where(AlertState.supply_id.in_(supply_ids))
+    existing = {(state.supply_id, state.alert): state for state in db.scalars(query)}
+
+    events = []
+    for key, alert in current.items():
+        details = {column: alert.get(column) for column in DETAIL_COLUMNS}
+        state = existing.get(key)
+        if state is None:
+            db.add(AlertState(supply_id=key[0], alert=key[1], raised_at=now, updated_at=now, **details))
+            events.append(("raised", key, details))
+        elif any(getattr(state, column) != value for column, value in details.items()):
+            for column, value in details.items():
+                setattr(state, column, value)
+            state.updated_at = now
+            events.append(("updated", key, details))
+    for key, state in existing.items():
+        if key not in current:
+            db.delete(state)
+            events.append(("cleared", key, {column: getattr(state, column) for column in DETAIL_COLUMNS}))
+
+    if events:
+        db.flush()
+        rows = [
+            {"supply_id": supply_id, "alert": alert, "state": state, "created_at": now, **details}
+            for state, (supply_id, alert), details in events
+        ]
+        ids = db.execute(insert(AlertEvent).returning(AlertEvent.id, sort_by_parameter_order=True), rows).scalars().all()
+        if push_broker.subscriber_count:
+            for event_id, row in zip(ids, rows):
+                stage_push(db, "alert", as_change(AlertEvent(id=event_id, **row)), encode_cursor(event_id))
+    return len(events)
+
+
+def refresh_category_alerts(db: Session, category: str) -> int:
+    """
+    refresh_alert_state for every supply in `category` (after its thresholds change).
+    """
+    return refresh_alert_state(db, db.scalars(select(Supplies.id).where(Supplies.category == category)).all())
+
+
+# Set once this process has seen alert_state built
+_built = threading.Event()
+
+
+def ensure_alert_state(db: Session):
+    """
+    Build alert_state with a full sweep if that never happened (e.g. a
+    database created before it existed). Once per process.
+    """
+    if _built.is_set():
+        return
+    if db.scalar(select(AlertSweep.id).limit(1)) is None:
+        sweep_alert_state(db)
+    _built.set()
+
+
+def _active_states(db: Session):
+    ensure_alert_state(db)
+    return db.scalars(select(AlertState).order_by(AlertState.supply_id)).all()
+
+
+def as_alert(row) -> dict:
+    """
+    An alert_state/alert_events row in the shape detect_waste_alerts returns.
+    """
+    alert = {"supply_id": row.supply_id, "name": row.name, "alert": row.alert, "quantity": row.quantity}
+    alert.update((field, getattr(row, field)) for field in RULE_FIELDS.get(row.alert, ()))
+    return alert
+
+
+def as_change(event: AlertEvent) -> dict:
+    return {**as_alert(event), "event_id": event.id, "state": event.state, "changed_at": event.created_at}
+
+
+def active_alerts(db: Session) -> list:
+    states = _active_states(db)
+    # Within a supply, rule order, like evaluate_alert_rules
+    states.sort(key=lambda state: (state.supply_id, RULE_ORDER.get(state.alert, len(RULE_ORDER))))
+    return [as_alert(state) for state in states]
+
+
+def active_alert_map(db: Session) -> dict:
+    """
+    {supply_id: [alert names]} for supplies with active alerts.
+    """
+    alert_map = {}
+    for state in _active_states(db):
+        alert_map.setdefault(state.supply_id, []).append(state.alert)
+    return alert_map
+
+
+def alert_changes(db: Session, after_id: int, limit: int) -> list:
+    """
+    Alert events after the cursor, oldest first.
+    """
+    events = db.scalars(select(AlertEvent).where(AlertEvent.id > after_id).order_by(AlertEvent.id).limit(limit))
+    return [as_change(event) for event in events]
+
+
+def latest_event_id(db: Session) -> int:
+    return db.scalar(select(func.max(AlertEvent.id))) or 0
+
+
+def oldest_event_id(db: Session) -> Optional[int]:
+    return db.scalar(select(func.min(AlertEvent.id)))
+
+
+def _sweep(db: Session, now: datetime) -> int:
+    # Log the sweep first. pysqlite only begins a transaction at the first
+    # write, so this INSERT takes the write lock before the rules and
+    # alert_state are read: no usage write can commit in between and leave
+    # the diff below stale.
+    sweep = AlertSweep(finished_at=now, changes=0)
+    db.add(sweep)
+    db.flush()
+    sweep.changes = refresh_alert_state(db, now=now)
+    # Never prune the newest event or sweep: they carry the cursor and the
+    # "built" marker forward
+    cutoff = now - timedelta(days=ALERT_EVENT_RETENTION_DAYS)
+    for model, column in ((AlertEvent, AlertEvent.created_at), (AlertSweep, AlertSweep.finished_at)):
+        newest = db.scalar(select(func.max(model.id)))
+        if newest is not None:
+            db.execute(delete(model).where(column < cutoff, model.id < newest))
+    return sweep.changes
+
+
+def sweep_alert_state(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Re-evaluate every supply, log the sweep and prune old events. Commits,
+    retrying while SQLite is busy.
+    """
+    from .usage import _retrying  # usage imports this module
+
+    return _retrying(db, _sweep, now or datetime.utcnow())
+
+
+class AlertSweeper:
+    def __init__(self, session_factory=SessionLocal, interval: float = ALERT_SWEEP_SECONDS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.holder = new_holder()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="alert-sweeper", daemon=True)
+        self._thread.start()
+
+    def sweep(self) -> int:
+        with self.session_factory() as db:
+            return sweep_alert_state(db)
+
+    def _claim(self) -> bool:
+        with self.session_factory() as db:
+            return claim_lease(db, "alert-sweep", self.holder, timedelta(seconds=self.interval))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self._claim():
+                    continue  # Another worker swept this interval
+                changed = self.sweep()
+                if changed:
+                    logger.info("Alert sweep recorded %d changes", changed)
+            except Exception:
+                logger.exception("Alert sweep failed")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+alert_sweeper = AlertSweeper()
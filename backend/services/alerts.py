@@ -0,0 +1,130 @@
+"""
+Declarative waste alert rules.
+
+Every rule is a SQL condition over one row per supply: the supply's own
+columns, its category's thresholds (alert_thresholds, falling back to the
+defaults below) and its usage over the last RECENT_USAGE_DAYS, summed from
+the daily rollup. All rules are evaluated by a single query, so a new rule
+adds a column to that query rather than a query per supply.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional, Sequence
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from ..models.alerts import AlertThreshold
+from ..models.rollups import UsageDailyRollup
+from ..models.supplies import Supplies
+
+# Thresholds for categories without their own row in alert_thresholds
+DEFAULT_OVERSTOCK_ABOVE = 100
+DEFAULT_LOW_STOCK_BELOW = 100
+DEFAULT_EXPIRY_DAYS = 7
+DEFAULT_SLOW_USAGE_RATIO = 0.3
+
+RECENT_USAGE_DAYS = 7
+
+
+class AlertInputs:
+    """
+    Column expressions a rule condition can use.
+    """
+    def __init__(self, db: Session, now: datetime, recent_usage):
+        self.now = now
+        self.quantity = Supplies.quantity
+        self.expiration_date = Supplies.expiration_date
+        self.recent_usage = recent_usage
+        self.overstock_above = func.coalesce(AlertThreshold.overstock_above, DEFAULT_OVERSTOCK_ABOVE)
+        self.low_stock_below = func.coalesce(AlertThreshold.low_stock_below, DEFAULT_LOW_STOCK_BELOW)
+        self.expiry_days = func.coalesce(AlertThreshold.expiry_days, DEFAULT_EXPIRY_DAYS)
+        self.slow_usage_ratio = func.coalesce(AlertThreshold.slow_usage_ratio, DEFAULT_SLOW_USAGE_RATIO)
+        self.days_to_expiry = days_between(db, now, Supplies.expiration_date)
+
+
+def days_between(db: Session, start: datetime, column):
+    """
+    Fractional days from `start` to `column` (negative once it has passed).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", column - start) / 86400
+    return func.julianday(column) - func.julianday(start)
+
+
+class AlertRule:
+    def __init__(self, name: str, condition: Callable[[AlertInputs], object], fields: Sequence[str] = ()):
+        self.name = name  # The alert label
+        self.condition = condition  # AlertInputs -> SQL boolean
+        self.fields = tuple(fields)  # Extra row values copied into the alert
+
+
+# In output order for each supply. A category whose low-stock threshold is
+# above its overstock one would trip both, so Low stock yields to Overstocking.
+ALERT_RULES = [
+    AlertRule("Overstocking", lambda a: a.quantity > a.overstock_above),
+    AlertRule("Low stock", lambda a: (a.quantity < a.low_stock_below) & (a.quantity <= a.overstock_above)),
+    AlertRule(
+        "Nearing expiration with slow usage",
+        lambda a: (a.days_to_expiry <= a.expiry_days) & (a.recent_usage < a.slow_usage_ratio * a.quantity),
+        fields=("expiration_date", "recent_weekly_usage"),
+    ),
+]
+
+
+def recent_usage_subquery(now: datetime, supply_ids: Optional[set] = None):
+    """
+    Usage per supply from the calendar day RECENT_USAGE_DAYS ago onwards.
+    """
+    since = (now - timedelta(days=RECENT_USAGE_DAYS)).date()
+    query = select(UsageDailyRollup.supply_id, func.sum(UsageDailyRollup.total_used).label("total")).where(UsageDailyRollup.day >= since)
+    if supply_ids is not None:
+        query = query.where(UsageDailyRollup.supply_id.in_(supply_ids))
+    return query.group_by(UsageDailyRollup.supply_id).subquery()
+
+
+def evaluate_alert_rules(
+    db: Session,
+    now: Optional[datetime] = None,
+    rules: Sequence[AlertRule] = None,
+    supply_ids: Optional[Iterable[int]] = None,
+):
+    """
+    Alerts for every supply (or just `supply_ids`) that trips at least one
+    rule, in supply id order, from one query.
+    """
+    now = now or datetime.utcnow()
+    rules = ALERT_RULES if rules is None else rules
+    supply_ids = None if supply_ids is None else set(supply_ids)
+    if not rules or supply_ids == set():
+        return []
+    recent = recent_usage_subquery(now, supply_ids)
+    recent_usage = func.coalesce(recent.c.total, 0)
+    inputs = AlertInputs(db, now, recent_usage)
+    conditions = [rule.condition(inputs) for rule in rules]
+
+    query = (
+        select(
+            Supplies.id.label("supply_id"),
+            Supplies.name,
+            Supplies.quantity,
+            Supplies.expiration_date,
+            recent_usage.label("recent_weekly_usage"),
+            *(condition.label(f"rule_{index}") for index, condition in enumerate(conditions)),
+        )
+        .outerjoin(AlertThreshold, AlertThreshold.category == Supplies.category)
+        .outerjoin(recent, recent.c.supply_id == Supplies.id)
+        .where(or_(*conditions))
+        .order_by(Supplies.id)
+    )
+    if supply_ids is not None:
+        query = query.where(Supplies.id.in_(supply_ids))
+
+    alerts = []
+    for row in db.execute(query).mappings():
+        for index, rule in enumerate(rules):
+            if not row[f"rule_{index}"]:
+                continue
+            alert = {"supply_id": row["supply_id"], "name": row["name"], "alert": rule.name, "quantity": row["quantity"]}
+            alert.update((field, row[field]) for field in rule.fields)
+            alerts.append(alert)
+    return alerts
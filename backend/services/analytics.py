@@ -0,0 +1,209 @@
+"""
+Columnar usage analytics shared by recommendations, savings and trend reports.
+
+Usage is read from the daily/monthly rollups (see services/rollups.py) into
+a pandas DataFrame once per request; every per-supply statistic is then
+computed with grouped array operations instead of Python loops over ORM rows.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.rollups import UsageDailyRollup, UsageMonthlyRollup
+from ..models.supplies import UsageHistory
+from .rollups import month_expression, week_expression
+
+USAGE_COLUMNS = ["id", "supply_id", "quantity_used", "timestamp"]
+DAILY_COLUMNS = ["supply_id", "day", "quantity_used", "entries"]
+TOTALS_COLUMNS = ["supply_id", "entries", "total_used", "sum_squares", "min", "max"]
+WEEK_COLUMNS = [0, 1, 2, 3]
+
+
+def load_usage_frame(db: Session, supply_ids=None) -> pd.DataFrame:
+    """
+    Load raw usage rows, optionally only for `supply_ids` (a list or a
+    subquery), into a frame.
+    """
+    query = select(UsageHistory.id, UsageHistory.supply_id, UsageHistory.quantity_used, UsageHistory.timestamp)
+    if supply_ids is not None:
+        query = query.where(UsageHistory.supply_id.in_(supply_ids))
+    rows = db.execute(query).all()
+    frame = pd.DataFrame.from_records(rows, columns=USAGE_COLUMNS)
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+    return frame
+
+
+def load_daily_usage_frame(db: Session, since: datetime, supply_ids=None) -> pd.DataFrame:
+    """
+    Daily usage rollup rows from the calendar day of `since` onwards,
+    optionally only for `supply_ids`.
+    """
+    query = select(
+        UsageDailyRollup.supply_id,
+        UsageDailyRollup.day,
+        UsageDailyRollup.total_used,
+        UsageDailyRollup.entries,
+    ).where(UsageDailyRollup.day >= since.date())
+    if supply_ids is not None:
+        query = query.where(UsageDailyRollup.supply_id.in_(supply_ids))
+    rows = db.execute(query).all()
+    frame = pd.DataFrame.from_records(rows, columns=DAILY_COLUMNS)
+    frame["day"] = pd.to_datetime(frame["day"])
+    return frame
+
+
+def load_usage_totals(db: Session, supply_ids=None) -> pd.DataFrame:
+    """
+    All-time entry count, total, sum of squares, min and max per supply
+    (optionally only `supply_ids`), folded from the monthly rollup by the
+    database.
+    """
+    query = select(
+        UsageMonthlyRollup.supply_id,
+        func.sum(UsageMonthlyRollup.entries),
+        func.sum(UsageMonthlyRollup.total_used),
+        func.sum(UsageMonthlyRollup.sum_squares),
+        func.min(UsageMonthlyRollup.min_used),
+        func.max(UsageMonthlyRollup.max_used),
+    )
+    if supply_ids is not None:
+        query = query.where(UsageMonthlyRollup.supply_id.in_(supply_ids))
+    rows = db.execute(query.group_by(UsageMonthlyRollup.supply_id)).all()
+    return pd.DataFrame.from_records(rows, columns=TOTALS_COLUMNS, index="supply_id")
+
+
+def usage_series(db: Session, start: Optional[date] = None, end: Optional[date] = None,
+                 granularity: str = "day") -> dict:
+    """
+    Total usage per day, week (keyed by its Monday) or month ("YYYY-MM")
+    between the inclusive `start` and `end` dates, as parallel arrays.
+    Bucketing, summing and ordering happen in one GROUP BY over the indexed
+    daily rollup.
+    """
+    day = UsageDailyRollup.day
+    if granularity == "week":
+        period = week_expression(db, day)
+    elif granularity == "month":
+        period = month_expression(db, day)
+    else:
+        period = day
+
+    query = select(period.label("period"), func.sum(UsageDailyRollup.total_used)).group_by(period).order_by(period)
+    if start is not None:
+        query = query.where(day >= start)
+    if end is not None:
+        query = query.where(day <= end)
+
+    rows = db.execute(query).all()
+    return {
+        "dates": [key if isinstance(key, str) else key.isoformat() for key, _ in rows],
+        "values": [int(total) for _, total in rows],
+    }
+
+
+def sparse_supply_ids(min_entries: int = 3):
+    """
+    Subquery of supplies with fewer than `min_entries` usage entries.
+    """
+    return (
+        select(UsageMonthlyRollup.supply_id)
+        .group_by(UsageMonthlyRollup.supply_id)
+        .having(func.sum(UsageMonthlyRollup.entries) < min_entries)
+    )
+
+
+def window_totals(daily: pd.DataFrame, since: datetime) -> dict:
+    """
+    Total quantity used per supply from the calendar day of `since` onwards
+    as {supply_id: total}.
+    """
+    recent = daily[daily["day"] >= pd.Timestamp(since).normalize()]
+    totals = recent.groupby("supply_id")["quantity_used"].sum()
+    return {int(k): int(v) for k, v in totals.items()}
+
+
+def weekly_usage(daily: pd.DataFrame, now: datetime) -> pd.DataFrame:
+    """
+    Bucket a 30-day daily usage frame into 4 weekly buckets per supply by
+    the age of each day in whole days.
+
+    Returns a frame indexed by supply_id with the bucket columns 0-3 and a
+    `count` column holding the number of usage entries in the window.
+    """
+    if daily.empty:
+        return pd.DataFrame(columns=WEEK_COLUMNS + ["count"], dtype="int64")
+
+    days = (pd.Timestamp(now).normalize() - daily["day"]).dt.days
+    # Same bucket as weekly_usage[min(3, days // 7)] on a 4-item list
+    week = np.minimum(3, days // 7) % 4
+    buckets = (
+        daily.assign(week=week)
+        .groupby(["supply_id", "week"])["quantity_used"].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=WEEK_COLUMNS, fill_value=0)
+    )
+    buckets["count"] = daily.groupby("supply_id")["entries"].sum()
+    return buckets
+
+
+def average_weekly_usage(buckets: pd.DataFrame) -> pd.Series:
+    """
+    Average weekly usage per supply after excluding spikes (weeks above 3x the
+    median of the non-empty weeks).
+    """
+    weeks = buckets[WEEK_COLUMNS].to_numpy(dtype="float64")
+    if weeks.size == 0:
+        return pd.Series(dtype="float64")
+
+    positive = np.where(weeks > 0, weeks, np.nan)
+    has_usage = ~np.isnan(positive).all(axis=1)
+    base_median = np.zeros(len(weeks))
+    base_median[has_usage] = np.nanmedian(positive[has_usage], axis=1)
+
+    kept = weeks <= (base_median * 3)[:, None]
+    kept_count = kept.sum(axis=1)
+    kept_total = np.where(kept, weeks, 0).sum(axis=1)
+    average = np.divide(kept_total, kept_count, out=np.zeros(len(weeks)), where=kept_count > 0)
+    return pd.Series(average, index=buckets.index)
+
+
+def classify_variability(average: np.ndarray, std_dev: np.ndarray) -> np.ndarray:
+    return np.select(
+        [std_dev > average, std_dev > 0.5 * average],
+        ["High", "Moderate"],
+        default="Low",
+    )
+
+
+def usage_statistics(totals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Entry count, mean/min/max, sample standard deviation and variability
+    class per supply from rolled-up count, sum and sum of squares.
+    """
+    columns = ["entries", "average", "min", "max", "std_dev", "variability"]
+    if totals.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Python ints keep n * sum(x^2) - sum(x)^2 exact before the division
+    entries = totals["entries"].astype(object)
+    total_used = totals["total_used"].astype(object)
+    numerator = entries * totals["sum_squares"].astype(object) - total_used * total_used
+    denominator = entries * (entries - 1)
+    variance = [
+        num / den if den else 0.0
+        for num, den in zip(numerator, denominator)
+    ]
+
+    stats = pd.DataFrame(index=totals.index)
+    stats["entries"] = totals["entries"].astype("int64")
+    stats["average"] = totals["total_used"].astype("float64") / stats["entries"]
+    stats["min"] = totals["min"]
+    stats["max"] = totals["max"]
+    stats["std_dev"] = np.sqrt(np.maximum(np.array(variance, dtype="float64"), 0.0))
+    stats["variability"] = classify_variability(stats["average"].to_numpy(), stats["std_dev"].to_numpy())
+    return stats[columns]
+
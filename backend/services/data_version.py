@@ -0,0 +1,224 @@
+"""
+Data version for caching the analytics endpoints.
+
+The version is a counter in the database, moved by every transaction that
+writes supplies, usage, rollups, prices, alert state or forecasts. Writes
+are spotted with listeners on the app's sessions (AppSession), so new
+write paths are covered without opting in:
+
+  after_flush      ORM objects added, changed or deleted
+  do_orm_execute   insert()/update()/delete() statements run on a session
+
+How the counter moves depends on the backend:
+
+  SQLite       the data_version row is bumped by the first such write,
+               inside the writing transaction, so it commits (or rolls
+               back) with the data; writers are serialized anyway
+  PostgreSQL   data_version_seq is bumped with nextval on a connection of
+               its own once the transaction has committed, so concurrent
+               writers never queue on one row lock
+
+Because the counter lives in the database, writes from other uvicorn
+workers and from the CLIs (rollup rebuilds, forecast refreshes) move it
+too. Statements run on a bare Connection or a plain Session bypass the
+listeners and don't; on PostgreSQL a process dying between a commit and
+its nextval leaves cached responses stale until the next write or the
+cache TTL.
+
+Each process re-reads the counter at most every DATA_VERSION_CHECK_SECONDS,
+and right after its own writes commit, so most requests and 304s need no
+connection. Another process's write is picked up within that interval.
+
+The ETag combines the database's epoch, the version and the UTC date (the
+analytics windows move at midnight even without writes). analytics_cache
+memoizes rendered responses per (endpoint, arguments, ETag); old versions
+simply age out of the LRU.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Hashable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from ..database.db import AppSession, engine
+from ..models.data_version import DataVersionCounter, data_version_sequence, new_epoch
+from ..utils.cache import TTLCache
+
+ANALYTICS_CACHE_ENABLED = os.getenv("ANALYTICS_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+ANALYTICS_CACHE_MAXSIZE = int(os.getenv("ANALYTICS_CACHE_MAXSIZE", "256"))
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "3600"))
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("DATA_VERSION_CHECK_SECONDS", "1"))
+
+# Writes to these never change an analytics response (alert_events only
+# accompany alert_state changes, which count)
+IGNORED_TABLES = frozenset({"users", "alert_sweeps", "alert_events", "data_version", "job_leases"})
+
+# Backends whose writers are serialized anyway, so the counter is bumped
+# inside the writing transaction; the others bump it after the commit
+BUMP_IN_TRANSACTION = frozenset({"sqlite"})
+
+# Session.info key set once the open transaction wrote something that counts
+CHANGED_KEY = "data_changed"
+
+_counter = DataVersionCounter.__table__
+_BUMP = update(_counter).where(_counter.c.id == 1).values(value=_counter.c.value + 1)
+# last_value only moves on the second nextval without is_called
+_SEQUENCE_VALUE = text(f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {data_version_sequence.name}")
+
+
+def _dialect(db) -> str:
+    return (db.get_bind() if isinstance(db, Session) else db).dialect.name
+
+
+def read_data_version(db) -> Tuple[str, int]:
+    """
+    (epoch, value) as stored, through a Session or a Connection.
+    """
+    row = db.execute(select(_counter.c.epoch, _counter.c.value).where(_counter.c.id == 1)).first()
+    if row is None:
+        return "", 0
+    if _dialect(db) == "postgresql":
+        return row.epoch, db.execute(_SEQUENCE_VALUE).scalar()
+    return row.epoch, row.value
+
+
+def bump_data_version(connection):
+    """
+    Move the stored version on `connection`; the caller commits.
+    """
+    if connection.dialect.name == "postgresql":
+        connection.execute(select(data_version_sequence.next_value()))
+    elif connection.execute(_BUMP).rowcount == 0:
+        connection.execute(insert(_counter).values(id=1, epoch=new_epoch(), value=1))
+
+
+class DataVersion:
+    def __init__(self, bind=engine, check_seconds: float = DATA_VERSION_CHECK_SECONDS):
+        self.bind = bind
+        self.check_seconds = check_seconds
+        self._current = ("", 0)
+        self._checked_at = None  # monotonic time the stored value was read at
+        self._invalidated_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        checked_at = self._checked_at
+        return checked_at is None or checked_at <= self._invalidated_at or time.monotonic() - checked_at >= self.check_seconds
+
+    def current(self, db: Optional[Session] = None) -> Tuple[str, int]:
+        """
+        (epoch, value), re-read from the database once stale: through `db`
+        if given, else on a connection of its own.
+        """
+        if self.stale:
+            started = time.monotonic()
+            if db is not None:
+                current = read_data_version(db)
+            else:
+                with self.bind.connect() as connection:
+                    current = read_data_version(connection)
+            with self._lock:
+                # A read that started earlier must not overwrite a newer one
+                if self._checked_at is None or started >= self._checked_at:
+                    self._current, self._checked_at = current, started
+        return self._current
+
+    @property
+    def value(self) -> int:
+        return self.current()[1]
+
+    def invalidate(self):
+        self._invalidated_at = time.monotonic()
+
+    def etag(self, db: Optional[Session] = None) -> str:
+        epoch, value = self.current(db)
+        return f'"{epoch}-{value}-{datetime.utcnow():%Y%m%d}"'
+
+
+data_version = DataVersion()
+
+analytics_cache = TTLCache(
+    maxsize=ANALYTICS_CACHE_MAXSIZE,
+    ttl=ANALYTICS_CACHE_TTL_SECONDS,
+    enabled=ANALYTICS_CACHE_ENABLED,
+)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match calls for
+    return "*" in candidates or etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def render_json(content) -> bytes:
+    # Same encoding as JSONResponse
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def memoize(key: Hashable, etag: str, compute: Callable[[], Tuple[object, dict]]) -> Tuple[bytes, dict]:
+    """
+    (JSON body, extra headers) for `key` at `etag`, from compute() -> (content, headers) on a miss.
+    """
+    hit, entry = analytics_cache.lookup((key, etag))
+    if hit:
+        return entry
+    content, headers = compute()
+    entry = (render_json(content), headers)
+    analytics_cache.set((key, etag), entry)
+    return entry
+
+
+def _counts(table) -> bool:
+    return table is not None and getattr(table, "name", None) not in IGNORED_TABLES
+
+
+def _mark_changed(session: Session):
+    if CHANGED_KEY in session.info:
+        return
+    session.info[CHANGED_KEY] = True
+    if session.get_bind().dialect.name in BUMP_IN_TRANSACTION:
+        bump_data_version(session.connection())
+
+
+def _note_flush(session: Session, flush_context):
+    if CHANGED_KEY in session.info:
+        return
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if _counts(getattr(instance, "__table__", None)):
+            _mark_changed(session)
+            return
+
+
+def _note_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if _counts(getattr(orm_execute_state.statement, "table", None)):
+            _mark_changed(orm_execute_state.session)
+
+
+def _after_commit(session: Session):
+    if not session.info.pop(CHANGED_KEY, False):
+        return
+    bind = session.get_bind()
+    if bind.dialect.name not in BUMP_IN_TRANSACTION:
+        with bind.connect() as connection:
+            bump_data_version(connection)
+            connection.commit()
+    data_version.invalidate()
+
+
+def _forget_on_rollback(session: Session):
+    session.info.pop(CHANGED_KEY, None)
+
+
+event.listen(AppSession, "after_flush", _note_flush)
+event.listen(AppSession, "do_orm_execute", _note_statement)
+event.listen(AppSession, "after_commit", _after_commit)
+event.listen(AppSession, "after_rollback", _forget_on_rollback)
@@ -0,0 +1,224 @@
+"""
+Streaming usage exports.
+
+Rows come from one server-side cursor read in EXPORT_BATCH_SIZE batches and
+are handed to a format writer as they arrive, so memory stays flat however
+large usage_history gets. CSV bytes are sent as each batch is written.
+xlsx and PDF files can only be finalised at the end, so they are written to
+a temporary file (openpyxl write-only mode; reportlab fed fixed-size table
+chunks) and then streamed out in chunks.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional
+
+from openpyxl import Workbook
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..database.db import SessionLocal
+from ..models.rollups import UsageDailyRollup
+from ..models.supplies import Supplies, UsageHistory
+
+EXPORT_COLUMNS = ["Supply Name", "Quantity Used", "Used On"]
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+CHUNK_SIZE = 64 * 1024
+
+# Rows per reportlab Table. Each chunk is laid out on its own, so build time
+# grows linearly with the row count instead of with one huge table.
+PDF_CHUNK_ROWS = int(os.getenv("PDF_CHUNK_ROWS", "100"))
+PDF_ROW_HEIGHT = 18
+SUMMARY_COLUMNS = ["Supply Name", "Entries", "Total Used", "Average", "Min", "Max", "First Day", "Last Day"]
+
+EXPORT_MEDIA_TYPES = {
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "pdf": "application/pdf",
+}
+EXPORT_FILENAMES = {
+    "excel": "usage_report.xlsx",
+    "csv": "usage_report.csv",
+    "pdf": "usage_report.pdf",
+}
+
+
+def usage_export_query(start: Optional[date] = None, end: Optional[date] = None, supply_id: Optional[int] = None):
+    """
+    (supply name, quantity used, timestamp) rows between the inclusive
+    `start` and `end` dates, oldest first.
+    """
+    query = (
+        select(Supplies.name, UsageHistory.quantity_used, UsageHistory.timestamp)
+        .join(Supplies, UsageHistory.supply_id == Supplies.id)
+        .order_by(UsageHistory.timestamp, UsageHistory.id)
+    )
+    if start is not None:
+        query = query.where(UsageHistory.timestamp >= start)
+    if end is not None:
+        query = query.where(UsageHistory.timestamp < end + timedelta(days=1))
+    if supply_id is not None:
+        query = query.where(UsageHistory.supply_id == supply_id)
+    return query
+
+
+def usage_summary_query(start: Optional[date] = None, end: Optional[date] = None, supply_id: Optional[int] = None):
+    """
+    One row per supply with usage in the range, aggregated from the daily
+    rollup: (name, entries, total, min, max, first day, last day).
+    """
+    day = UsageDailyRollup.day
+    query = (
+        select(
+            Supplies.name,
+            func.sum(UsageDailyRollup.entries),
+            func.sum(UsageDailyRollup.total_used),
+            func.min(UsageDailyRollup.min_used),
+            func.max(UsageDailyRollup.max_used),
+            func.min(day),
+            func.max(day),
+        )
+        .join(Supplies, UsageDailyRollup.supply_id == Supplies.id)
+        .group_by(UsageDailyRollup.supply_id, Supplies.name)
+        .order_by(Supplies.name, UsageDailyRollup.supply_id)
+    )
+    if start is not None:
+        query = query.where(day >= start)
+    if end is not None:
+        query = query.where(day <= end)
+    if supply_id is not None:
+        query = query.where(UsageDailyRollup.supply_id == supply_id)
+    return query
+
+
+def iter_usage_rows(db: Session, **filters) -> Iterator[tuple]:
+    result = db.execute(usage_export_query(**filters).execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+
+def write_csv(rows: Iterable[tuple]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, (name, quantity_used, timestamp) in enumerate(rows, start=1):
+        writer.writerow([name, quantity_used, timestamp.isoformat(sep=" ") if timestamp else ""])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_excel(rows: Iterable[tuple]) -> Iterator[bytes]:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Usage")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(list(row))
+
+    with tempfile.TemporaryFile(suffix=".xlsx") as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(CHUNK_SIZE):
+            yield chunk
+
+
+class _LazyFlowables(list):
+    """
+    Flowable list for SimpleDocTemplate.build() that tops itself up from an
+    iterator whenever build() checks its length, so only a few table chunks
+    exist at any time instead of the whole report.
+    """
+    def __init__(self, source: Iterable, lookahead: int = 4):
+        super().__init__()
+        self._source = iter(source)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        while list.__len__(self) < self._lookahead:
+            flowable = next(self._source, None)
+            if flowable is None:
+                break
+            self.append(flowable)
+        return list.__len__(self)
+
+
+def _table_chunks(header: list, rows: Iterable[list], col_widths: list) -> Iterator[Table]:
+    style = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ])
+    chunk = [header]
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) > PDF_CHUNK_ROWS:
+            # Fixed column widths and row heights keep the chunks aligned and
+            # skip measuring every cell
+            yield Table(chunk, colWidths=col_widths, rowHeights=PDF_ROW_HEIGHT, repeatRows=1, style=style)
+            chunk = [header]
+    if len(chunk) > 1:
+        yield Table(chunk, colWidths=col_widths, rowHeights=PDF_ROW_HEIGHT, repeatRows=1, style=style)
+
+
+def _pdf_flowables(rows: Optional[Iterable[tuple]], summary: Optional[Iterable[tuple]]):
+    styles = getSampleStyleSheet()
+    yield Paragraph("Supply Usage Report", styles["Heading1"])
+    if summary is not None:
+        yield Paragraph("Summary by supply", styles["Heading2"])
+        yield from _table_chunks(
+            SUMMARY_COLUMNS,
+            (
+                [name, entries, total, round(total / entries, 2) if entries else 0, min_used, max_used, str(first_day), str(last_day)]
+                for name, entries, total, min_used, max_used, first_day, last_day in summary
+            ),
+            [130, 45, 55, 50, 35, 35, 60, 60],
+        )
+        if rows is not None:
+            yield PageBreak()
+    if rows is not None:
+        yield Paragraph("Usage entries", styles["Heading2"])
+        yield from _table_chunks(
+            EXPORT_COLUMNS,
+            ([name, quantity_used, timestamp.strftime("%Y-%m-%d %H:%M") if timestamp else ""] for name, quantity_used, timestamp in rows),
+            [220, 100, 140],
+        )
+
+
+def write_pdf(rows: Optional[Iterable[tuple]], summary: Optional[Iterable[tuple]] = None) -> Iterator[bytes]:
+    """
+    Usage entries as chunked tables with the header repeated on every page,
+    optionally preceded by per-supply summary pages. Pass rows=None for a
+    summary-only report.
+    """
+    with tempfile.TemporaryFile(suffix=".pdf") as output:
+        doc = SimpleDocTemplate(output, pagesize=A4, pageCompression=1)
+        doc.build(_LazyFlowables(_pdf_flowables(rows, summary)))
+        output.seek(0)
+        while chunk := output.read(CHUNK_SIZE):
+            yield chunk
+
+
+WRITERS = {"excel": write_excel, "csv": write_csv}
+
+
+def stream_usage_export(format: str, summary: bool = False, detail: bool = True, **filters) -> Iterator[bytes]:
+    """
+    Body for a StreamingResponse. Owns its session, because the response is
+    still being produced after the request handler has returned. `summary`
+    and `detail` only apply to PDF reports.
+    """
+    with SessionLocal() as db:
+        if format == "pdf":
+            summary_rows = db.execute(usage_summary_query(**filters)).all() if summary or not detail else None
+            yield from write_pdf(iter_usage_rows(db, **filters) if detail else None, summary_rows)
+        else:
+            yield from WRITERS[format](iter_usage_rows(db, **filters))
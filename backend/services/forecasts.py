@@ -0,0 +1,268 @@
+"""
+Nightly forecast snapshot behind GET /inventory/recommendations.
+
+The expensive part of a recommendation is the usage forecast: bucketing 30
+days of daily rollups into weeks, dropping spikes above 3x the median week
+and averaging. refresh_forecasts() computes it, together with all-time trend
+statistics, for every supply and replaces forecast_snapshots in one
+transaction. Catalogues larger than FORECAST_CHUNK_SIZE supplies are split
+into chunks computed in parallel by a process pool (FORECAST_WORKERS); each
+worker opens its own connection.
+
+/recommendations combines the snapshot with live stock, suppliers and
+alerts, so only the forecast can lag; /reports/usage-trends is built from
+its trend statistics. When the snapshot is older than FORECAST_MAX_AGE_HOURS
+(or missing) both are computed on the fly, as they are with ?fresh=true.
+
+ForecastScheduler refreshes the snapshot every day at FORECAST_REFRESH_AT
+(UTC, "HH:MM"; empty disables it), and once at startup if the snapshot is
+stale. Every worker runs a scheduler; the "forecast-refresh" lease
+(services/leases.py) lets only one of them refresh at a time. To refresh by
+hand or from cron (then set FORECAST_REFRESH_AT empty):
+
+    python -m backend.services.forecasts [--workers N] [--chunk-size N]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..database.db import SessionLocal, create_db_engine
+from ..models.forecasts import ForecastSnapshot
+from ..models.supplies import Supplies
+from .analytics import load_usage_totals, usage_statistics
+from .leases import claim_lease, new_holder
+from .recommendations import (
+    _load_supplies,
+    build_order_recommendations,
+    build_usage_report,
+    calculate_order_recommendation,
+    forecast_usage,
+    generate_usage_report,
+    get_conflicting_alerts_map,
+)
+
+logger = logging.getLogger(__name__)
+
+FORECAST_REFRESH_AT = os.getenv("FORECAST_REFRESH_AT", "02:00")
+FORECAST_MAX_AGE_HOURS = float(os.getenv("FORECAST_MAX_AGE_HOURS", "26"))
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "0"))  # 0: one per CPU
+FORECAST_CHUNK_SIZE = int(os.getenv("FORECAST_CHUNK_SIZE", "5000"))
+# Outlasts a refresh and the spread of the workers' wake-ups, well short of a day
+FORECAST_LEASE_TTL = timedelta(hours=1)
+
+
+def compute_forecasts(db: Session, supply_ids: Sequence[int], now: datetime) -> List[dict]:
+    """
+    forecast_snapshots rows for `supply_ids`.
+    """
+    forecasts = forecast_usage(db, now, supply_ids)
+    stats = usage_statistics(load_usage_totals(db, supply_ids)).to_dict("index")
+    rows = []
+    for supply_id in supply_ids:
+        recent_entries, avg_weekly_usage = forecasts.get(supply_id, (0, None))
+        row = {"supply_id": supply_id, "computed_at": now, "recent_entries": recent_entries, "avg_weekly_usage": avg_weekly_usage}
+        stat = stats.get(supply_id)
+        if stat is not None:
+            row.update(
+                entries=int(stat["entries"]),
+                average_usage=round(float(stat["average"]), 2),
+                min_usage=int(stat["min"]),
+                max_usage=int(stat["max"]),
+                std_dev=round(float(stat["std_dev"]), 2),
+                variability=stat["variability"],
+            )
+        rows.append(row)
+    return rows
+
+
+def _compute_chunk(database_url: str, supply_ids: List[int], now: datetime) -> List[dict]:
+    # Runs in a worker process, with an engine of its own
+    engine = create_db_engine(database_url)
+    try:
+        with sessionmaker(bind=engine)() as db:
+            return compute_forecasts(db, supply_ids, now)
+    finally:
+        engine.dispose()
+
+
+def refresh_forecasts(
+    db: Session,
+    now: Optional[datetime] = None,
+    workers: int = FORECAST_WORKERS,
+    chunk_size: int = FORECAST_CHUNK_SIZE,
+) -> int:
+    """
+    Recompute the snapshot for every supply and commit. Returns the number
+    of supplies.
+    """
+    now = now or datetime.utcnow()
+    supply_ids = db.scalars(select(Supplies.id).order_by(Supplies.id)).all()
+    chunks = [supply_ids[start:start + chunk_size] for start in range(0, len(supply_ids), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        rows = [row for chunk in chunks for row in compute_forecasts(db, chunk, now)]
+    else:
+        url = db.get_bind().url.render_as_string(hide_password=False)
+        # spawn: forking a server process with live threads and connections is unsafe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            rows = [row for chunk_rows in pool.map(_compute_chunk, repeat(url), chunks, repeat(now)) for row in chunk_rows]
+
+    db.execute(delete(ForecastSnapshot))
+    if rows:
+        db.execute(insert(ForecastSnapshot), rows)
+    db.commit()
+    return len(rows)
+
+
+def snapshot_age(db: Session, now: Optional[datetime] = None) -> Optional[timedelta]:
+    computed_at = db.scalar(select(ForecastSnapshot.computed_at).limit(1))
+    return None if computed_at is None else (now or datetime.utcnow()) - computed_at
+
+
+def _recent_snapshot(db: Session, now: datetime, max_age_hours: float, *columns) -> Optional[List[Row]]:
+    """
+    `columns` of every snapshot row (plus supply_id and computed_at), or
+    None when the snapshot is missing or older than `max_age_hours`.
+    """
+    rows = db.execute(select(ForecastSnapshot.supply_id, ForecastSnapshot.computed_at, *columns)).all()
+    if rows and now - rows[0].computed_at <= timedelta(hours=max_age_hours):
+        return rows
+    return None
+
+
+def order_recommendations(db: Session, fresh: bool = False, max_age_hours: float = FORECAST_MAX_AGE_HOURS) -> Tuple[list, datetime]:
+    """
+    Recommendations and the time their forecast was computed: from the
+    snapshot unless `fresh` or the snapshot is missing or too old.
+    """
+    now = datetime.utcnow()
+    rows = None if fresh else _recent_snapshot(db, now, max_age_hours, ForecastSnapshot.recent_entries, ForecastSnapshot.avg_weekly_usage)
+    if rows is None:
+        return calculate_order_recommendation(db, now=now), now
+    forecasts = {row.supply_id: (row.recent_entries, row.avg_weekly_usage) for row in rows}
+    alert_map = get_conflicting_alerts_map(db)
+    return build_order_recommendations(_load_supplies(db), forecasts, alert_map), rows[0].computed_at
+
+
+def usage_trends(db: Session, fresh: bool = False, max_age_hours: float = FORECAST_MAX_AGE_HOURS) -> Tuple[list, datetime]:
+    """
+    The usage-trends report and the time its statistics were computed: from
+    the snapshot unless `fresh` or the snapshot is missing or too old.
+    """
+    now = datetime.utcnow()
+    rows = None if fresh else _recent_snapshot(
+        db, now, max_age_hours,
+        ForecastSnapshot.entries, ForecastSnapshot.average_usage, ForecastSnapshot.min_usage,
+        ForecastSnapshot.max_usage, ForecastSnapshot.std_dev, ForecastSnapshot.variability,
+    )
+    if rows is None:
+        return generate_usage_report(db), now
+    stats_by_supply = {
+        row.supply_id: {
+            "entries": row.entries,
+            "average": row.average_usage,
+            "min": row.min_usage,
+            "max": row.max_usage,
+            "std_dev": row.std_dev,
+            "variability": row.variability,
+        }
+        for row in rows
+        if row.entries
+    }
+    computed_at = rows[0].computed_at
+    sparse_ids = select(ForecastSnapshot.supply_id).where(ForecastSnapshot.entries > 0, ForecastSnapshot.entries < 3)
+    # Entries recorded since the snapshot are left out, as they are from its statistics
+    return build_usage_report(db, _load_supplies(db), stats_by_supply, sparse_ids, until=computed_at), computed_at
+
+
+def next_refresh(now: datetime, refresh_at: str) -> datetime:
+    hour, minute = (int(part) for part in refresh_at.split(":"))
+    scheduled = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return scheduled if scheduled > now else scheduled + timedelta(days=1)
+
+
+class ForecastScheduler:
+    def __init__(self, session_factory=SessionLocal, refresh_at: str = FORECAST_REFRESH_AT, max_age_hours: float = FORECAST_MAX_AGE_HOURS):
+        self.session_factory = session_factory
+        self.refresh_at = refresh_at
+        self.max_age_hours = max_age_hours
+        self.holder = new_holder()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.refresh_at or self._thread is not None:
+            return
+        next_refresh(datetime.utcnow(), self.refresh_at)  # Fail fast on a malformed FORECAST_REFRESH_AT
+        self._thread = threading.Thread(target=self._run, name="forecast-scheduler", daemon=True)
+        self._thread.start()
+
+    def refresh(self) -> int:
+        started = time.perf_counter()
+        with self.session_factory() as db:
+            count = refresh_forecasts(db)
+        logger.info("Forecast snapshot refreshed for %d supplies in %.1fs", count, time.perf_counter() - started)
+        return count
+
+    def _claim(self) -> bool:
+        with self.session_factory() as db:
+            return claim_lease(db, "forecast-refresh", self.holder, FORECAST_LEASE_TTL)
+
+    def _refresh_logged(self):
+        # Another worker holding the lease is refreshing (or just has)
+        try:
+            if self._claim():
+                self.refresh()
+        except Exception:
+            logger.exception("Forecast refresh failed")
+
+    def _stale(self) -> bool:
+        with self.session_factory() as db:
+            age = snapshot_age(db)
+        return age is None or age > timedelta(hours=self.max_age_hours)
+
+    def _run(self):
+        # Catch up after downtime instead of serving live forecasts until tonight
+        if self._stale():
+            self._refresh_logged()
+        while True:
+            delay = (next_refresh(datetime.utcnow(), self.refresh_at) - datetime.utcnow()).total_seconds()
+            if self._stop.wait(max(delay, 0)):
+                return
+            self._refresh_logged()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+forecast_scheduler = ForecastScheduler()
+
+
+def main():
+    from . import data_version  # noqa: F401  (bump the version other processes cache by)
+
+    parser = argparse.ArgumentParser(description="Recompute the forecast snapshot")
+    parser.add_argument("--workers", type=int, default=FORECAST_WORKERS, help="worker processes (0: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=FORECAST_CHUNK_SIZE, help="supplies per chunk")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        count = refresh_forecasts(db, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"Forecast snapshot refreshed for {count} supplies in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
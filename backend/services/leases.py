@@ -0,0 +1,48 @@
+"""
+Database leases for background jobs.
+
+Every uvicorn worker starts the same in-process jobs (ForecastScheduler,
+AlertSweeper). Before each run a job claims its lease in job_leases; the
+claim only succeeds when nobody else holds a live lease, so one process
+runs each period while the others skip it. The holder renews by claiming
+again, and a crashed holder's lease simply expires.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.leases import JobLease
+
+
+def new_holder() -> str:
+    return uuid4().hex
+
+
+def claim_lease(db: Session, name: str, holder: str, ttl: timedelta, now: Optional[datetime] = None) -> bool:
+    """
+    Take (or renew) the `name` lease for `holder` until now + `ttl` unless
+    another holder's lease is still live. Commits; returns whether it was
+    claimed.
+    """
+    now = now or datetime.utcnow()
+    try:
+        claimed = db.execute(
+            update(JobLease)
+            .where(JobLease.name == name, or_(JobLease.holder == holder, JobLease.expires_at <= now))
+            .values(holder=holder, expires_at=now + ttl)
+        ).rowcount
+        if not claimed:
+            # Missing, or held: a held lease fails the insert
+            db.execute(insert(JobLease).values(name=name, holder=holder, expires_at=now + ttl))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+    except Exception:
+        db.rollback()
+        raise
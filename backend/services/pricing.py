@@ -0,0 +1,81 @@
+"""
+Unit-cost lookups for savings calculations.
+
+A CostProvider is created once per request from the caller's session (or a
+prefetched {supply_id: cost} map) and resolves costs in batches, so a
+savings calculation costs one query however many supplies it covers.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.pricing import SupplyPriceHistory
+from ..models.supplies import Supplies
+
+# Used when a supply has neither a price history nor a cost_per_unit
+DEFAULT_COST_PER_UNIT = 10
+BATCH_SIZE = 500
+
+
+def cost_expression(as_of: Optional[datetime] = None):
+    """
+    SQL expression for the unit cost of `Supplies` rows: the latest price
+    history entry effective at `as_of`, else cost_per_unit, else the default.
+    """
+    latest_price = (
+        select(SupplyPriceHistory.cost_per_unit)
+        .where(SupplyPriceHistory.supply_id == Supplies.id)
+        .order_by(SupplyPriceHistory.effective_from.desc())
+        .limit(1)
+    )
+    if as_of is not None:
+        latest_price = latest_price.where(SupplyPriceHistory.effective_from <= as_of)
+    return func.coalesce(latest_price.scalar_subquery(), Supplies.cost_per_unit, DEFAULT_COST_PER_UNIT)
+
+
+class CostProvider:
+    """
+    Batch unit-cost lookup bound to one session and point in time.
+
+    Costs passed in `prices` are used as-is; anything else is fetched from
+    the database in one query per batch and cached for the provider's life.
+    """
+
+    def __init__(self, db: Optional[Session] = None, prices: Optional[Dict[int, float]] = None,
+                 as_of: Optional[datetime] = None):
+        self.db = db
+        self.as_of = as_of
+        self._costs = dict(prices or {})
+        self._loaded_all = False
+
+    def get_costs(self, supply_ids: Optional[Iterable[int]] = None) -> Dict[int, float]:
+        """
+        Return {supply_id: cost}. With no ids, load the cost of every supply.
+        """
+        if supply_ids is None:
+            if self.db is not None and not self._loaded_all:
+                self._fetch(None)
+                self._loaded_all = True
+            return dict(self._costs)
+
+        supply_ids = list(supply_ids)
+        missing = [supply_id for supply_id in dict.fromkeys(supply_ids) if supply_id not in self._costs]
+        if missing and self.db is not None:
+            for start in range(0, len(missing), BATCH_SIZE):
+                self._fetch(missing[start:start + BATCH_SIZE])
+        return {
+            supply_id: self._costs.get(supply_id, DEFAULT_COST_PER_UNIT)
+            for supply_id in supply_ids
+        }
+
+    def get_cost(self, supply_id: int) -> float:
+        return self.get_costs([supply_id])[supply_id]
+
+    def _fetch(self, supply_ids):
+        query = select(Supplies.id, cost_expression(self.as_of))
+        if supply_ids is not None:
+            query = query.where(Supplies.id.in_(supply_ids))
+        for supply_id, cost in self.db.execute(query):
+            self._costs.setdefault(supply_id, cost)
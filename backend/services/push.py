@@ -0,0 +1,205 @@
+"""
+Server-Sent Events push for inventory and alert changes.
+
+Writes stage small deltas on their session (stage_push) and the broker
+publishes them only once that session commits, so subscribers never see
+a change that was rolled back. Two kinds of event go out:
+
+  supply  {"id": ..., "quantity": ...} plus any other field the write set
+  alert   an alert_events row, shaped like GET /alerts?since= results; its
+          SSE id is the matching ?since= cursor
+
+Each event is encoded once. Events published between two turns of the
+event loop are joined and queued for every subscriber as one chunk, so an
+idle subscriber costs a queue and a keep-alive timer, and a burst of
+writes wakes it once. Publishing never blocks the writer: a subscriber
+with more than PUSH_QUEUE_SIZE events unsent has its queue emptied and
+gets a single resync event, telling the client to reload over REST.
+publish() is safe to call from any thread (request handlers, the usage
+buffer, the alert sweeper).
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "256"))
+PUSH_KEEPALIVE_SECONDS = float(os.getenv("PUSH_KEEPALIVE_SECONDS", "15"))
+PUSH_MAX_SUBSCRIBERS = int(os.getenv("PUSH_MAX_SUBSCRIBERS", "10000"))
+
+# Session.info key holding the events staged by the open transaction
+STAGED_KEY = "push_events"
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+KEEPALIVE = b": keep-alive\n\n"
+
+
+def encode_event(name: str, data, event_id: Optional[str] = None) -> bytes:
+    message = f"event: {name}\ndata: {json.dumps(jsonable_encoder(data), separators=(',', ':'))}\n\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n{message}"
+    return message.encode()
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, limit: int):
+        self.loop = loop
+        self.limit = limit
+        self.queue = asyncio.Queue()  # (chunk, events in it)
+        self.unsent = 0  # Events queued and not yet taken by the stream
+        self.resyncs = 0
+
+    def offer(self, chunk: bytes, count: int):
+        """
+        Queue a chunk without waiting; runs on the subscriber's loop.
+        """
+        if self.unsent + count > self.limit:
+            # Too far behind to catch up event by event
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            chunk, count = RESYNC, 1
+            self.unsent = 0
+            self.resyncs += 1
+        self.queue.put_nowait((chunk, count))
+        self.unsent += count
+
+    async def take(self, timeout: float) -> bytes:
+        """
+        Everything queued, waiting up to `timeout` for the first chunk.
+        """
+        chunk, count = await asyncio.wait_for(self.queue.get(), timeout)
+        self.unsent -= count
+        while not self.queue.empty():
+            more, count = self.queue.get_nowait()
+            chunk += more
+            self.unsent -= count
+        return chunk
+
+
+class PushBroker:
+    def __init__(self, queue_size: int = PUSH_QUEUE_SIZE, max_subscribers: int = PUSH_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        # Subscribers grouped by the event loop serving them; one loop per worker
+        self._subscribers: Dict[asyncio.AbstractEventLoop, Set[Subscriber]] = {}
+        self._pending: Dict[asyncio.AbstractEventLoop, List[bytes]] = {}
+        self._lock = threading.Lock()
+        self._count = 0
+        # Metrics
+        self.published = 0
+        self.resyncs = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def subscribe(self) -> Optional[Subscriber]:
+        """
+        Register a subscriber on the running loop, or None when full.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(loop, self.queue_size)
+            self._subscribers.setdefault(loop, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.loop)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.loop]
+            self._count -= 1
+            self.resyncs += subscriber.resyncs
+
+    def publish(self, name: str, data, event_id: Optional[str] = None):
+        if not self._count:
+            return
+        message = encode_event(name, data, event_id)
+        with self._lock:
+            self.published += 1
+            # Events published before a loop gets round to fanning out are
+            # sent together: one queue entry and one wake-up per subscriber
+            idle = []
+            for loop in self._subscribers:
+                pending = self._pending.setdefault(loop, [])
+                if not pending:
+                    idle.append(loop)
+                pending.append(message)
+        for loop in idle:
+            try:
+                loop.call_soon_threadsafe(self._fan_out, loop)
+            except RuntimeError:
+                # Loop already closed; its subscribers are going away
+                with self._lock:
+                    self._pending.pop(loop, None)
+
+    def _fan_out(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            messages = self._pending.pop(loop, ())
+            subscribers = list(self._subscribers.get(loop, ()))
+        if not messages:
+            return
+        chunk = b"".join(messages)
+        for subscriber in subscribers:
+            subscriber.offer(chunk, len(messages))
+
+    async def stream(self, subscriber: Subscriber, keepalive: float = PUSH_KEEPALIVE_SECONDS):
+        """
+        SSE byte stream for one subscriber; unsubscribes when the client goes away.
+        """
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    yield await subscriber.take(keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = [subscriber.unsent for subscribers in self._subscribers.values() for subscriber in subscribers]
+            resyncs = self.resyncs + sum(subscriber.resyncs for subscribers in self._subscribers.values() for subscriber in subscribers)
+        return {
+            "subscribers": len(queued),
+            "published": self.published,
+            "resyncs": resyncs,
+            "max_queued": max(queued, default=0),
+        }
+
+
+push_broker = PushBroker()
+
+
+def stage_push(db, name: str, data, event_id: Optional[str] = None):
+    """
+    Publish an event once `db` (a Session or AsyncSession) commits.
+    """
+    if push_broker.subscriber_count:
+        db.info.setdefault(STAGED_KEY, []).append((name, data, event_id))
+
+
+def _publish_staged(session: Session):
+    for name, data, event_id in session.info.pop(STAGED_KEY, ()):
+        push_broker.publish(name, data, event_id)
+
+
+def _drop_staged(session: Session):
+    session.info.pop(STAGED_KEY, None)
+
+
+# Every Session, including the ones behind AsyncSession
+event.listen(Session, "after_commit", _publish_staged)
+event.listen(Session, "after_rollback", _drop_staged)
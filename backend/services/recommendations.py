@@ -1,73 +1,69 @@
-import random
-from statistics import mean, median, stdev
+from typing import Dict, Optional, Tuple
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from datetime import datetime, timedelta
 
-from ..database.db import get_db
-from ..models.supplies import Supplies, UsageHistory
-from math import ceil
-from ..services.procurement import check_supplier_stock, get_alternative_products, handle_alternative_suppliers
-from backend.database.db import get_db
+from ..models.rollups import UsageMonthlyRollup
+from ..models.supplies import Supplies
+from ..services.alert_state import active_alert_map
+from ..services.alerts import evaluate_alert_rules
+from ..services.analytics import (
+    average_weekly_usage,
+    load_daily_usage_frame,
+    load_usage_frame,
+    load_usage_totals,
+    sparse_supply_ids,
+    usage_statistics,
+    weekly_usage,
+    window_totals,
+)
+from ..services.pricing import DEFAULT_COST_PER_UNIT, CostProvider, cost_expression
+from ..services.procurement import ALTERNATIVE_SUPPLIERS, check_supplier_stock, select_alternative_products
+
+
+def _load_supplies(db: Session):
+    """
+    Load every supply in id order.
+    """
+    return db.query(Supplies).order_by(Supplies.id).all()
 
 
 # Calculate order recommendation
-def calculate_order_recommendation(db: Session):
+def calculate_order_recommendation(db: Session, now: Optional[datetime] = None):
+    now = now or datetime.utcnow()
+    forecasts = forecast_usage(db, now)
     alert_map = get_conflicting_alerts_map(db)  # ✅ Inject alert info
+    return build_order_recommendations(_load_supplies(db), forecasts, alert_map)
 
-    supply_ids = db.query(Supplies.id).all()
-    recommendations = []
-    now = datetime.utcnow()
 
-    for supply_id_tuple in supply_ids:
-        supply_id = supply_id_tuple[0]
-        supply = db.query(Supplies).filter(Supplies.id == supply_id).first()
-        if not supply:
-            continue
+def forecast_usage(db: Session, now: datetime, supply_ids=None) -> Dict[int, Tuple[int, float]]:
+    """
+    (usage entries, spike-filtered average weekly usage) over the last 30
+    days for every supply (or just `supply_ids`) used in that window.
+    """
+    usage = load_daily_usage_frame(db, since=now - timedelta(days=30), supply_ids=supply_ids)
+    buckets = weekly_usage(usage, now)
+    avg_weekly = average_weekly_usage(buckets).to_dict()
+    return {int(supply_id): (int(count), float(avg_weekly[supply_id])) for supply_id, count in buckets["count"].items()}
 
-        # Get usage in last 30 days
-        one_month_ago = now - timedelta(days=30)
-        usage_entries = (
-            db.query(UsageHistory)
-            .filter(UsageHistory.supply_id == supply_id, UsageHistory.timestamp >= one_month_ago)
-            .all()
-        )
-
-        # Calculate usage count
-        usage_count = (
-            db.query(func.count(UsageHistory.id))
-            .filter(UsageHistory.supply_id == supply_id, UsageHistory.timestamp >= one_month_ago)
-            .scalar()
-        )
 
+def build_order_recommendations(supplies, forecasts: Dict[int, Tuple[int, float]], alert_map: dict):
+    """
+    Recommendations for `supplies` from forecast_usage() output (computed
+    now or read from the forecast snapshot) and current stock and alerts.
+    """
+    recommendations = []
+    for supply in supplies:
+        usage_count, avg_weekly_usage = forecasts.get(supply.id, (0, None))
         if usage_count < 3:
             recommendations.append({
-                "supply_id": supply_id,
+                "supply_id": supply.id,
                 "name": supply.name,
                 "message": "Insufficient usage data to generate order recommendation",
                 "current_stock": supply.quantity
             })
             continue
 
-
-        if not usage_entries:
-            continue
-
-        # Group by week
-        weekly_usage = [0, 0, 0, 0]
-        for entry in usage_entries:
-            week_index = min(3, (now - entry.timestamp).days // 7)
-            weekly_usage[week_index] += entry.quantity_used
-
-        # Detect and exclude spikes (e.g., more than 3x median)
-        base_median = median([u for u in weekly_usage if u > 0]) or 0
-        filtered_usage = [u for u in weekly_usage if u <= base_median * 3]
-
-        if not filtered_usage:
-            avg_weekly_usage = 0
-        else:
-            avg_weekly_usage = sum(filtered_usage) / len(filtered_usage)
-
         desired_stock = 2 * avg_weekly_usage
         if(desired_stock > supply.quantity):
             recommended_quantity = desired_stock
@@ -79,8 +75,7 @@ def calculate_order_recommendation(db: Session):
         conflict_alerts = alert_map.get(supply.id, [])
 
         if not stock_available:
-            alt_suppliers = handle_alternative_suppliers(supply_id, db)
-            alt_products = get_alternative_products(supply, db)
+            alt_products = select_alternative_products(supply, supplies)
 
             recommendations.append({
                 "supply_id": supply.id,
@@ -90,7 +85,7 @@ def calculate_order_recommendation(db: Session):
                 "supplier": supply.primary_supplier,
                 "status": "Primary supplier out of stock",
                 "conflicts": conflict_alerts,
-                "alternative_suppliers": alt_suppliers["alternative_suppliers"],
+                "alternative_suppliers": list(ALTERNATIVE_SUPPLIERS),
                 "alternative_products": alt_products,
                 "avg_weekly_usage": avg_weekly_usage
             })
@@ -105,84 +100,32 @@ def calculate_order_recommendation(db: Session):
                 "conflicts": conflict_alerts,
                 "avg_weekly_usage": avg_weekly_usage
             })
-    db.close()
     return recommendations
 
 
 
-# Detect waste alerts
-def detect_waste_alerts(db: Session):
-    alerts = []
-    threshold = 100  # Overstock threshold
-    nearing_expiration_days = 7
-    now = datetime.utcnow()
-    one_week_ago = now - timedelta(days=7)
-
-    supplies = db.query(Supplies).all()
-
-    for supply in supplies:
-        # ✅ Check for overstock
-        if supply.quantity > threshold:
-            alerts.append({
-                "supply_id": supply.id,
-                "name": supply.name,
-                "alert": "Overstocking",
-                "quantity": supply.quantity,
-            })
-        # ✅ Check for low stock
-        elif supply.quantity < threshold:
-            alerts.append({
-                "supply_id": supply.id,
-                "name": supply.name,
-                "alert": "Low stock",
-                "quantity": supply.quantity,
-            })
-
-        # ✅ Check for expiration, but filter based on usage rate
-        if supply.expiration_date and supply.expiration_date <= now + timedelta(days=nearing_expiration_days):
-            # Check recent usage
-            recent_usage = (
-                db.query(func.sum(UsageHistory.quantity_used))
-                .filter(
-                    UsageHistory.supply_id == supply.id,
-                    UsageHistory.timestamp >= one_week_ago
-                )
-                .scalar() or 0
-            )
-
-            if recent_usage < (0.3 * supply.quantity):  # If usage is less than 30% of stock
-                alerts.append({
-                    "supply_id": supply.id,
-                    "name": supply.name,
-                    "alert": "Nearing expiration with slow usage",
-                    "quantity": supply.quantity,
-                    "expiration_date": supply.expiration_date,
-                    "recent_weekly_usage": recent_usage,
-                })
-            # else: No alert, since it’s being consumed fast
-    db.close()
-    return alerts
+# Detect waste alerts (rules and per-category thresholds live in services/alerts.py)
+def detect_waste_alerts(db: Session, now: Optional[datetime] = None):
+    return evaluate_alert_rules(db, now=now)
 
 
 # Estimate cost savings
-def estimate_cost_savings(db: Session):
+def estimate_cost_savings(db: Session, now: Optional[datetime] = None, costs: Optional[CostProvider] = None):
     savings = []
-    supplies = db.query(Supplies).all()
+    now = now or datetime.utcnow()
+    supplies = _load_supplies(db)
+    cost_by_supply = (costs or CostProvider(db)).get_costs()
+
+    one_month_ago = now - timedelta(days=30)
+    usage_totals = window_totals(load_daily_usage_frame(db, since=one_month_ago), one_month_ago)
 
     for supply in supplies:
-        one_month_ago = datetime.utcnow() - timedelta(days=30)
-        usage_data = (
-            db.query(func.sum(UsageHistory.quantity_used).label("total_usage"))
-            .filter(UsageHistory.supply_id == supply.id, UsageHistory.timestamp >= one_month_ago)
-            .first()
-        )
-
-        total_usage = usage_data.total_usage or 0
+        total_usage = usage_totals.get(supply.id, 0)
         optimal_stock = total_usage * 1.5
         overstock = supply.quantity - optimal_stock
 
         # ✅ Use dynamic cost per unit
-        actual_cost = get_dynamic_cost_per_unit(supply)
+        actual_cost = cost_by_supply.get(supply.id, DEFAULT_COST_PER_UNIT)
         estimated_savings = overstock * actual_cost
 
         # ✅ Handle unstable or zero/negative savings
@@ -203,45 +146,66 @@ def estimate_cost_savings(db: Session):
                 "overstock_quantity": overstock,
                 "estimated_savings": round(estimated_savings, 2)
             })
-    db.close()
     return savings
 
-def get_conflicting_alerts_map(db: Session):
+def calculate_savings_history(db: Session, from_month: Optional[str] = None, to_month: Optional[str] = None):
     """
-    Returns a dict {supply_id: [alerts]} for items that are flagged.
+    Estimated savings per month as parallel arrays of ISO month keys
+    ("YYYY-MM") and values, optionally limited to an inclusive month range.
+
+    For every month a supply was used, the stock above 1.5x that month's
+    usage is valued at the supply's unit cost; the join, the per-supply
+    savings and the per-month sum all run in one SQL aggregation.
     """
-    alert_data = detect_waste_alerts(db)
-    alert_map = {}
-    for alert in alert_data:
-        sid = alert["supply_id"]
-        if sid not in alert_map:
-            alert_map[sid] = []
-        alert_map[sid].append(alert["alert"])
-    return alert_map
-
-def get_dynamic_cost_per_unit(supply: Supplies) -> float:
+    overstock = Supplies.quantity - UsageMonthlyRollup.total_used * 1.5
+    savings = case((overstock > 0, overstock), else_=0) * cost_expression()
+    query = (
+        select(UsageMonthlyRollup.month, func.sum(savings))
+        .join(Supplies, Supplies.id == UsageMonthlyRollup.supply_id)
+        .group_by(UsageMonthlyRollup.month)
+        .order_by(UsageMonthlyRollup.month)
+    )
+    if from_month:
+        query = query.where(UsageMonthlyRollup.month >= from_month)
+    if to_month:
+        query = query.where(UsageMonthlyRollup.month <= to_month)
+
+    savings_by_month = db.execute(query).all()
+    return {
+        "months": [month for month, _ in savings_by_month],
+        "values": [round(float(value or 0), 2) for _, value in savings_by_month]
+    }
+
+def get_conflicting_alerts_map(db: Session):
     """
-    Simulate fluctuating costs (for demo).
-    Real-world use: fetch from historical price table or external API.
+    Returns a dict {supply_id: [alerts]} for items that are flagged, from
+    the maintained alert state.
     """
-    db = next(get_db())
-    supply_from_db = db.query(Supplies).filter(Supplies.id == supply.id).first()
-    db.close()
-    return supply_from_db.cost_per_unit if supply_from_db else 10
+    return active_alert_map(db)
 
 def generate_usage_report(db: Session):
+    supplies = _load_supplies(db)
+    stats_by_supply = usage_statistics(load_usage_totals(db)).to_dict("index")
+    return build_usage_report(db, supplies, stats_by_supply, sparse_supply_ids())
+
+
+def build_usage_report(db: Session, supplies, stats_by_supply: dict, sparse_ids, until: Optional[datetime] = None):
+    """
+    Usage-trends report for `supplies` from usage_statistics() rows by
+    supply (computed now or read from the forecast snapshot). Raw entries
+    are only read for `sparse_ids`, the supplies with too little history,
+    and only those recorded up to `until` when given.
+    """
     report = []
-    supplies = db.query(Supplies).all()
+    sparse_usage = load_usage_frame(db, supply_ids=sparse_ids)
+    if until is not None:
+        sparse_usage = sparse_usage[sparse_usage["timestamp"] <= until]
+    sparse_usage = sparse_usage.sort_values(["timestamp", "id"], kind="stable")
+    sparse_entries = dict(tuple(sparse_usage.groupby("supply_id")))
 
     for supply in supplies:
-        usage_entries = (
-            db.query(UsageHistory)
-            .filter(UsageHistory.supply_id == supply.id)
-            .order_by(UsageHistory.timestamp.asc())
-            .all()
-        )
-
-        if not usage_entries:
+        row = stats_by_supply.get(supply.id)
+        if row is None:
             report.append({
                 "supply_id": supply.id,
                 "name": supply.name,
@@ -249,36 +213,29 @@ def generate_usage_report(db: Session):
             })
             continue
 
-        if len(usage_entries) < 3:
+        entries = int(row["entries"])
+
+        if entries < 3:
+            supply_entries = sparse_entries.get(supply.id, sparse_usage.iloc[:0])
             report.append({
                 "supply_id": supply.id,
                 "name": supply.name,
                 "message": "Insufficient usage data for reliable trend analysis",
-                "entries": len(usage_entries),
-                "recent_usages": [entry.quantity_used for entry in usage_entries],
-                "timestamps": [entry.timestamp.isoformat() for entry in usage_entries]
+                "entries": entries,
+                "recent_usages": [int(quantity) for quantity in supply_entries["quantity_used"]],
+                "timestamps": [timestamp.to_pydatetime().isoformat() for timestamp in supply_entries["timestamp"]]
             })
             continue
 
-        usage_values = [entry.quantity_used for entry in usage_entries]
-        timestamps = [entry.timestamp for entry in usage_entries]
-
-        usage_avg = mean(usage_values)
-        usage_min = min(usage_values)
-        usage_max = max(usage_values)
-        usage_stdev = stdev(usage_values) if len(usage_values) > 1 else 0.0
-
-        variability = "High" if usage_stdev > usage_avg else "Moderate" if usage_stdev > (0.5 * usage_avg) else "Low"
-
         report.append({
             "supply_id": supply.id,
             "name": supply.name,
-            "entries": len(usage_values),
-            "average_usage": round(usage_avg, 2),
-            "min_usage": usage_min,
-            "max_usage": usage_max,
-            "usage_variability": variability,
-            "std_dev": round(usage_stdev, 2)
+            "entries": entries,
+            "average_usage": round(float(row["average"]), 2),
+            "min_usage": int(row["min"]),
+            "max_usage": int(row["max"]),
+            "usage_variability": row["variability"],
+            "std_dev": round(float(row["std_dev"]), 2)
         })
 
     return report
@@ -0,0 +1,159 @@
+"""
+Background report jobs with cached artifacts.
+
+POST /reports/jobs hands the export to a small worker pool instead of
+rendering it inside the request. Finished files are kept on disk under a key
+derived from (format, filters, data watermark):
+
+* an identical request while the data is unchanged is answered with the
+  existing file straight away;
+* an identical request while the first one is still rendering joins that job
+  rather than starting a second one.
+
+Only the newest artifact per (format, filters) is kept.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from ..database.db import SessionLocal
+from .data_version import read_data_version
+from .exports import EXPORT_FILENAMES, EXPORT_MEDIA_TYPES, stream_usage_export
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Finished jobs remembered for polling; the oldest are forgotten first
+MAX_REPORT_JOBS = int(os.getenv("MAX_REPORT_JOBS", "256"))
+
+EXTENSIONS = {"excel": "xlsx", "csv": "csv", "pdf": "pdf"}
+
+
+def data_watermark(db: Session) -> list:
+    """
+    The stored data version, which every committed write moves (edits and
+    renames included, from any worker). Read fresh rather than through the
+    per-process cache, since an artifact outlives it.
+    """
+    return list(read_data_version(db))
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ReportJob:
+    def __init__(self, key: str, options: dict, path: str, status: str = "pending", cached: bool = False):
+        self.id = uuid4().hex
+        self.key = key
+        self.options = options
+        self.path = path
+        self.status = status
+        self.cached = cached
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = self.created_at if status == "done" else None
+
+    @property
+    def media_type(self) -> str:
+        return EXPORT_MEDIA_TYPES[self.options["format"]]
+
+    @property
+    def filename(self) -> str:
+        return EXPORT_FILENAMES[self.options["format"]]
+
+
+class ReportJobQueue:
+    def __init__(self, directory: str = REPORTS_DIR, workers: int = REPORT_WORKERS, max_jobs: int = MAX_REPORT_JOBS):
+        self.directory = directory
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()  # job id -> ReportJob
+        self._rendering = {}  # artifact key -> ReportJob still pending or running
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report")
+        return self._executor
+
+    def submit(self, options: dict) -> ReportJob:
+        with SessionLocal() as db:
+            watermark = data_watermark(db)
+        key = _digest([options, watermark])
+        path = os.path.join(self.directory, f"{_digest(options)[:16]}-{key[:32]}.{EXTENSIONS[options['format']]}")
+
+        with self._lock:
+            running = self._rendering.get(key)
+            if running is not None:
+                return running
+            if os.path.exists(path):
+                job = ReportJob(key, options, path, status="done", cached=True)
+                self._remember(job)
+                return job
+            job = ReportJob(key, options, path)
+            self._rendering[key] = job
+            self._remember(job)
+            self._get_executor().submit(self._render, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _remember(self, job: ReportJob):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status in ("pending", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+    def _render(self, job: ReportJob):
+        job.status = "running"
+        partial = f"{job.path}.{job.id}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(partial, "wb") as output:
+                for chunk in stream_usage_export(**job.options):
+                    output.write(chunk)
+            # Readers only ever see complete files
+            os.replace(partial, job.path)
+            self._discard_older_artifacts(job.path)
+            job.status = "done"
+        except Exception as exc:
+            job.status = "failed"
+            job.error = str(exc)
+            if os.path.exists(partial):
+                os.remove(partial)
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self._rendering.pop(job.key, None)
+
+    def _discard_older_artifacts(self, path: str):
+        # Same (format, filters) rendered at an older watermark
+        prefix = os.path.basename(path).split("-", 1)[0]
+        for other in glob.glob(os.path.join(self.directory, f"{prefix}-*")):
+            if other != path and not other.endswith(".tmp"):
+                try:
+                    os.remove(other)
+                except FileNotFoundError:
+                    pass
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+report_jobs = ReportJobQueue()
@@ -0,0 +1,161 @@
+"""
+Daily and monthly per-supply usage rollups.
+
+record_usage folds every new usage entry into both rollup tables inside its
+own transaction, so analytics read a handful of pre-aggregated rows instead
+of scanning usage_history. `rebuild_rollups` recomputes them from the raw
+log for existing data:
+
+    python -m backend.services.rollups
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from sqlalchemy import case, cast, delete, func, insert, select, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models.rollups import UsageDailyRollup, UsageMonthlyRollup
+from ..models.supplies import UsageHistory
+
+def month_key(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m")
+
+
+def day_expression(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(column, Date)
+    return func.date(column)
+
+
+def month_expression(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def week_expression(db: Session, column):
+    """
+    Monday of the (ISO) week containing each date, as a date.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc("week", column), Date)
+    return func.date(column, "-6 days", "weekday 1")
+
+
+def _insert(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Usage rollups are not supported on {dialect}")
+
+
+def _aggregate(events: Iterable[Tuple[int, int, datetime]]):
+    """
+    Fold (supply_id, quantity_used, timestamp) events into per-day and
+    per-month rows so a batch costs one upsert per touched rollup row.
+    """
+    daily = defaultdict(lambda: [0, 0, 0, None, None])
+    monthly = defaultdict(lambda: [0, 0, 0, None, None])
+    for supply_id, quantity_used, timestamp in events:
+        for totals in (daily[(supply_id, timestamp.date())], monthly[(supply_id, month_key(timestamp))]):
+            totals[0] += quantity_used
+            totals[1] += 1
+            totals[2] += quantity_used * quantity_used
+            totals[3] = quantity_used if totals[3] is None else min(totals[3], quantity_used)
+            totals[4] = quantity_used if totals[4] is None else max(totals[4], quantity_used)
+    return daily, monthly
+
+
+def _upsert(db: Session, model, key_column: str, rows: dict):
+    if not rows:
+        return
+    table = model.__table__
+    statement = _insert(db, model)
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=["supply_id", key_column],
+        set_={
+            "total_used": table.c.total_used + excluded.total_used,
+            "entries": table.c.entries + excluded.entries,
+            "sum_squares": table.c.sum_squares + excluded.sum_squares,
+            "min_used": case((excluded.min_used < table.c.min_used, excluded.min_used), else_=table.c.min_used),
+            "max_used": case((excluded.max_used > table.c.max_used, excluded.max_used), else_=table.c.max_used),
+        },
+    )
+    db.execute(statement, [
+        {
+            "supply_id": supply_id,
+            key_column: key,
+            "total_used": total_used,
+            "entries": entries,
+            "sum_squares": sum_squares,
+            "min_used": min_used,
+            "max_used": max_used,
+        }
+        for (supply_id, key), (total_used, entries, sum_squares, min_used, max_used) in rows.items()
+    ])
+
+
+def apply_usage_to_rollups(db: Session, events: Iterable[Tuple[int, int, datetime]]):
+    """
+    Add usage events to the rollups in the caller's transaction (no commit).
+    """
+    daily, monthly = _aggregate(events)
+    _upsert(db, UsageDailyRollup, "day", daily)
+    _upsert(db, UsageMonthlyRollup, "month", monthly)
+
+
+def _rebuild(db: Session, model, key_column: str, key_expression):
+    db.execute(delete(model))
+    aggregated = (
+        select(
+            UsageHistory.supply_id,
+            key_expression.label(key_column),
+            func.sum(UsageHistory.quantity_used),
+            func.count(UsageHistory.id),
+            func.sum(UsageHistory.quantity_used * UsageHistory.quantity_used),
+            func.min(UsageHistory.quantity_used),
+            func.max(UsageHistory.quantity_used),
+        )
+        .where(UsageHistory.timestamp.is_not(None))
+        .group_by(UsageHistory.supply_id, key_expression)
+    )
+    db.execute(
+        insert(model).from_select(
+            ["supply_id", key_column, "total_used", "entries", "sum_squares", "min_used", "max_used"],
+            aggregated,
+        )
+    )
+
+
+def rebuild_rollups(db: Session):
+    """
+    Recompute both rollup tables from usage_history and commit.
+    """
+    _rebuild(db, UsageDailyRollup, "day", day_expression(db, UsageHistory.timestamp))
+    _rebuild(db, UsageMonthlyRollup, "month", month_expression(db, UsageHistory.timestamp))
+    db.commit()
+
+
+def ensure_rollups(db: Session):
+    """
+    Backfill the rollups when usage exists but they were never built.
+    """
+    has_usage = db.query(UsageHistory.id).first() is not None
+    has_rollups = db.query(UsageDailyRollup.supply_id).first() is not None
+    if has_usage and not has_rollups:
+        rebuild_rollups(db)
+
+
+if __name__ == "__main__":
+    from ..database.db import Base, SessionLocal, engine
+    from . import data_version  # noqa: F401  (bump the version other processes cache by)
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as session:
+        rebuild_rollups(session)
+    print("Usage rollups rebuilt.")
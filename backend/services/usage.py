@@ -0,0 +1,261 @@
+"""
+Recording supply usage.
+
+Each usage entry is one short write transaction: a conditional decrement
+
+    UPDATE supplies SET quantity = quantity - :n WHERE id = :id AND quantity >= :n
+
+followed by the usage_history insert, the rollup upserts and the supply's
+alert state. The stock check happens inside the UPDATE, so two concurrent
+requests can no longer both pass it and drive stock negative, and the
+transaction starts by taking the write lock instead of upgrading a read
+(which fails outright under WAL when another writer got in first). A
+transaction that still hits SQLITE_BUSY is rolled back and retried with a
+short backoff. The new quantity goes to /inventory/events subscribers once
+the transaction commits.
+
+Batches (POST /inventory/usage/batch) fold their events into one
+conditional decrement per supply, sent as a single executemany, and bulk
+insert the usage rows, all in one transaction.
+"""
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from ..models.supplies import Supplies, UsageHistory
+from ..schemas.supply import UsageCreate
+from .alert_state import refresh_alert_state
+from .push import push_broker, stage_push
+from .rollups import apply_usage_to_rollups
+
+# Attempts per usage entry when SQLite reports the database as busy
+USAGE_WRITE_ATTEMPTS = int(os.getenv("USAGE_WRITE_ATTEMPTS", "5"))
+USAGE_RETRY_BACKOFF_SECONDS = float(os.getenv("USAGE_RETRY_BACKOFF_SECONDS", "0.02"))
+# Most events one POST /usage/batch may carry
+MAX_USAGE_BATCH = int(os.getenv("MAX_USAGE_BATCH", "10000"))
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+SUPPLY_NOT_FOUND = "Supply not found"
+INSUFFICIENT_STOCK = "Insufficient supply quantity"
+
+
+def is_busy_error(exc: OperationalError) -> bool:
+    """
+    SQLITE_BUSY/SQLITE_LOCKED, including extended codes such as BUSY_SNAPSHOT.
+    """
+    code = getattr(exc.orig, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    return "database is locked" in str(exc.orig)
+
+
+def _backoff(attempt: int) -> float:
+    # Jittered exponential backoff so retrying writers don't collide again
+    return USAGE_RETRY_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Database is busy, try again",
+        headers={"Retry-After": "1"},
+    )
+
+
+def consume_supply(db: Session, supply_id: int, quantity_used: int, timestamp: Optional[datetime] = None) -> UsageHistory:
+    """
+    Decrement stock and log the usage in the caller's transaction; the
+    caller commits. Raises 404/400 if the supply is missing or short.
+    """
+    remaining = db.execute(
+        update(Supplies)
+        .where(Supplies.id == supply_id, Supplies.quantity >= quantity_used)
+        .values(quantity=Supplies.quantity - quantity_used)
+        .returning(Supplies.quantity)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if remaining is None:
+        # Only the failure path pays for a second look
+        if db.execute(select(Supplies.id).where(Supplies.id == supply_id)).first() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=SUPPLY_NOT_FOUND)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INSUFFICIENT_STOCK)
+    entry = UsageHistory(supply_id=supply_id, quantity_used=quantity_used, timestamp=timestamp or datetime.utcnow())
+    db.add(entry)
+    db.flush()
+    apply_usage_to_rollups(db, [(supply_id, quantity_used, entry.timestamp)])
+    stage_push(db, "supply", {"id": supply_id, "quantity": remaining})
+    refresh_alert_state(db, [supply_id], now=entry.timestamp)
+    return entry
+
+
+def _retrying(db: Session, write, *args):
+    """
+    Run write(db, *args) and commit, retrying the whole transaction while
+    SQLite is busy.
+    """
+    for attempt in range(USAGE_WRITE_ATTEMPTS):
+        try:
+            result = write(db, *args)
+            db.commit()
+            return result
+        except OperationalError as exc:
+            db.rollback()
+            if not is_busy_error(exc):
+                raise
+            time.sleep(_backoff(attempt))
+        except Exception:
+            db.rollback()
+            raise
+    raise _busy()
+
+
+def record_usage_entry(db: Session, supply_id: int, quantity_used: int) -> UsageHistory:
+    """
+    consume_supply in its own transaction, retried while SQLite is busy.
+    """
+    return _retrying(db, consume_supply, supply_id, quantity_used)
+
+
+# (index in the request, supply_id, quantity_used)
+UsageEvent = Tuple[int, int, int]
+
+_DECREMENT = (
+    update(Supplies.__table__)
+    .where(Supplies.id == bindparam("target"), Supplies.quantity >= bindparam("amount"))
+    .values(quantity=Supplies.quantity - bindparam("amount"))
+)
+
+
+def parse_usage_batch(body: bytes, ndjson: bool) -> Tuple[List[UsageEvent], Dict[int, str]]:
+    """
+    Validate a JSON array (or NDJSON lines) of UsageCreate objects. Returns
+    the valid events and an error message per rejected index.
+    """
+    if ndjson:
+        lines = [line for line in body.splitlines() if line.strip()]
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(ValueError("Invalid JSON"))
+    else:
+        try:
+            items = json.loads(body or b"[]")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array")
+    if len(items) > MAX_USAGE_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_USAGE_BATCH} usage events per batch",
+        )
+
+    events, rejected = [], {}
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            rejected[index] = str(item)
+        elif not isinstance(item, dict) or "supply_id" not in item:
+            rejected[index] = "Expected an object with supply_id and quantity_used"
+        else:
+            try:
+                usage = UsageCreate(**item)
+            except ValidationError as exc:
+                rejected[index] = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+                continue
+            events.append((index, usage.supply_id, usage.quantity_used))
+    return events, rejected
+
+
+def _totals(events: List[UsageEvent]) -> Dict[int, int]:
+    totals = defaultdict(int)
+    for _, supply_id, quantity_used in events:
+        totals[supply_id] += quantity_used
+    return totals
+
+
+def _decrement(db: Session, totals: Dict[int, int]) -> bool:
+    """
+    Apply every per-supply total, or report False if any supply was
+    missing or short (the caller rolls back).
+    """
+    params = [{"target": supply_id, "amount": amount} for supply_id, amount in totals.items()]
+    if db.get_bind().dialect.supports_sane_multi_rowcount:
+        return db.execute(_DECREMENT, params).rowcount == len(params)
+    # Drivers such as psycopg2 don't report executemany row counts
+    return sum(db.execute(_DECREMENT, param).rowcount for param in params) == len(params)
+
+
+def _plan(db: Session, events: List[UsageEvent]) -> Tuple[List[UsageEvent], Dict[int, str]]:
+    """
+    Split events into the ones current stock covers (in request order)
+    and the ones it doesn't.
+    """
+    supply_ids = {supply_id for _, supply_id, _ in events}
+    remaining = dict(db.execute(select(Supplies.id, Supplies.quantity).where(Supplies.id.in_(supply_ids))).all())
+    accepted, rejected = [], {}
+    for event in events:
+        index, supply_id, quantity_used = event
+        if supply_id not in remaining:
+            rejected[index] = SUPPLY_NOT_FOUND
+        elif (remaining[supply_id] or 0) >= quantity_used:
+            remaining[supply_id] -= quantity_used
+            accepted.append(event)
+        else:
+            rejected[index] = INSUFFICIENT_STOCK
+    return accepted, rejected
+
+
+def consume_usage_batch(db: Session, events: List[UsageEvent], atomic: bool) -> Tuple[Dict[int, int], Dict[int, str]]:
+    """
+    Apply a batch in the caller's transaction. Returns the new usage id per
+    accepted index and an error per rejected one. With atomic=True either
+    every event is applied or none is.
+    """
+    accepted, rejected = events, {}
+    # Usually everything fits: one executemany, no reads
+    if events and not _decrement(db, _totals(events)):
+        db.rollback()
+        for _ in range(USAGE_WRITE_ATTEMPTS):
+            accepted, rejected = _plan(db, events)
+            if atomic and rejected:
+                return {}, rejected
+            if not accepted or _decrement(db, _totals(accepted)):
+                break
+            # Stock moved between the read and the decrement; plan again
+            db.rollback()
+        else:
+            raise _busy()
+    if not accepted:
+        return {}, rejected
+
+    timestamp = datetime.utcnow()
+    ids = db.execute(
+        insert(UsageHistory).returning(UsageHistory.id, sort_by_parameter_order=True),
+        [{"supply_id": supply_id, "quantity_used": quantity_used, "timestamp": timestamp} for _, supply_id, quantity_used in accepted],
+    ).scalars().all()
+    apply_usage_to_rollups(db, [(supply_id, quantity_used, timestamp) for _, supply_id, quantity_used in accepted])
+    touched = {supply_id for _, supply_id, _ in accepted}
+    # Only read the new quantities back when someone is listening
+    if push_broker.subscriber_count:
+        for supply_id, quantity in db.execute(select(Supplies.id, Supplies.quantity).where(Supplies.id.in_(touched))):
+            stage_push(db, "supply", {"id": supply_id, "quantity": quantity})
+    refresh_alert_state(db, touched, now=timestamp)
+    return {index: usage_id for (index, _, _), usage_id in zip(accepted, ids)}, rejected
+
+
+def record_usage_batch(db: Session, events: List[UsageEvent], atomic: bool):
+    return _retrying(db, consume_usage_batch, events, atomic)
@@ -0,0 +1,218 @@
+"""
+Write-behind buffer for POST /inventory/usage (group commit).
+
+Enabled with USAGE_BUFFER=true. Handlers enqueue their event and a
+background thread collects events for USAGE_BUFFER_WINDOW_MS (or until
+USAGE_BUFFER_MAX_BATCH are waiting), then applies them together through
+consume_usage_batch in partial mode: one transaction, one commit and one
+decrement per supply for the whole group, while each event still gets its
+own outcome.
+
+USAGE_BUFFER_ACK picks when the request is answered:
+  commit   after the group containing the event has committed (default);
+           stock errors still come back as 404/400
+  enqueue  as soon as the event is queued (202); faster, but a rejected
+           or lost event is only logged
+
+The queue is bounded by USAGE_BUFFER_CAPACITY; once full, new events are
+refused with 503 and Retry-After. Shutdown flushes whatever is queued.
+An event whose handler was cancelled before its group was taken (client
+gone, server shutting down) is dropped unrecorded; once taken, it is
+committed even if the handler stops waiting.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from fastapi import HTTPException, status
+
+from ..database.db import SessionLocal
+from .usage import SUPPLY_NOT_FOUND, record_usage_batch
+
+logger = logging.getLogger(__name__)
+
+USAGE_BUFFER_ENABLED = os.getenv("USAGE_BUFFER", "false").lower() in ("1", "true", "yes")
+USAGE_BUFFER_WINDOW_MS = float(os.getenv("USAGE_BUFFER_WINDOW_MS", "5"))
+USAGE_BUFFER_MAX_BATCH = int(os.getenv("USAGE_BUFFER_MAX_BATCH", "1000"))
+USAGE_BUFFER_CAPACITY = int(os.getenv("USAGE_BUFFER_CAPACITY", "10000"))
+USAGE_BUFFER_ACK = os.getenv("USAGE_BUFFER_ACK", "commit")
+
+ACK_MODES = ("commit", "enqueue")
+
+
+def _rejection(error: str) -> HTTPException:
+    code = status.HTTP_404_NOT_FOUND if error == SUPPLY_NOT_FOUND else status.HTTP_400_BAD_REQUEST
+    return HTTPException(status_code=code, detail=error)
+
+
+class UsageBuffer:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        window_ms: float = USAGE_BUFFER_WINDOW_MS,
+        max_batch: int = USAGE_BUFFER_MAX_BATCH,
+        capacity: int = USAGE_BUFFER_CAPACITY,
+        ack: str = USAGE_BUFFER_ACK,
+    ):
+        if ack not in ACK_MODES:
+            raise ValueError(f"USAGE_BUFFER_ACK must be one of {ACK_MODES}, not {ack!r}")
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.capacity = capacity
+        self.ack = ack
+        self._pending = deque()  # (supply_id, quantity_used, future, enqueued at)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._in_flight = 0
+        # Metrics
+        self.flushes = 0
+        self.flushed_events = 0
+        self.rejected_events = 0
+        self.failed_flushes = 0
+        self.refused_events = 0
+        self.cancelled_events = 0
+        self.max_depth = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._total_flush_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="usage-buffer", daemon=True)
+        self._thread.start()
+
+    def submit(self, supply_id: int, quantity_used: int) -> Future:
+        """
+        Queue one usage event. The future resolves to the new usage id, or
+        fails with the HTTPException record_usage would have raised.
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Shutting down")
+            if len(self._pending) >= self.capacity:
+                self.refused_events += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Usage buffer is full, try again",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending.append((supply_id, quantity_used, future, time.monotonic()))
+            self.max_depth = max(self.max_depth, len(self._pending))
+            # Wake the flusher for the first event of a window and for a full batch only
+            if len(self._pending) in (1, self.max_batch):
+                self._condition.notify()
+        if self.ack == "enqueue":
+            future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Buffered usage event not recorded: %s", future.exception())
+
+    def _next_group(self):
+        with self._condition:
+            while True:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return None
+                # Give producers the window to join this group
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                taken = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                # Running futures can no longer be cancelled by their handler;
+                # events already cancelled are dropped
+                group = [event for event in taken if event[2].set_running_or_notify_cancel()]
+                self.cancelled_events += len(taken) - len(group)
+                if group:
+                    self._in_flight = len(group)
+                    return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            if group is None:
+                return
+            try:
+                self._flush(group)
+            except Exception as exc:
+                # Keep flushing later groups; nobody may wait forever on this one
+                logger.exception("Usage buffer flush of %d events crashed", len(group))
+                for _, _, future, _ in group:
+                    if not future.done():
+                        future.set_exception(exc)
+                with self._condition:
+                    self._in_flight = 0
+
+    def _flush(self, group):
+        events = [(index, supply_id, quantity_used) for index, (supply_id, quantity_used, _, _) in enumerate(group)]
+        started = time.monotonic()
+        try:
+            with self.session_factory() as db:
+                accepted, rejected = record_usage_batch(db, events, atomic=False)
+        except Exception as exc:
+            logger.exception("Usage buffer flush of %d events failed", len(group))
+            accepted, rejected, failure = {}, {}, exc
+        else:
+            failure = None
+        finished = time.monotonic()
+
+        for index, (_, _, future, enqueued) in enumerate(group):
+            if index in accepted:
+                future.set_result(accepted[index])
+            elif index in rejected:
+                future.set_exception(_rejection(rejected[index]))
+            else:
+                future.set_exception(failure)
+        with self._condition:
+            elapsed = finished - started
+            self._in_flight = 0
+            self.flushes += 1
+            self.flushed_events += len(accepted)
+            self.rejected_events += len(rejected)
+            self.failed_flushes += failure is not None
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self._total_flush_seconds += elapsed
+            self.max_wait_seconds = max(self.max_wait_seconds, finished - group[0][3])
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "ack": self.ack,
+                "window_ms": self.window * 1000,
+                "capacity": self.capacity,
+                "depth": len(self._pending),
+                "in_flight": self._in_flight,
+                "max_depth": self.max_depth,
+                "flushes": self.flushes,
+                "flushed_events": self.flushed_events,
+                "rejected_events": self.rejected_events,
+                "refused_events": self.refused_events,
+                "cancelled_events": self.cancelled_events,
+                "failed_flushes": self.failed_flushes,
+                "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+                "mean_flush_ms": round(self._total_flush_seconds / self.flushes * 1000, 3) if self.flushes else 0.0,
+                "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+            }
+
+    def shutdown(self, timeout: float = 30):
+        """
+        Stop taking events and flush everything already queued.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+
+usage_buffer = UsageBuffer() if USAGE_BUFFER_ENABLED else None
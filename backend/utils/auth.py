@@ -1,20 +1,32 @@
 from datetime import datetime, timedelta
+from typing import Optional
 import os
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Cookie, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 
-from backend.models.users import Users
-from ..database.db import get_db
+from backend.models.users import UserRole, Users
+from sqlalchemy import select
+
+from ..database.db import run_in_session
+from .cache import TTLCache
+from .passwords import pwd_context
 
 # Secret key and algorithm for JWT
 SECRET_KEY = "your_secret_key_here"
 ALGORITHM = "HS256"
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# "stateless" builds the current user from the token claims plus a cached
+# status check; "database" loads the full Users row on every request
+AUTH_MODE = os.getenv("AUTH_MODE", "stateless")
+
+# Bounded LRU+TTL cache of Users rows keyed by username. Set
+# USER_CACHE_ENABLED=false (e.g. in tests) to always read the users table.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_MAXSIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "30")),
+    enabled=os.getenv("USER_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+)
 
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -50,14 +62,39 @@ def verify_jwt_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-def get_user_by_email(email: str, db: Session = Depends(get_db)):
-    db = next(get_db())
-    db_user = db.query(Users).filter(Users.username == email).first()
+def _select_user(db, username: str) -> Optional[Users]:
+    return db.execute(select(Users).where(Users.username == username)).scalars().first()
+
+async def load_user(username: str) -> Optional[Users]:
+    """
+    Users row for `username` straight from the database (None if there is
+    none), bypassing the user cache.
+    """
+    return await run_in_session(_select_user, username)
+
+async def get_cached_user(username: str) -> Optional[Users]:
+    """
+    Users row for `username` (None if there is none), served from the
+    user cache when possible.
+    """
+    hit, user = user_cache.lookup(username)
+    if hit:
+        return user
+    token = user_cache.token()
+    user = await load_user(username)
+    user_cache.set(username, user, token=token)
+    return user
+
+async def get_user_by_email(email: str):
+    db_user = await get_cached_user(email)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.close()
     return db_user
 
+# Call after creating a user, changing its role or password hash, or deleting it
+def invalidate_user(username: str):
+    user_cache.invalidate(username)
+
 # Hash password
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -94,7 +131,24 @@ def verify_password(plain: str, hashed: str):
 #     except jwt.JWTError:
 #         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def get_current_user(request: Request, db: Session = Depends(get_db)):
+# Authenticated user built from verified token claims (no users-table row)
+class Principal:
+    def __init__(self, id: int, username: str, first_name: str, last_name: str, role: UserRole):
+        self.id = id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.role = role
+
+async def get_user_status(username: str) -> Optional[str]:
+    """
+    Current role of `username` (None if the user no longer exists); a
+    cache hit costs no database round trip.
+    """
+    user = await get_cached_user(username)
+    return user.role.value if user else None
+
+async def get_current_user(request: Request):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -108,15 +162,30 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
         raise credentials_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"Decoded payload: {payload}")  # Debugging line
         username: str = payload.get("username")
         if username is None:
             raise credentials_exception
     except JWTError:
-        print("Exception decoding token")
         raise credentials_exception
-    user = get_user_by_email(username)
-    if user is None:
-        raise credentials_exception
-    return user
 
+    if AUTH_MODE == "database":
+        try:
+            return await get_user_by_email(username)
+        except HTTPException:
+            raise credentials_exception
+
+    # Stateless: trust the signed claims, but reject tokens for users that
+    # were removed or whose role changed since the token was issued
+    try:
+        principal = Principal(
+            id=int(payload["sub"]),
+            username=username,
+            first_name=payload.get("first_name", ""),
+            last_name=payload.get("last_name", ""),
+            role=UserRole(payload["role"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise credentials_exception
+    if await get_user_status(username) != principal.role.value:
+        raise credentials_exception
+    return principal
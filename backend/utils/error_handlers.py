@@ -49,6 +49,7 @@ def register_error_handlers(app):
         return JSONResponse(
             status_code=exc.status_code,
             content={"error": exc.detail},
+            headers=getattr(exc, "headers", None),
         )
 
     @app.exception_handler(ProcurementAPIError)
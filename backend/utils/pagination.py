@@ -0,0 +1,18 @@
+import base64
+import json
+from fastapi import HTTPException, status
+
+# Opaque keyset cursors: the client only ever echoes back what it was given
+def encode_cursor(after_id: int) -> str:
+    payload = json.dumps({"after_id": after_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["after_id"]
+        if not isinstance(after_id, int) or after_id < 0:
+            raise ValueError(after_id)
+        return after_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
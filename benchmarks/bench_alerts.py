@@ -0,0 +1,116 @@
+"""
+Waste alert detection over a large catalogue: the old in-Python loop vs the
+set-based rule query in services/alerts.py.
+
+Seeds a scratch database with --supplies supplies spread over a few
+categories (a third expiring within the week, two weeks of daily rollups
+for half of them), then times both detectors, counts the SQL statements
+each issues, checks they produce the same alerts, and repeats the rule
+query with extra rules to show the statement count stays at one.
+
+    PYTHONPATH=. python benchmarks/bench_alerts.py
+    PYTHONPATH=. python benchmarks/bench_alerts.py --supplies 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend.database.db import Base, create_db_engine
+from backend.models import alerts, pricing, rollups, supplies  # noqa: F401  (register tables)
+from backend.models.rollups import UsageDailyRollup
+from backend.models.supplies import Supplies
+from backend.services.alerts import ALERT_RULES, AlertRule, evaluate_alert_rules
+from backend.services.analytics import load_daily_usage_frame, window_totals
+
+CATEGORIES = ("Office", "Kitchen", "Cleaning", "IT", "Furniture")
+
+
+# detect_waste_alerts before the rule engine
+def legacy_detect_waste_alerts(db, now):
+    alerts, threshold = [], 100
+    one_week_ago = now - timedelta(days=7)
+    supplies = db.query(Supplies).order_by(Supplies.id).all()
+    recent_usage_by_supply = window_totals(load_daily_usage_frame(db, since=one_week_ago), one_week_ago)
+    for supply in supplies:
+        if supply.quantity > threshold:
+            alerts.append({"supply_id": supply.id, "name": supply.name, "alert": "Overstocking", "quantity": supply.quantity})
+        elif supply.quantity < threshold:
+            alerts.append({"supply_id": supply.id, "name": supply.name, "alert": "Low stock", "quantity": supply.quantity})
+        if supply.expiration_date and supply.expiration_date <= now + timedelta(days=7):
+            recent_usage = recent_usage_by_supply.get(supply.id, 0)
+            if recent_usage < (0.3 * supply.quantity):
+                alerts.append({
+                    "supply_id": supply.id,
+                    "name": supply.name,
+                    "alert": "Nearing expiration with slow usage",
+                    "quantity": supply.quantity,
+                    "expiration_date": supply.expiration_date,
+                    "recent_weekly_usage": recent_usage,
+                })
+    return alerts
+
+
+def seed(engine, count, now):
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    with engine.begin() as connection:
+        connection.execute(insert(Supplies), [
+            {
+                "id": supply_id,
+                "name": f"Supply {supply_id}",
+                "category": rng.choice(CATEGORIES),
+                "quantity": rng.randint(0, 200),
+                "expiration_date": now + timedelta(days=rng.randint(1, 90)) if supply_id % 3 == 0 else None,
+            }
+            for supply_id in range(1, count + 1)
+        ])
+        connection.execute(insert(UsageDailyRollup), [
+            {"supply_id": supply_id, "day": (now - timedelta(days=age)).date(), "total_used": used, "entries": 1, "sum_squares": used * used, "min_used": used, "max_used": used}
+            for supply_id in range(1, count + 1, 2)
+            for age, used in ((age, rng.randint(1, 20)) for age in range(14))
+        ])
+
+
+def timed(engine, label, detect):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        started = time.perf_counter()
+        alerts = detect(db)
+        elapsed = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", listener)
+    print(f"{label:>22}: {elapsed * 1000:8.1f} ms  {len(statements)} statement(s)  {len(alerts)} alerts")
+    return alerts
+
+
+def main(count):
+    now = datetime.utcnow()
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'alerts.db')}")
+        seed(engine, count, now)
+        print(f"{count} supplies")
+        legacy = timed(engine, "legacy loop", lambda db: legacy_detect_waste_alerts(db, now))
+        rules = timed(engine, "rule query", lambda db: evaluate_alert_rules(db, now=now))
+        assert rules == legacy, "rule query disagrees with the legacy detector"
+        extra = [
+            AlertRule("Out of stock", lambda a: a.quantity == 0),
+            AlertRule("Expired", lambda a: a.days_to_expiry < 0),
+            AlertRule("Unused this week", lambda a: (a.recent_usage == 0) & (a.quantity > 0)),
+        ]
+        timed(engine, f"rule query, {len(ALERT_RULES) + len(extra)} rules", lambda db: evaluate_alert_rules(db, now=now, rules=[*ALERT_RULES, *extra]))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--supplies", type=int, default=50_000)
+    args = parser.parse_args()
+    main(args.supplies)
@@ -0,0 +1,107 @@
+"""
+Load test: the sync inventory handlers vs the same handlers on the async
+stack (what ASYNC_DB=true serves).
+
+The app's sync handlers stay under /inventory; the single-supply and
+supply-page handlers are mounted again under /async through db_handler on
+an aiosqlite/asyncpg engine. --requests GETs for single supplies and
+supply pages are fired at --concurrency, optionally while --analytics
+clients keep the threadpool busy with /inventory/recommendations. Reports
+requests/s and latency percentiles for each stack.
+
+Sync handlers hold a threadpool worker for the whole request; async ones
+only wait on the driver. That can pay off when requests spend their time
+waiting on a network database (PostgreSQL, asyncpg), which is why
+ASYNC_DB=auto only turns the async stack on there. aiosqlite runs SQLite
+on a helper thread per connection, so against a local SQLite file both
+stacks do the same CPU work and the async one adds thread hand-offs.
+Run it with the sync stack in place (ASYNC_DB=false on PostgreSQL):
+
+    PYTHONPATH=. python benchmarks/bench_async_load.py
+    PYTHONPATH=. python benchmarks/bench_async_load.py --concurrency 200 --analytics 40
+    ASYNC_DB=false DATABASE_URL=postgresql://... PYTHONPATH=. python benchmarks/bench_async_load.py
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+import httpx
+from fastapi import APIRouter
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.database import db as database
+from backend.database.db import SessionLocal
+from backend.main import app
+from backend.models.supplies import Supplies
+from backend.routes import inventory
+from backend.schemas.supply import SupplyCreate
+
+# routes/inventory turns on SQL echo at import time
+logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+if database.ASYNC_DB_ENABLED:
+    raise SystemExit("Run with the sync stack in place (ASYNC_DB=false); /async is added here")
+
+# The same handlers, served the way ASYNC_DB=true would
+database.ASYNC_DB_ENABLED = True
+database.async_engine = database.create_async_db_engine(database.DATABASE_URL)
+database.AsyncSessionLocal = async_sessionmaker(database.async_engine, autoflush=False, expire_on_commit=False)
+async_stack = APIRouter()
+async_stack.get("/supplies/{id}", response_model=SupplyCreate)(database.db_handler(inventory.get_supply_by_id.__wrapped__))
+async_stack.get("/supplies", response_model=list[SupplyCreate])(database.db_handler(inventory.list_supplies.__wrapped__))
+app.include_router(async_stack, prefix="/async")
+
+
+async def run(client, prefix, requests, concurrency, supply_ids):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        path = f"{prefix}/supplies/{random.choice(supply_ids)}" if i % 2 else f"{prefix}/supplies?limit=20"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95)], latencies[-1], errors
+
+
+async def analytics_load(client, done):
+    while not done.is_set():
+        await client.get("/inventory/recommendations")
+
+
+async def main(requests, concurrency, analytics):
+    with SessionLocal() as db:
+        supply_ids = [supply_id for (supply_id,) in db.query(Supplies.id)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for prefix in ("/inventory", "/async"):
+            await run(client, prefix, 50, 10, supply_ids)  # warm up
+        print(f"{requests} requests at concurrency {concurrency}, {analytics} concurrent analytics clients")
+        for label, prefix in (("sync", "/inventory"), ("async", "/async")):
+            done = asyncio.Event()
+            background = [asyncio.create_task(analytics_load(client, done)) for _ in range(analytics)]
+            throughput, p50, p95, worst, errors = await run(client, prefix, requests, concurrency, supply_ids)
+            done.set()
+            await asyncio.gather(*background)
+            print(f"{label:>6}: {throughput:8.1f} req/s  p50={p50 * 1000:7.1f}ms  p95={p95 * 1000:7.1f}ms  "
+                  f"max={worst * 1000:7.1f}ms  errors={errors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--analytics", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.analytics))
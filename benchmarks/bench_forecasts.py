@@ -0,0 +1,96 @@
+"""
+Order recommendations over a large catalogue: computing the usage forecast
+per request vs reading it from the nightly snapshot, and the nightly
+refresh itself in-process vs across a process pool.
+
+Seeds a scratch database with --supplies supplies and 30 days of daily
+rollups for most of them, refreshes forecast_snapshots in one process and
+then with --workers processes (checking both write the same rows), and
+times order_recommendations() served live and from the snapshot.
+
+    PYTHONPATH=. python benchmarks/bench_forecasts.py
+    PYTHONPATH=. python benchmarks/bench_forecasts.py --supplies 200000 --workers 8 --chunk-size 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.database.db import Base, create_db_engine
+from backend.models import alerts, forecasts, pricing, rollups, supplies  # noqa: F401  (register tables)
+from backend.models.forecasts import ForecastSnapshot
+from backend.models.rollups import UsageDailyRollup
+from backend.models.supplies import Supplies
+from backend.services.forecasts import order_recommendations, refresh_forecasts
+
+CATEGORIES = ("Office", "Kitchen", "Cleaning", "IT", "Furniture")
+
+
+def seed(engine, count, now):
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    with engine.begin() as connection:
+        connection.execute(insert(Supplies), [
+            {
+                "id": supply_id,
+                "name": f"Supply {supply_id}",
+                "category": rng.choice(CATEGORIES),
+                "quantity": rng.randint(0, 200),
+                "primary_supplier": "OutOfStock Ltd" if supply_id % 50 == 0 else "Acme",
+            }
+            for supply_id in range(1, count + 1)
+        ])
+        connection.execute(insert(UsageDailyRollup), [
+            {"supply_id": supply_id, "day": (now - timedelta(days=age)).date(), "total_used": used, "entries": 1, "sum_squares": used * used, "min_used": used, "max_used": used}
+            for supply_id in range(1, count + 1)
+            if supply_id % 5
+            for age, used in ((age, rng.randint(1, 20)) for age in range(0, 30, 2))
+        ])
+
+
+def snapshot_rows(db):
+    return db.execute(
+        select(ForecastSnapshot.supply_id, ForecastSnapshot.recent_entries, ForecastSnapshot.avg_weekly_usage, ForecastSnapshot.std_dev)
+        .order_by(ForecastSnapshot.supply_id)
+    ).all()
+
+
+def timed(label, run):
+    started = time.perf_counter()
+    result = run()
+    print(f"{label:>28}: {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main(count, workers, chunk_size):
+    now = datetime.utcnow()
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'forecasts.db')}")
+        seed(engine, count, now)
+        Session = sessionmaker(bind=engine)
+        print(f"{count} supplies")
+        with Session() as db:
+            timed("refresh, 1 process", lambda: refresh_forecasts(db, now=now, workers=1))
+            in_process = snapshot_rows(db)
+            timed(f"refresh, {workers} processes", lambda: refresh_forecasts(db, now=now, workers=workers, chunk_size=chunk_size))
+            assert snapshot_rows(db) == in_process, "process pool disagrees with the in-process refresh"
+        with Session() as db:
+            live, _ = timed("recommendations, live", lambda: order_recommendations(db, fresh=True))
+        with Session() as db:
+            cached, _ = timed("recommendations, snapshot", lambda: order_recommendations(db))
+        assert len(cached) == len(live) == count
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--supplies", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+    main(args.supplies, args.workers, args.chunk_size)
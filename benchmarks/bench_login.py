@@ -0,0 +1,75 @@
+"""
+Login throughput under concurrency, and what it does to other endpoints.
+
+Fires --logins concurrent POST /auth/login requests at the app in-process
+while a second client keeps polling GET /inventory/supplies, then reports
+logins/s, 503 rejections and the supplies latency during the storm.
+Compare the bcrypt process pool with the old threadpool behaviour:
+
+    PYTHONPATH=. python benchmarks/bench_login.py
+    PASSWORD_WORKERS=0 PASSWORD_QUEUE_LIMIT=100000 PYTHONPATH=. python benchmarks/bench_login.py
+
+Run it against a scratch database: it logs in as the seeded "alice" user.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from backend.main import app
+from backend.utils.passwords import BCRYPT_ROUNDS, password_pool
+
+
+async def login_storm(client, logins, concurrency, statuses):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await client.post("/auth/login", json={"username": "alice", "password": "securepassword123"})
+            statuses.append(response.status_code)
+
+    await asyncio.gather(*(one() for _ in range(logins)))
+
+
+async def poll_supplies(client, done, latencies):
+    while not done.is_set():
+        started = time.perf_counter()
+        await client.get("/inventory/supplies", params={"limit": 20})
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def main(logins, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up the pool so worker start-up is not counted
+        await client.post("/auth/login", json={"username": "alice", "password": "securepassword123"})
+
+        statuses, latencies, done = [], [], asyncio.Event()
+        poller = asyncio.create_task(poll_supplies(client, done, latencies))
+        started = time.perf_counter()
+        await login_storm(client, logins, concurrency, statuses)
+        elapsed = time.perf_counter() - started
+        done.set()
+        await poller
+
+    ok = statuses.count(200)
+    print(f"bcrypt rounds={BCRYPT_ROUNDS} workers={password_pool.workers} queue_limit={password_pool.queue_limit}")
+    print(f"{logins} logins at concurrency {concurrency}: {elapsed:.2f}s, {ok / elapsed:.1f} successful logins/s")
+    print(f"  200: {ok}  503: {statuses.count(503)}  other: {len(statuses) - ok - statuses.count(503)}")
+    if latencies:
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+        print(f"  /inventory/supplies during storm: n={len(latencies)} "
+              f"p50={statistics.median(latencies) * 1000:.1f}ms p95={p95 * 1000:.1f}ms")
+    password_pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
@@ -0,0 +1,94 @@
+"""
+PDF usage report build time and memory at increasing history sizes.
+
+For each size a scratch SQLite database is filled with that many usage rows,
+then the chunked report (backend.services.exports.write_pdf) is rendered
+from the streamed query. Runtime should grow linearly: rows/s stays roughly
+constant across sizes. --legacy also times the old single-Table layout for
+sizes up to --legacy-max rows.
+
+    PYTHONPATH=. python benchmarks/bench_pdf_report.py
+    PYTHONPATH=. python benchmarks/bench_pdf_report.py --sizes 10000 100000 --legacy
+"""
+import argparse
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend.database.db import Base
+from backend.models import rollups, supplies  # noqa: F401  (register tables)
+from backend.services.exports import EXPORT_COLUMNS, iter_usage_rows, write_pdf
+
+SUPPLIES = 50
+
+
+def build_database(path, rows):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        "INSERT INTO supplies (id, name, category, quantity, primary_supplier) VALUES (?, ?, 'Bench', 100, 'Bench Supplier')",
+        [(i, f"Supply {i}") for i in range(1, SUPPLIES + 1)],
+    )
+    now = datetime(2025, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append((random.randint(1, SUPPLIES), random.randint(1, 20), (now - timedelta(seconds=i * 30)).isoformat(sep=" ")))
+        if len(batch) == 50_000:
+            connection.executemany("INSERT INTO usage_history (supply_id, quantity_used, timestamp) VALUES (?, ?, ?)", batch)
+            batch.clear()
+    connection.executemany("INSERT INTO usage_history (supply_id, quantity_used, timestamp) VALUES (?, ?, ?)", batch)
+    connection.commit()
+    connection.close()
+    return create_engine(f"sqlite:///{path}")
+
+
+def legacy_pdf(db):
+    # The pre-chunking layout: every row in one Table
+    with tempfile.TemporaryFile() as output:
+        table_data = [EXPORT_COLUMNS] + [[name, quantity, timestamp.strftime("%Y-%m-%d %H:%M")] for name, quantity, timestamp in iter_usage_rows(db)]
+        SimpleDocTemplate(output).build([Table(table_data)])
+        return output.tell()
+
+
+def chunked_pdf(db):
+    return sum(len(chunk) for chunk in write_pdf(iter_usage_rows(db)))
+
+
+def measure(label, render, engine, rows):
+    with Session(engine) as db:
+        started = time.perf_counter()
+        size = render(db)
+        elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f"{label:>8} {rows:>9,} rows: {elapsed:8.2f}s  {rows / elapsed:9,.0f} rows/s  "
+          f"{size / 1e6:7.1f} MB pdf  peak RSS {peak} MB")
+
+
+def main(sizes, legacy, legacy_max):
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            engine = build_database(os.path.join(directory, f"bench_{rows}.db"), rows)
+            measure("chunked", chunked_pdf, engine, rows)
+            if legacy and rows <= legacy_max:
+                measure("legacy", legacy_pdf, engine, rows)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--legacy-max", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.sizes, args.legacy, args.legacy_max)
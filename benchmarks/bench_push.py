@@ -0,0 +1,92 @@
+"""
+Fan-out of pushed events to many idle SSE subscribers on one event loop.
+
+Opens --subscribers subscribers on a PushBroker, each drained by its own
+task the way GET /inventory/events does, and measures the memory they hold
+while idle. A writer thread (standing in for request handlers, the usage
+buffer and the alert sweeper) then publishes --events events at --rate per
+second; the run reports how far behind the writer the last subscriber
+finished, and how many fell far enough behind to be sent a resync. A few
+subscribers never read at all, to show they are resynced instead of
+holding up the others.
+
+    PYTHONPATH=. python benchmarks/bench_push.py
+    PYTHONPATH=. python benchmarks/bench_push.py --subscribers 20000 --rate 200
+"""
+import argparse
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from backend.services.push import RESYNC, PushBroker
+
+
+async def consume(broker, subscriber, expected):
+    """
+    Read until every event arrived (True) or a resync came instead (False).
+    """
+    received = 0
+    async for message in broker.stream(subscriber, keepalive=60):
+        if RESYNC in message:
+            return False
+        received += message.count(b"event: supply")
+        if received >= expected:
+            return True
+
+
+async def run(subscriber_count: int, event_count: int, rate: float, stalled: int, queue_size: int):
+    broker = PushBroker(queue_size=queue_size, max_subscribers=subscriber_count + stalled)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscribers = [broker.subscribe() for _ in range(subscriber_count)]
+    tasks = [asyncio.create_task(consume(broker, subscriber, event_count)) for subscriber in subscribers]
+    stuck = [broker.subscribe() for _ in range(stalled)]
+    await asyncio.sleep(0.1)
+    idle_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    published_at = []
+
+    def writer():
+        start = time.perf_counter()
+        for index in range(event_count):
+            # Hold a steady rate rather than bursting everything at once
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            broker.publish("supply", {"id": index % 100, "quantity": index})
+        published_at.append(time.perf_counter())
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=writer)
+    thread.start()
+    outcomes = await asyncio.gather(*tasks)
+    finished = time.perf_counter()
+    thread.join()
+
+    print(f"{subscriber_count} idle subscribers: {idle_bytes / subscriber_count / 1024:.1f} KiB each")
+    print(
+        f"{event_count} events at {rate:.0f}/s to {subscriber_count} subscribers: "
+        f"published in {(published_at[0] - started) * 1000:.0f} ms, "
+        f"last subscriber done {max(finished - published_at[0], 0) * 1000:.0f} ms later "
+        f"({event_count * subscriber_count / (finished - started):,.0f} deliveries/s)"
+    )
+    print(f"subscribers that kept up: {sum(outcomes)}/{subscriber_count}")
+    print(f"stalled subscribers resynced: {sum(subscriber.queue.get_nowait()[0] == RESYNC for subscriber in stuck)}/{stalled}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=500, help="events published per second")
+    parser.add_argument("--stalled", type=int, default=10)
+    parser.add_argument("--queue-size", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.events, args.rate, args.stalled, args.queue_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Concurrent usage-write throughput: old engine settings vs the SQLite
+profile, the old read-then-write record_usage vs the conditional
+decrement in services/usage.py, and the write-behind buffer (group
+commit, services/usage_buffer.py).
+
+Each run gets its own scratch database. --threads writers each record
+--writes usage entries while a reader thread keeps querying supplies.
+Reports writes/s, failed writes, lost updates (stock decrements missing
+compared to the usage log) and reader latency.
+
+    PYTHONPATH=. python benchmarks/bench_usage_writes.py
+    PYTHONPATH=. python benchmarks/bench_usage_writes.py --threads 32 --writes 100
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.database.db import Base, create_db_engine
+from backend.models import pricing, rollups, supplies  # noqa: F401  (register tables)
+from backend.models.supplies import Supplies, UsageHistory
+from backend.services.rollups import apply_usage_to_rollups
+from backend.services.usage import record_usage_entry
+from backend.services.usage_buffer import UsageBuffer
+
+SUPPLIES = 20
+
+
+def legacy_engine(url):
+    # database/db.py before the SQLite profile
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=30, max_overflow=50)
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA journal_mode=DELETE"))
+    return engine
+
+
+def seed(engine):
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all(Supplies(name=f"Supply {i}", category="Bench", quantity=10**9, primary_supplier="Bench") for i in range(SUPPLIES))
+        db.commit()
+
+
+# record_usage before the conditional decrement
+def read_then_write(Session, supply_id, quantity_used):
+    db = Session()
+    try:
+        supply = db.query(Supplies).filter(Supplies.id == supply_id).first()
+        supply.quantity -= quantity_used
+        entry = UsageHistory(supply_id=supply_id, quantity_used=quantity_used, timestamp=datetime.utcnow())
+        db.add(entry)
+        apply_usage_to_rollups(db, [(supply_id, quantity_used, entry.timestamp)])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def conditional(Session, supply_id, quantity_used):
+    with Session() as db:
+        record_usage_entry(db, supply_id, quantity_used)
+
+
+def buffered(buffer):
+    # Blocks like a commit-acknowledged POST /inventory/usage
+    def record_usage(Session, supply_id, quantity_used):
+        buffer.submit(supply_id, quantity_used).result()
+    return record_usage
+
+
+def lost_updates(Session):
+    with Session() as db:
+        decremented = db.scalar(select(func.sum(10**9 - Supplies.quantity)))
+        logged = db.scalar(select(func.count(UsageHistory.id)))
+    return logged - decremented
+
+
+def run(label, engine, record_usage, threads, writes):
+    seed(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    failures, read_latencies, done = [], [], threading.Event()
+
+    def writer(index):
+        for n in range(writes):
+            try:
+                record_usage(Session, (index + n) % SUPPLIES + 1, 1)
+            except Exception as exc:
+                failures.append(type(exc).__name__)
+
+    def reader():
+        while not done.is_set():
+            started = time.perf_counter()
+            with Session() as db:
+                db.query(Supplies).order_by(Supplies.id).limit(50).all()
+            read_latencies.append(time.perf_counter() - started)
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    reader_thread.join()
+
+    committed = threads * writes - len(failures)
+    read_latencies.sort()
+    p95 = read_latencies[int(len(read_latencies) * 0.95)] if read_latencies else 0
+    print(f"{label:>20}: {committed / elapsed:8.1f} writes/s  failed={len(failures)} {sorted(set(failures))}  "
+          f"lost={lost_updates(Session)}  "
+          f"reads={len(read_latencies)} p50={statistics.median(read_latencies) * 1000:.1f}ms p95={p95 * 1000:.1f}ms")
+    engine.dispose()
+
+
+def main(threads, writes):
+    print(f"{threads} writer threads x {writes} usage entries")
+    with tempfile.TemporaryDirectory() as directory:
+        run("legacy", legacy_engine(f"sqlite:///{os.path.join(directory, 'legacy.db')}"), read_then_write, threads, writes)
+        run("profile", create_db_engine(f"sqlite:///{os.path.join(directory, 'profile.db')}"), read_then_write, threads, writes)
+        run("profile+conditional", create_db_engine(f"sqlite:///{os.path.join(directory, 'conditional.db')}"), conditional, threads, writes)
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'buffered.db')}")
+        buffer = UsageBuffer(sessionmaker(bind=engine, autoflush=False))
+        run("write-behind buffer", engine, buffered(buffer), threads, writes)
+        buffer.shutdown()
+        print(f"{'':>20}  {buffer.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=100)
+    args = parser.parse_args()
+    main(args.threads, args.writes)
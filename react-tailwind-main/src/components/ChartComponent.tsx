@@ -25,6 +25,22 @@ ChartJS.register(
   Legend
 );
 
+const SAVINGS_MONTHS_SHOWN = 12;
+
+// ISO month key ("YYYY-MM") of the oldest month on the savings chart
+const firstChartMonth = () => {
+  const start = new Date();
+  start.setDate(1);
+  start.setMonth(start.getMonth() - (SAVINGS_MONTHS_SHOWN - 1));
+  return `${start.getFullYear()}-${String(start.getMonth() + 1).padStart(2, '0')}`;
+};
+
+// "2025-07" -> "Jul 2025"
+const formatMonth = (month: string) => {
+  const [year, monthIndex] = month.split('-').map(Number);
+  return new Date(year, monthIndex - 1, 1).toLocaleString('en-US', { month: 'short', year: 'numeric' });
+};
+
 const ChartComponent: React.FC = () => {
   const [usageData, setUsageData] = useState<any>(null);
   const [savingsData, setSavingsData] = useState<any>(null);
@@ -38,7 +54,9 @@ const ChartComponent: React.FC = () => {
       try {
         const [usageRes, savingsRes] = await Promise.all([
           axios.get('http://localhost:8000/inventory/usage/history'),
-          axios.get('http://localhost:8000/inventory/savings/history'),
+          axios.get('http://localhost:8000/inventory/savings/history', {
+            params: { from: firstChartMonth() },
+          }),
         ]);
 
         setUsageData(usageRes.data);
@@ -85,7 +103,7 @@ const ChartComponent: React.FC = () => {
   ];
 
   const savingsChartData = {
-    labels: savingsData?.months || [],
+    labels: (savingsData?.months || []).map(formatMonth),
     datasets: [
       {
         label: 'Cost Savings',
@@ -21,6 +21,33 @@ const RecommendationPage: React.FC = () => {
     };
 
     fetchRecommendations();
+
+    // Live updates: apply pushed alert changes and stock levels, reload after
+    // a reconnect or when the server says we fell behind
+    const events = new EventSource('http://localhost:8000/inventory/events');
+    let connected = false;
+    events.onopen = () => {
+      if (connected) fetchRecommendations();
+      connected = true;
+    };
+    events.addEventListener('resync', fetchRecommendations);
+    events.addEventListener('alert', (e: MessageEvent) => {
+      const { event_id, state, changed_at, ...alert } = JSON.parse(e.data);
+      setRecommendations((current) => {
+        const others = current.filter((rec) => !(rec.supply_id === alert.supply_id && rec.alert === alert.alert));
+        if (state === 'cleared') return others;
+        return [...others, alert].sort((a, b) => a.supply_id - b.supply_id);
+      });
+    });
+    events.addEventListener('supply', (e: MessageEvent) => {
+      const supply = JSON.parse(e.data);
+      if (supply.quantity === undefined) return;
+      setRecommendations((current) =>
+        current.map((rec) => (rec.supply_id === supply.id ? { ...rec, quantity: supply.quantity } : rec))
+      );
+    });
+
+    return () => events.close();
   }, []);
 
   return (
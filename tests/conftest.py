@@ -0,0 +1,71 @@
+"""
+Every test runs against a scratch SQLite database, created and seeded once
+per session by init_db (alice is user 1, Paper is supply 1), never against
+the developer's inventory.db.
+
+DATABASE_URL is pointed at it before anything from backend is imported, so
+the app's engines, SessionLocal/AsyncSessionLocal (including the references
+services took at import, like AlertSweeper's) and therefore get_db and
+get_async_db all use it. Tests that need an empty database of their own
+take scratch_session (or scratch_sessionmaker / scratch_engine) and seed
+their own rows.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+_directory = tempfile.mkdtemp(prefix="inventory-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'inventory.db')}"
+
+from backend.database.db import AppSession, Base, async_engine, create_db_engine, engine  # noqa: E402
+from backend.database.init_db import init_db  # noqa: E402
+from backend.models.supplies import Supplies  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def seeded_database():
+    init_db()
+    yield engine
+    engine.dispose()
+    if async_engine is not None:
+        asyncio.run(async_engine.dispose())
+    shutil.rmtree(_directory, ignore_errors=True)
+
+
+@pytest.fixture
+def scratch_engine(tmp_path):
+    """
+    An empty database of the test's own on tmp_path with every table created.
+    """
+    scratch = create_db_engine(f"sqlite:///{tmp_path / 'scratch.db'}")
+    Base.metadata.create_all(scratch)
+    yield scratch
+    scratch.dispose()
+
+
+@pytest.fixture
+def scratch_sessionmaker(scratch_engine):
+    return sessionmaker(bind=scratch_engine, autoflush=False, class_=AppSession)
+
+
+@pytest.fixture
+def scratch_session(scratch_sessionmaker):
+    session = scratch_sessionmaker()
+    yield session
+    session.close()
+
+
+def add_supply(Session, quantity):
+    """
+    Commit a supply with `quantity` in stock through a session from `Session`
+    and return its id.
+    """
+    with Session() as db:
+        supply = Supplies(name="Stress", category="Test", quantity=quantity, primary_supplier="Test")
+        db.add(supply)
+        db.commit()
+        return supply.id
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event
+
+from backend.database.db import SessionLocal
+from backend.main import app
+from backend.models.alerts import AlertThreshold
+from backend.models.supplies import Supplies
+from backend.routes.auth import create_access_token
+from backend.services.alerts import ALERT_RULES, AlertRule, evaluate_alert_rules
+from backend.services.rollups import apply_usage_to_rollups
+
+client = TestClient(app)
+
+NOW = datetime(2026, 3, 10, 12, 0)
+
+
+@pytest.fixture
+def db(scratch_session):
+    session = scratch_session
+    session.add_all([
+        Supplies(id=1, name="Paper", category="Office", quantity=150),
+        Supplies(id=2, name="Toner", category="Office", quantity=20),
+        Supplies(id=3, name="Milk", category="Kitchen", quantity=100, expiration_date=NOW + timedelta(days=3)),
+        Supplies(id=4, name="Yoghurt", category="Kitchen", quantity=100, expiration_date=NOW + timedelta(days=5)),
+        Supplies(id=5, name="Coffee", category="Kitchen", quantity=100, expiration_date=NOW + timedelta(days=30)),
+    ])
+    session.flush()
+    # Yoghurt moves fast enough; Milk doesn't
+    apply_usage_to_rollups(session, [(3, 10, NOW - timedelta(days=2)), (4, 40, NOW - timedelta(days=1)), (4, 5, NOW - timedelta(days=20))])
+    session.commit()
+    return session
+
+
+def labels(alerts):
+    return [(alert["supply_id"], alert["alert"]) for alert in alerts]
+
+
+def test_default_rules(db):
+    alerts = evaluate_alert_rules(db, now=NOW)
+    assert labels(alerts) == [(1, "Overstocking"), (2, "Low stock"), (3, "Nearing expiration with slow usage")]
+    expiring = alerts[2]
+    assert expiring["recent_weekly_usage"] == 10
+    assert expiring["expiration_date"] == NOW + timedelta(days=3)
+    assert expiring["quantity"] == 100
+
+
+def test_category_thresholds_override_defaults(db):
+    db.add_all([
+        AlertThreshold(category="Office", overstock_above=200, low_stock_below=10),
+        AlertThreshold(category="Kitchen", expiry_days=2, slow_usage_ratio=0.5, low_stock_below=101),
+    ])
+    db.commit()
+    assert labels(evaluate_alert_rules(db, now=NOW)) == [(3, "Low stock"), (4, "Low stock"), (5, "Low stock")]
+    db.get(AlertThreshold, "Kitchen").expiry_days = None  # back to the 7-day default, slow ratio stays 0.5
+    db.commit()
+    assert (4, "Nearing expiration with slow usage") in labels(evaluate_alert_rules(db, now=NOW))
+
+
+def test_overstock_and_low_stock_are_exclusive(db):
+    db.add(AlertThreshold(category="Office", low_stock_below=300))  # above the default overstock threshold
+    db.commit()
+    assert labels(evaluate_alert_rules(db, now=NOW))[:2] == [(1, "Overstocking"), (2, "Low stock")]
+
+
+def test_rules_run_as_one_query(db):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        evaluate_alert_rules(db, now=NOW)
+        extra = AlertRule("Out of stock", lambda a: a.quantity == 0)
+        assert labels(evaluate_alert_rules(db, now=NOW, rules=[*ALERT_RULES, extra]))[:1] == [(1, "Overstocking")]
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) == 2
+
+
+def test_threshold_endpoints():
+    token = create_access_token(
+        data={"sub": "1", "username": "alice", "first_name": "Alice", "last_name": "Smith", "role": "admin"},
+        expires_delta=timedelta(minutes=5),
+    )
+    try:
+        assert client.put("/inventory/alerts/thresholds/Test-Rules", json={"overstock_above": 5}).status_code == 401
+        response = client.put(
+            "/inventory/alerts/thresholds/Test-Rules",
+            json={"overstock_above": 5, "expiry_days": 3},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200
+        assert response.json() == {"category": "Test-Rules", "overstock_above": 5, "low_stock_below": None, "expiry_days": 3, "slow_usage_ratio": None}
+        assert response.json() in client.get("/inventory/alerts/thresholds").json()
+    finally:
+        with SessionLocal() as session:
+            session.execute(delete(AlertThreshold).where(AlertThreshold.category == "Test-Rules"))
+            session.commit()
@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+
+from backend.database.db import SessionLocal
+from backend.main import app
+from backend.models.alerts import AlertEvent, AlertState, AlertSweep
+from backend.models.supplies import Supplies
+from backend.routes.auth import create_access_token
+from backend.services import alert_state
+from backend.services.alert_state import active_alerts, refresh_alert_state, sweep_alert_state
+from backend.services.alerts import evaluate_alert_rules
+from backend.services.usage import record_usage_entry
+from backend.utils.pagination import encode_cursor
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def db(scratch_session):
+    return scratch_session
+
+
+def events(db):
+    return [(event.supply_id, event.alert, event.state) for event in db.scalars(select(AlertEvent).order_by(AlertEvent.id))]
+
+
+def test_usage_moves_alerts_incrementally(db):
+    db.add_all([Supplies(id=1, name="Paper", category="Office", quantity=101), Supplies(id=2, name="Pens", category="Office", quantity=500)])
+    db.commit()
+    refresh_alert_state(db)
+    db.commit()
+    assert events(db) == [(1, "Overstocking", "raised"), (2, "Overstocking", "raised")]
+
+    record_usage_entry(db, 1, 2)
+    assert events(db)[2:] == [(1, "Low stock", "raised"), (1, "Overstocking", "cleared")]
+    record_usage_entry(db, 2, 1)
+    assert events(db)[4:] == [(2, "Overstocking", "updated")]
+    assert db.get(AlertState, (2, "Overstocking")).quantity == 499
+    # The maintained state matches a full evaluation
+    assert active_alerts(db) == evaluate_alert_rules(db)
+
+
+def test_sweep_catches_time_based_alerts(db):
+    now = datetime.utcnow()
+    db.add(Supplies(id=1, name="Milk", category="Kitchen", quantity=100, expiration_date=now + timedelta(days=8)))
+    db.commit()
+    sweep_alert_state(db, now=now)
+    assert events(db) == []
+    # A day later it is within the 7-day window without any write touching it
+    assert sweep_alert_state(db, now=now + timedelta(days=1, hours=1)) == 1
+    assert events(db) == [(1, "Nearing expiration with slow usage", "raised")]
+    assert len(db.scalars(select(AlertSweep)).all()) == 2
+
+
+def test_sweep_prunes_old_events_but_keeps_the_newest(db):
+    now = datetime.utcnow()
+    db.add(Supplies(id=1, name="Paper", category="Office", quantity=500))
+    db.commit()
+    sweep_alert_state(db, now=now - timedelta(days=30))
+    db.get(Supplies, 1).quantity = 50
+    db.commit()
+    sweep_alert_state(db, now=now - timedelta(days=29))
+    assert len(events(db)) == 3
+    sweep_alert_state(db, now=now)
+    # Only the newest old event survives, so the cursor never goes backwards
+    assert events(db) == [(1, "Overstocking", "cleared")]
+    assert len(db.scalars(select(AlertSweep)).all()) == 1
+
+
+def test_sweep_diffs_under_the_write_lock(db, scratch_sessionmaker, monkeypatch):
+    db.add(Supplies(id=1, name="Paper", category="Office", quantity=101))
+    db.commit()
+    sweep_alert_state(db)
+    written = threading.Event()
+
+    def use_paper():
+        with scratch_sessionmaker() as other:
+            record_usage_entry(other, 1, 2)  # Overstocking -> Low stock
+        written.set()
+
+    writer = threading.Thread(target=use_paper)
+    evaluate = alert_state.evaluate_alert_rules
+
+    def evaluate_while_writing(*args, **kwargs):
+        alerts = evaluate(*args, **kwargs)
+        if not writer.is_alive() and not written.is_set():
+            writer.start()
+            # The usage write waits for the sweep instead of slipping in
+            # between its reads and its writes
+            assert not written.wait(0.3)
+        return alerts
+
+    monkeypatch.setattr(alert_state, "evaluate_alert_rules", evaluate_while_writing)
+    sweep_alert_state(db)
+    writer.join(10)
+    assert written.is_set()
+    db.expire_all()
+    assert active_alerts(db) == evaluate(db) == [{"supply_id": 1, "name": "Paper", "alert": "Low stock", "quantity": 99}]
+
+
+@pytest.fixture
+def admin():
+    token = create_access_token(
+        data={"sub": "1", "username": "alice", "first_name": "Alice", "last_name": "Smith", "role": "admin"},
+        expires_delta=timedelta(minutes=5),
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_alerts_change_feed(admin):
+    first = client.get("/inventory/alerts")
+    assert first.status_code == 200
+    cursor = first.headers["X-Next-Cursor"]
+    added = client.post("/inventory/supplies", json={"name": "Feed", "category": "Feed-Test", "quantity": 500, "expiration_date": None}, headers=admin)
+    assert added.status_code == 200
+    supply_id = added.json()["id"]
+    try:
+        changes = client.get("/inventory/alerts", params={"since": cursor})
+        assert [(change["supply_id"], change["alert"], change["state"]) for change in changes.json()] == [(supply_id, "Overstocking", "raised")]
+        assert {"supply_id": supply_id, "name": "Feed", "alert": "Overstocking", "quantity": 500} in client.get("/inventory/alerts").json()
+
+        client.put(f"/inventory/supplies/{supply_id}", json={"quantity": 100}, headers=admin)
+        later = client.get("/inventory/alerts", params={"since": changes.headers["X-Next-Cursor"]})
+        assert [(change["alert"], change["state"]) for change in later.json()] == [("Overstocking", "cleared")]
+        caught_up = client.get("/inventory/alerts", params={"since": later.headers["X-Next-Cursor"]})
+        assert caught_up.json() == [] and caught_up.headers["X-Next-Cursor"] == later.headers["X-Next-Cursor"]
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(AlertState).where(AlertState.supply_id == supply_id))
+            db.execute(delete(Supplies).where(Supplies.id == supply_id))
+            db.commit()
+
+
+def test_feed_rejects_bad_and_expired_cursors(monkeypatch):
+    assert client.get("/inventory/alerts", params={"since": "nope"}).status_code == 400
+    monkeypatch.setattr("backend.routes.inventory.oldest_event_id", lambda db: 10)
+    assert client.get("/inventory/alerts", params={"since": encode_cursor(3)}).status_code == 410
+    assert client.get("/inventory/alerts", params={"since": encode_cursor(9)}).status_code == 200
+
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.database.db import engines
+from backend.routes.auth import create_access_token
+from backend.utils.auth import invalidate_user, user_cache
+from backend.utils.cache import TTLCache
+
+client = TestClient(app)
+
+
+def bearer(username="alice", role="admin", user_id=1):
+    token = create_access_token(
+        data={"sub": str(user_id), "username": username, "first_name": "Alice", "last_name": "Smith", "role": role},
+        expires_delta=timedelta(minutes=5),
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def user_queries():
+    executed = []
+    listener = lambda conn, cursor, statement, *args: executed.append(statement) if "FROM users" in statement else None
+    for target in engines:
+        event.listen(target, "before_cursor_execute", listener)
+    yield executed
+    for target in engines:
+        event.remove(target, "before_cursor_execute", listener)
+
+
+def test_principal_built_from_claims(user_queries):
+    invalidate_user("alice")
+    first = client.get("/auth/users/me", headers=bearer())
+    second = client.get("/auth/users/me", headers=bearer())
+    assert first.status_code == second.status_code == 200
+    assert second.json()["username"] == "alice"
+    assert second.json()["role"] == "admin"
+    # Only the first request had to look up the user's status
+    assert len(user_queries) == 1
+
+
+def test_invalidation_forces_a_status_reload(user_queries):
+    client.get("/auth/users/me", headers=bearer())
+    user_queries.clear()
+    invalidate_user("alice")
+    client.get("/auth/users/me", headers=bearer())
+    assert len(user_queries) == 1
+
+
+def test_stale_role_claim_rejected():
+    invalidate_user("alice")
+    response = client.get("/auth/users/me", headers=bearer(role="employee"))
+    assert response.status_code == 401
+
+
+def test_unknown_user_rejected():
+    response = client.get("/auth/users/me", headers=bearer(username="nobody-here"))
+    assert response.status_code == 401
+
+
+def test_role_lookup_served_from_cache(user_queries):
+    invalidate_user("alice")
+    before = user_cache.stats()
+    assert client.get("/auth/role/alice").json() == {"role": "admin"}
+    assert client.get("/auth/role/alice").json() == {"role": "admin"}
+    after = user_cache.stats()
+    assert len(user_queries) == 1
+    assert after["hits"] - before["hits"] >= 1
+    assert after["misses"] - before["misses"] == 1
+
+
+def test_disabled_cache_always_reads_users(user_queries, monkeypatch):
+    monkeypatch.setattr(user_cache, "enabled", False)
+    client.get("/auth/role/alice")
+    client.get("/auth/role/alice")
+    assert len(user_queries) == 2
+
+
+def test_cache_is_bounded_lru():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.lookup("a")
+    cache.set("c", 3)
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stale_load_discarded_after_invalidation():
+    cache = TTLCache(maxsize=2, ttl=60)
+    token = cache.token()
+    cache.invalidate("a")
+    cache.set("a", "stale", token=token)
+    assert cache.lookup("a") == (False, None)
@@ -0,0 +1,161 @@
+import os
+import subprocess
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, update
+from sqlalchemy.orm import sessionmaker
+
+from backend.database.db import SessionLocal, engines
+from backend.main import app
+from backend.models.alerts import AlertState
+from backend.models.supplies import Supplies
+from backend.models.users import Users
+from backend.routes.auth import create_access_token
+from backend.services import data_version as data_version_module
+from backend.services.data_version import DataVersion, analytics_cache, data_version, etag_matches, read_data_version
+
+client = TestClient(app)
+
+ANALYTICS = [
+    "/inventory/recommendations",
+    "/inventory/alerts",
+    "/inventory/savings",
+    "/inventory/savings/history",
+    "/inventory/reports/usage-trends",
+]
+
+
+@pytest.fixture
+def db(scratch_session):
+    return scratch_session
+
+
+def test_committed_writes_bump_the_version(db):
+    epoch, start = read_data_version(db)
+    assert epoch and start == 0
+    db.add(Supplies(id=1, name="Paper", category="Office", quantity=10))
+    db.commit()
+    assert read_data_version(db) == (epoch, 1)
+
+    # Core statements count too
+    db.execute(update(Supplies.__table__).where(Supplies.id == 1).values(quantity=9))
+    db.commit()
+    assert read_data_version(db) == (epoch, 2)
+
+    db.execute(update(Supplies).where(Supplies.id == 1).values(quantity=1))
+    db.rollback()
+    db.add(Users(first_name="A", last_name="B", username="ab", password_hash="x", role="employee"))
+    db.commit()
+    db.commit()  # nothing written
+    assert read_data_version(db) == (epoch, 2)
+
+    # Only the app's sessions are tracked
+    with sessionmaker(bind=db.get_bind())() as other:
+        other.execute(update(Supplies).where(Supplies.id == 1).values(quantity=2))
+        other.commit()
+    assert read_data_version(db) == (epoch, 2)
+
+
+def test_version_can_move_after_the_commit(db, monkeypatch):
+    # What PostgreSQL does (there with nextval): the writing transaction never touches the counter
+    monkeypatch.setattr(data_version_module, "BUMP_IN_TRANSACTION", frozenset())
+    epoch, start = read_data_version(db)
+    db.add(Supplies(id=1, name="Paper", category="Office", quantity=10))
+    db.flush()
+    with db.get_bind().connect() as connection:
+        assert read_data_version(connection) == (epoch, start)
+    db.commit()
+    assert read_data_version(db) == (epoch, start + 1)
+    db.execute(update(Supplies).where(Supplies.id == 1).values(quantity=1))
+    db.rollback()
+    assert read_data_version(db) == (epoch, start + 1)
+
+
+def test_writes_from_other_processes_are_seen(db):
+    version = DataVersion(bind=db.get_bind(), check_seconds=3600)
+    epoch, start = version.current()
+    # A CLI writing to the same database, as another worker would
+    subprocess.run(
+        [sys.executable, "-m", "backend.services.rollups"],
+        cwd=Path(__file__).resolve().parents[1],
+        env={**os.environ, "DATABASE_URL": str(db.get_bind().url)},
+        check=True,
+        capture_output=True,
+    )
+    assert version.current() == (epoch, start)  # still within the check interval
+    version.check_seconds = 0
+    assert version.current() == (epoch, start + 1)
+
+
+def test_etag_matching():
+    etag = '"abc-1-20260101"'
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"abc-2-20260101"', etag)
+
+
+@pytest.fixture
+def statements():
+    executed = []
+    listener = lambda conn, cursor, statement, *args: executed.append(statement)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", listener)
+    yield executed
+    for target in engines:
+        event.remove(target, "before_cursor_execute", listener)
+
+
+@pytest.mark.parametrize("path", ANALYTICS)
+def test_unchanged_data_is_served_without_queries(path, statements, monkeypatch):
+    monkeypatch.setattr(data_version, "check_seconds", 3600)
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    statements.clear()
+
+    again = client.get(path)
+    assert again.content == first.content and again.headers["ETag"] == etag
+    assert again.headers.get("X-Next-Cursor") == first.headers.get("X-Next-Cursor")
+    revalidated = client.get(path, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert statements == []
+
+
+def test_writes_change_the_etag(monkeypatch):
+    # This process's own writes show up at once, not after the check interval
+    monkeypatch.setattr(data_version, "check_seconds", 3600)
+    token = create_access_token(
+        data={"sub": "1", "username": "alice", "first_name": "Alice", "last_name": "Smith", "role": "admin"},
+        expires_delta=timedelta(minutes=5),
+    )
+    etag = client.get("/inventory/alerts").headers["ETag"]
+    added = client.post(
+        "/inventory/supplies",
+        json={"name": "Versioned", "category": "Version-Test", "quantity": 500, "expiration_date": None},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    supply_id = added.json()["id"]
+    try:
+        response = client.get("/inventory/alerts", headers={"If-None-Match": etag})
+        assert response.status_code == 200 and response.headers["ETag"] != etag
+        assert any(alert["supply_id"] == supply_id for alert in response.json())
+    finally:
+        with SessionLocal() as session:
+            session.execute(delete(AlertState).where(AlertState.supply_id == supply_id))
+            session.execute(delete(Supplies).where(Supplies.id == supply_id))
+            session.commit()
+    # The cleanup is a write as well
+    assert client.get("/inventory/alerts", headers={"If-None-Match": response.headers["ETag"]}).status_code == 200
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(analytics_cache, "maxsize", 2)
+    for month in ("2025-01", "2025-02", "2025-03"):
+        assert client.get("/inventory/savings/history", params={"from": month}).status_code == 200
+    assert analytics_cache.stats()["size"] <= 2
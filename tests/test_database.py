@@ -0,0 +1,145 @@
+import asyncio
+import inspect
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend.database import db as database
+from backend.database.db import Base, create_db_engine, engine
+from backend.models import alerts, forecasts, pricing, rollups, supplies  # noqa: F401  (register tables)
+from backend.models.alerts import AlertState
+from backend.models.forecasts import ForecastSnapshot
+from backend.models.rollups import UsageDailyRollup
+from backend.models.supplies import Supplies, UsageHistory
+from backend.services.rollups import apply_usage_to_rollups
+
+
+def pragma(connection, name):
+    return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_sqlite_pragmas_applied_on_connect():
+    with engine.connect() as connection:
+        assert pragma(connection, "journal_mode") == "wal"
+        assert pragma(connection, "synchronous") == 1  # NORMAL
+        assert pragma(connection, "busy_timeout") == database.SQLITE_BUSY_TIMEOUT_MS
+        assert pragma(connection, "cache_size") == -database.SQLITE_CACHE_SIZE_KB
+        assert pragma(connection, "foreign_keys") == 1
+
+
+def test_sqlite_pool_sized_for_single_writer(tmp_path):
+    scratch = create_db_engine(f"sqlite:///{tmp_path / 'scratch.db'}")
+    try:
+        assert scratch.pool.size() == database.SQLITE_POOL_SIZE
+        with scratch.connect() as connection:
+            assert pragma(connection, "journal_mode") == "wal"
+    finally:
+        scratch.dispose()
+
+
+def test_async_url_uses_async_drivers():
+    assert database.async_database_url("sqlite:///inventory.db") == "sqlite+aiosqlite:///inventory.db"
+    assert database.async_database_url("postgresql://user@db/inventory") == "postgresql+asyncpg://user@db/inventory"
+    assert database.async_database_url("postgresql+psycopg2://user@db/inventory") == "postgresql+asyncpg://user@db/inventory"
+
+
+def test_unsupported_databases_are_refused(monkeypatch):
+    for url in ("mysql+pymysql://user@db/inventory", "mssql+pyodbc://user@db/inventory"):
+        with pytest.raises(ValueError, match="Unsupported database"):
+            create_db_engine(url)
+        with pytest.raises(ValueError, match="Unsupported database"):
+            database.create_async_db_engine(url)
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 31, 1))
+    with pytest.raises(ValueError, match="too old"):
+        create_db_engine("sqlite://")
+
+
+@pytest.fixture
+def async_stack(tmp_path, monkeypatch):
+    """
+    The async stack (ASYNC_DB=true) on a scratch SQLite file holding one supply.
+    """
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    scratch = create_db_engine(url)
+    Base.metadata.create_all(scratch)
+    with sessionmaker(bind=scratch)() as db:
+        db.add(Supplies(name="Paper", category="Office", quantity=5))
+        db.commit()
+    scratch.dispose()
+    async_scratch = database.create_async_db_engine(url)
+    monkeypatch.setattr(database, "ASYNC_DB_ENABLED", True)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(async_scratch, autoflush=False, expire_on_commit=False))
+    yield async_scratch
+    asyncio.run(async_scratch.dispose())
+
+
+def test_async_stack_defaults_to_postgresql_only():
+    assert not database.async_db_enabled("sqlite:///inventory.db", "auto")
+    assert database.async_db_enabled("postgresql://user@db/inventory", "auto")
+    assert database.async_db_enabled("sqlite:///inventory.db", "true")
+    assert not database.async_db_enabled("postgresql://user@db/inventory", "false")
+
+
+def count_supplies(category: str, db: Session = Depends(database.get_db)):
+    return db.scalar(select(func.count()).select_from(Supplies).where(Supplies.category == category))
+
+
+def test_db_handler_keeps_sync_handlers_by_default(monkeypatch):
+    monkeypatch.setattr(database, "ASYNC_DB_ENABLED", False)
+    endpoint = database.db_handler(count_supplies)
+    assert not inspect.iscoroutinefunction(endpoint)
+    db = sessionmaker(bind=engine)()
+    assert endpoint(category="packs", db=db) >= 1  # seeded Paper
+    assert not db.in_transaction()  # closed before the response is built
+    assert asyncio.run(database.run_in_session(lambda db: db.get(Supplies, 1))).name == "Paper"
+
+
+def test_db_handler_runs_on_the_async_stack(async_stack):
+    endpoint = database.db_handler(count_supplies)
+    assert inspect.iscoroutinefunction(endpoint)
+    app = FastAPI()
+    app.get("/count")(endpoint)
+    with TestClient(app) as client:
+        assert client.get("/count", params={"category": "Office"}).json() == 1
+        assert client.get("/count", params={"category": "Kitchen"}).json() == 0
+
+
+def test_run_in_session_on_the_async_stack(async_stack):
+    supply = asyncio.run(database.run_in_session(lambda db, supply_id: db.get(Supplies, supply_id), 1))
+    assert supply.name == "Paper"
+
+
+def test_async_session_applies_pragmas_and_closes(async_stack):
+    async def check():
+        dependency = database.get_async_db()
+        db = await dependency.__anext__()
+        assert (await db.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        await dependency.aclose()
+        assert not db.in_transaction()
+
+    asyncio.run(check())
+
+
+def test_deleting_a_supply_cascades(scratch_session):
+    db = scratch_session
+    now = datetime.utcnow()
+    supply = Supplies(name="Paper", category="Office", quantity=5)
+    db.add(supply)
+    db.flush()
+    db.add(UsageHistory(supply_id=supply.id, quantity_used=1, timestamp=now))
+    db.add(AlertState(supply_id=supply.id, alert="Low stock", name="Paper", quantity=5, raised_at=now, updated_at=now))
+    db.add(ForecastSnapshot(supply_id=supply.id, computed_at=now, recent_entries=1, entries=1))
+    apply_usage_to_rollups(db, [(supply.id, 1, now)])
+    db.commit()
+
+    db.delete(supply)
+    db.commit()
+    for model in (UsageHistory, UsageDailyRollup, AlertState, ForecastSnapshot):
+        assert db.scalar(select(func.count()).select_from(model)) == 0, model.__tablename__
@@ -0,0 +1,99 @@
+import csv
+import io
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from backend.main import app
+from backend.database.db import SessionLocal
+from backend.models.supplies import UsageHistory
+from backend.services import exports
+from backend.services.exports import EXPORT_COLUMNS
+
+client = TestClient(app)
+
+
+def usage_count(**conditions):
+    with SessionLocal() as db:
+        query = db.query(UsageHistory)
+        for condition in conditions.values():
+            query = query.filter(condition)
+        return query.count()
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(response.content.decode("utf-8"))))
+
+
+def test_csv_export_has_every_row(monkeypatch):
+    # Small batches so the stream really is produced in several chunks
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 2)
+    response = client.get("/inventory/reports/usage/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = read_csv(response)
+    assert rows[0] == EXPORT_COLUMNS
+    assert len(rows) - 1 == usage_count()
+    assert [row[2] for row in rows[1:]] == sorted(row[2] for row in rows[1:])
+
+
+def test_excel_matches_csv():
+    excel = client.get("/inventory/reports/usage/export", params={"format": "excel"})
+    assert excel.status_code == 200
+    sheet = load_workbook(io.BytesIO(excel.content), read_only=True).active
+    excel_rows = list(sheet.iter_rows(values_only=True))
+    csv_rows = read_csv(client.get("/inventory/reports/usage/export", params={"format": "csv"}))
+    assert list(excel_rows[0]) == EXPORT_COLUMNS
+    assert len(excel_rows) == len(csv_rows)
+    assert [(name, str(quantity)) for name, quantity, _ in excel_rows[1:]] == [(row[0], row[1]) for row in csv_rows[1:]]
+
+
+def test_export_filters():
+    with SessionLocal() as db:
+        entry = db.query(UsageHistory).filter(UsageHistory.timestamp.is_not(None)).first()
+    day = entry.timestamp.date()
+    rows = read_csv(client.get(
+        "/inventory/reports/usage/export",
+        params={"format": "csv", "supply_id": entry.supply_id, "start": day.isoformat(), "end": day.isoformat()},
+    ))
+    expected = usage_count(
+        supply=UsageHistory.supply_id == entry.supply_id,
+        start=UsageHistory.timestamp >= day,
+        end=UsageHistory.timestamp < day + timedelta(days=1),
+    )
+    assert expected >= 1
+    assert len(rows) - 1 == expected
+
+
+def test_pdf_export():
+    response = client.get("/inventory/reports/usage/export", params={"format": "pdf"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+
+
+def test_pdf_summary_only():
+    response = client.get("/inventory/reports/usage/export", params={"format": "pdf", "summary": True, "detail": False})
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+
+
+def test_pdf_rows_are_chunked_with_headers(monkeypatch):
+    monkeypatch.setattr(exports, "PDF_CHUNK_ROWS", 2)
+    rows = [[f"Supply {i}", i, "2024-01-01 00:00"] for i in range(5)]
+    tables = list(exports._table_chunks(EXPORT_COLUMNS, rows, [220, 100, 140]))
+    assert [len(table._cellvalues) for table in tables] == [3, 3, 2]
+    assert all(table._cellvalues[0] == EXPORT_COLUMNS and table.repeatRows == 1 for table in tables)
+
+
+def test_summary_matches_raw_usage():
+    with SessionLocal() as db:
+        summary = db.execute(exports.usage_summary_query()).all()
+        raw = db.query(UsageHistory.quantity_used).filter(UsageHistory.timestamp.is_not(None)).all()
+    values = [value for (value,) in raw]
+    assert sum(row[1] for row in summary) == len(values)
+    assert sum(row[2] for row in summary) == sum(values)
+    if values:
+        assert min(row[3] for row in summary) == min(values)
+        assert max(row[4] for row in summary) == max(values)
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from backend.main import app
+from backend.models.forecasts import ForecastSnapshot
+from backend.models.supplies import Supplies, UsageHistory
+from backend.services.forecasts import next_refresh, order_recommendations, refresh_forecasts, snapshot_age, usage_trends
+from backend.services.recommendations import calculate_order_recommendation, generate_usage_report
+from backend.services.rollups import apply_usage_to_rollups
+
+client = TestClient(app)
+
+NOW = datetime.utcnow().replace(microsecond=0)
+
+
+@pytest.fixture
+def db(scratch_session):
+    session = scratch_session
+    session.add_all([
+        Supplies(id=1, name="Paper", primary_supplier="Acme", category="Office", quantity=5),
+        Supplies(id=2, name="Toner", primary_supplier="Acme", category="Office", quantity=500),
+        Supplies(id=3, name="Milk", primary_supplier="Acme", category="Kitchen", quantity=20),
+        Supplies(id=4, name="Coffee", primary_supplier="Acme", category="Kitchen", quantity=0),
+    ])
+    session.flush()
+    events = [(1, 10 + day, NOW - timedelta(days=day)) for day in range(0, 28, 3)]
+    events += [(2, 1, NOW - timedelta(days=day)) for day in (1, 8, 15, 40)]
+    events += [(3, 4, NOW - timedelta(days=2)), (3, 200, NOW - timedelta(days=60))]
+    add_usage(session, events)
+    session.commit()
+    return session
+
+
+def add_usage(db, events):
+    db.add_all([UsageHistory(supply_id=supply_id, quantity_used=quantity, timestamp=timestamp) for supply_id, quantity, timestamp in events])
+    apply_usage_to_rollups(db, events)
+
+
+def snapshot(db):
+    rows = db.scalars(select(ForecastSnapshot).order_by(ForecastSnapshot.supply_id)).all()
+    return [{column.name: getattr(row, column.name) for column in ForecastSnapshot.__table__.columns} for row in rows]
+
+
+def test_snapshot_matches_live_recommendations(db):
+    assert snapshot_age(db) is None
+    assert refresh_forecasts(db, now=NOW, workers=1) == 4
+    assert snapshot_age(db, now=NOW) == timedelta(0)
+
+    recommendations, computed_at = order_recommendations(db)
+    assert computed_at == NOW
+    assert recommendations == calculate_order_recommendation(db, now=NOW)
+
+    rows = {row["supply_id"]: row for row in snapshot(db)}
+    assert rows[1]["recent_entries"] == 10 and rows[1]["avg_weekly_usage"] is not None
+    assert rows[3]["recent_entries"] == 1 and rows[3]["entries"] == 2 and rows[3]["max_usage"] == 200
+    assert rows[4]["recent_entries"] == 0 and rows[4]["avg_weekly_usage"] is None and rows[4]["entries"] == 0
+
+
+def test_process_pool_matches_in_process(db):
+    refresh_forecasts(db, now=NOW, workers=1)
+    in_process = snapshot(db)
+    assert refresh_forecasts(db, now=NOW, workers=2, chunk_size=1) == 4
+    assert snapshot(db) == in_process
+
+
+def test_stale_or_fresh_requests_compute_live(db):
+    refresh_forecasts(db, now=NOW - timedelta(hours=30))
+    # Stock is read live, even from the snapshot
+    db.execute(update(Supplies).where(Supplies.id == 1).values(quantity=1000))
+    db.commit()
+
+    recommendations, computed_at = order_recommendations(db, max_age_hours=48)
+    assert computed_at == NOW - timedelta(hours=30)
+    assert recommendations[0]["supply_id"] == 1 and recommendations[0]["current_stock"] == 1000
+
+    for kwargs in ({"max_age_hours": 26}, {"fresh": True}):
+        recommendations, computed_at = order_recommendations(db, **kwargs)
+        assert computed_at >= NOW
+        assert recommendations == calculate_order_recommendation(db, now=computed_at)
+
+
+def test_usage_trends_from_the_snapshot(db):
+    refresh_forecasts(db, now=NOW, workers=1)
+    report, computed_at = usage_trends(db)
+    assert computed_at == NOW
+    assert report == generate_usage_report(db)
+    assert report[2]["entries"] == 2 and report[2]["recent_usages"] == [200, 4]
+
+    # Usage since the refresh shows up after the next one, or when asked for
+    add_usage(db, [(3, 7, NOW + timedelta(minutes=1)), (4, 2, NOW + timedelta(minutes=1))])
+    db.commit()
+    assert usage_trends(db) == (report, NOW)
+    for kwargs in ({"max_age_hours": 0}, {"fresh": True}):
+        live, computed_at = usage_trends(db, **kwargs)
+        assert computed_at > NOW
+        assert live == generate_usage_report(db) != report
+        assert live[2]["entries"] == 3 and live[3]["entries"] == 1
+
+
+def test_next_refresh():
+    assert next_refresh(datetime(2026, 3, 10, 1, 30), "02:00") == datetime(2026, 3, 10, 2, 0)
+    assert next_refresh(datetime(2026, 3, 10, 2, 0), "02:00") == datetime(2026, 3, 11, 2, 0)
+    assert next_refresh(datetime(2026, 3, 10, 23, 59, 30), "00:00") == datetime(2026, 3, 11, 0, 0)
+
+
+def test_endpoint_reports_forecast_time():
+    for path in ("/inventory/recommendations", "/inventory/recommendations?fresh=true", "/inventory/reports/usage-trends?fresh=true"):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert datetime.fromisoformat(response.headers["X-Forecast-Computed-At"]) <= datetime.utcnow()
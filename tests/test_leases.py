@@ -0,0 +1,48 @@
+import threading
+from datetime import datetime, timedelta
+
+from backend.services.alert_state import AlertSweeper
+from backend.services.forecasts import ForecastScheduler
+from backend.services.leases import claim_lease
+
+NOW = datetime(2026, 3, 10, 2, 0)
+TTL = timedelta(minutes=5)
+
+
+def test_one_holder_at_a_time(scratch_session):
+    db = scratch_session
+    assert claim_lease(db, "job", "a", TTL, now=NOW)
+    assert not claim_lease(db, "job", "b", TTL, now=NOW + timedelta(minutes=1))
+    assert claim_lease(db, "job", "a", TTL, now=NOW + timedelta(minutes=2))  # renewed to 02:07
+    assert claim_lease(db, "other", "b", TTL, now=NOW)
+    assert not claim_lease(db, "job", "b", TTL, now=NOW + timedelta(minutes=6))
+    assert claim_lease(db, "job", "b", TTL, now=NOW + timedelta(minutes=7))
+
+
+def test_concurrent_claims_have_one_winner(scratch_sessionmaker):
+    results, lock = [], threading.Lock()
+
+    def claim(holder):
+        with scratch_sessionmaker() as db:
+            claimed = claim_lease(db, "job", holder, TTL, now=NOW)
+        with lock:
+            results.append(claimed)
+
+    threads = [threading.Thread(target=claim, args=(str(index),)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_one_worker_runs_each_job(scratch_sessionmaker):
+    refreshed = []
+    schedulers = [ForecastScheduler(scratch_sessionmaker) for _ in range(3)]
+    for scheduler in schedulers:
+        scheduler.refresh = lambda holder=scheduler.holder: refreshed.append(holder)
+        scheduler._refresh_logged()
+    assert refreshed == [schedulers[0].holder]
+
+    sweepers = [AlertSweeper(scratch_sessionmaker, interval=60) for _ in range(3)]
+    assert [sweeper._claim() for sweeper in sweepers] == [True, False, False]
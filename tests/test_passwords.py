@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+
+from backend.main import app
+from backend.database.db import SessionLocal
+from backend.models.users import UserRole, Users
+from backend.utils.auth import user_cache
+from backend.utils.passwords import BCRYPT_ROUNDS, PasswordPool, password_pool
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def legacy_user():
+    # Stored with a cheaper cost than the configured one
+    rounds = 4 if BCRYPT_ROUNDS != 4 else 5
+    with SessionLocal() as db:
+        db.query(Users).filter(Users.username == "rehash-me").delete()
+        db.add(Users(first_name="Re", last_name="Hash", username="rehash-me",
+                     password_hash=bcrypt.using(rounds=rounds).hash("hunter22"), role=UserRole.employee))
+        db.commit()
+    yield "rehash-me"
+    with SessionLocal() as db:
+        db.query(Users).filter(Users.username == "rehash-me").delete()
+        db.commit()
+
+
+def stored_hash(username):
+    with SessionLocal() as db:
+        return db.query(Users.password_hash).filter(Users.username == username).scalar()
+
+
+def test_login_with_seeded_user():
+    response = client.post("/auth/login", json={"username": "alice", "password": "securepassword123"})
+    assert response.status_code == 200
+    assert "access_token" in response.cookies
+
+
+def test_login_rejects_wrong_password():
+    response = client.post("/auth/login", json={"username": "alice", "password": "wrong"})
+    assert response.status_code == 401
+
+
+def test_login_rehashes_outdated_cost(legacy_user):
+    response = client.post("/auth/login", json={"username": legacy_user, "password": "hunter22"})
+    assert response.status_code == 200
+    new_hash = stored_hash(legacy_user)
+    assert bcrypt.from_string(new_hash).rounds == BCRYPT_ROUNDS
+    assert bcrypt.verify("hunter22", new_hash)
+
+
+def test_rehash_drops_the_cached_user(legacy_user):
+    assert client.get(f"/auth/role/{legacy_user}").status_code == 200
+    assert user_cache.lookup(legacy_user)[0]
+    assert client.post("/auth/login", json={"username": legacy_user, "password": "hunter22"}).status_code == 200
+    hit, user = user_cache.lookup(legacy_user)
+    assert not hit or user.password_hash == stored_hash(legacy_user)
+
+
+def test_saturated_pool_rejects_fast():
+    pool = PasswordPool(workers=0, queue_limit=0)
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(pool.hash("secret"))
+    assert excinfo.value.status_code == 503
+    assert pool.rejected == 1 and pool.pending == 0
+
+
+def test_login_returns_503_when_saturated(monkeypatch):
+    monkeypatch.setattr(password_pool, "queue_limit", 0)
+    response = client.post("/auth/login", json={"username": "alice", "password": "securepassword123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
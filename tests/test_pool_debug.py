@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from backend.main import app
+from backend.database.db import DB_POOL_TIMEOUT, async_engine, engine
+from backend.database.pool_debug import PoolMonitor
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def monitor():
+    monitor = PoolMonitor(hold_threshold=60)
+    monitor.attach(engine, "sync")
+    if async_engine is not None:
+        monitor.attach(async_engine.sync_engine, "async")
+    yield monitor
+    monitor.detach()
+
+
+def test_histogram_and_long_held_stacks(tmp_path):
+    scratch = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    monitor = PoolMonitor(hold_threshold=0)
+    monitor.attach(scratch, "scratch")
+    try:
+        with scratch.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            held = monitor.snapshot()
+            assert held["checked_out"] == 1
+            assert "test_histogram_and_long_held_stacks" in held["held_too_long"][0]["stack"]
+        released = monitor.snapshot()
+        assert released["checked_out"] == 0
+        assert released["checkouts"] == 1 and released["long_held"] == 1
+        assert sum(released["checkout_duration_histogram"].values()) == 1
+    finally:
+        monitor.detach()
+        scratch.dispose()
+
+
+@pytest.mark.parametrize("path", [
+    "/inventory/supplies",
+    "/inventory/supplies/1",
+    "/inventory/recommendations",
+    "/inventory/alerts",
+    "/inventory/savings",
+    "/inventory/savings/history",
+    "/inventory/usage/history",
+    "/inventory/reports/usage-trends",
+    "/inventory/reports/usage/export?format=csv",
+    "/auth/role/alice",
+])
+def test_endpoints_return_their_connections(path, monitor):
+    assert client.get(path).status_code == 200
+    stats = monitor.snapshot()
+    assert stats["checked_out"] == 0, stats
+
+
+def test_burst_beyond_threadpool_and_pool_does_not_deadlock():
+    # More concurrent requests than threadpool threads (40) and pooled
+    # connections: handlers must not hold a connection while waiting for a thread
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            requests = [client.get("/inventory/supplies/1") for _ in range(100)]
+            return await asyncio.wait_for(asyncio.gather(*requests), DB_POOL_TIMEOUT / 3)
+
+    assert all(response.status_code == 200 for response in asyncio.run(burst()))
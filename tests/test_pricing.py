@@ -0,0 +1,28 @@
+from sqlalchemy import event
+
+from backend.database.db import SessionLocal, engine
+from backend.models.supplies import Supplies
+from backend.services.pricing import DEFAULT_COST_PER_UNIT, CostProvider
+
+def test_prefetched_prices_need_no_session():
+    costs = CostProvider(prices={1: 0.25, 2: 3.0})
+    assert costs.get_costs([1, 2, 3]) == {1: 0.25, 2: 3.0, 3: DEFAULT_COST_PER_UNIT}
+    assert costs.get_cost(2) == 3.0
+
+
+def test_batch_lookup_is_one_query():
+    db = SessionLocal()
+    supply_ids = [supply_id for (supply_id,) in db.query(Supplies.id).all()]
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        costs = CostProvider(db)
+        first = costs.get_costs(supply_ids)
+        second = costs.get_costs(supply_ids)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+        db.close()
+    assert first == second
+    assert len(statements) == 1
+    assert all(cost is not None for cost in first.values())
@@ -0,0 +1,26 @@
+import pytest
+
+from backend.models.supplies import Supplies
+from backend.services.procurement import get_alternative_products, select_alternative_products
+
+
+@pytest.fixture
+def db(scratch_session):
+    session = scratch_session
+    session.add_all([
+        Supplies(id=1, name="Paper", category="Office", quantity=10),
+        Supplies(id=2, name="Pens", category="Office", quantity=5),
+        Supplies(id=3, name="Stapler", category="Office", quantity=0),
+        Supplies(id=4, name="Mystery", category=None, quantity=10),
+        Supplies(id=5, name="Unknown", category=None, quantity=10),
+    ])
+    session.commit()
+    return session
+
+
+def test_in_memory_alternatives_match_the_query(db):
+    supplies = db.query(Supplies).order_by(Supplies.id).all()
+    for supply in supplies:
+        assert select_alternative_products(supply, supplies) == get_alternative_products(supply, db)
+    # Uncategorised supplies are not alternatives for each other
+    assert select_alternative_products(supplies[3], supplies) == []
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.models.supplies import Supplies
+from backend.services import push
+from backend.services.alert_state import refresh_alert_state
+from backend.services.push import RESYNC, PushBroker
+from backend.services.usage import consume_supply, record_usage_entry
+from backend.utils.pagination import decode_cursor
+
+client = TestClient(app)
+
+
+def parse(chunk: bytes):
+    events = []
+    for message in chunk.decode().strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"]), fields.get("id")))
+    return events
+
+
+async def take(subscriber):
+    try:
+        return await subscriber.take(0.05)
+    except asyncio.TimeoutError:
+        return b""
+
+
+def test_publish_from_threads_fans_out():
+    async def scenario():
+        broker = PushBroker()
+        first, second = broker.subscribe(), broker.subscribe()
+        publisher = threading.Thread(target=broker.publish, args=("supply", {"id": 1, "quantity": 4}))
+        publisher.start()
+        publisher.join()
+        assert parse(await take(first)) == [("supply", {"id": 1, "quantity": 4}, None)]
+        assert len(parse(await take(second))) == 1
+        broker.unsubscribe(first)
+        broker.unsubscribe(second)
+        assert broker.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_burst_is_one_chunk():
+    async def scenario():
+        broker = PushBroker()
+        subscriber = broker.subscribe()
+        for quantity in range(3):
+            broker.publish("supply", {"id": 1, "quantity": quantity})
+        await asyncio.sleep(0)
+        assert subscriber.queue.qsize() == 1 and subscriber.unsent == 3
+        assert [data["quantity"] for _, data, _ in parse(await take(subscriber))] == [0, 1, 2]
+        assert subscriber.unsent == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_gets_resync():
+    async def scenario():
+        broker = PushBroker(queue_size=3)
+        slow = broker.subscribe()
+        for quantity in range(5):
+            broker.publish("supply", {"id": 1, "quantity": quantity})
+            await asyncio.sleep(0)
+        chunk = await take(slow)
+        assert chunk.startswith(RESYNC)
+        # Everything before the resync is covered by the client's reload
+        assert [data["quantity"] for _, data, _ in parse(chunk)[1:]] == [4]
+        assert broker.stats()["resyncs"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_stream_keeps_alive_and_unsubscribes():
+    async def scenario():
+        broker = PushBroker()
+        subscriber = broker.subscribe()
+        stream = broker.stream(subscriber, keepalive=0.01)
+        assert (await stream.__anext__()).startswith(b"retry:")
+        assert await stream.__anext__() == push.KEEPALIVE
+        broker.publish("supply", {"id": 2, "quantity": 1})
+        assert parse(await stream.__anext__())[0][0] == "supply"
+        await stream.aclose()
+        assert broker.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def db(scratch_session):
+    session = scratch_session
+    session.add(Supplies(id=1, name="Paper", category="Office", quantity=101))
+    session.flush()
+    refresh_alert_state(session)
+    session.commit()
+    return session
+
+
+def test_only_committed_changes_are_pushed(db):
+    broker = push.push_broker
+
+    async def scenario():
+        subscriber = broker.subscribe()
+        await asyncio.to_thread(record_usage_entry, db, 1, 2)
+        events = parse(await take(subscriber))
+        assert events[0] == ("supply", {"id": 1, "quantity": 99}, None)
+        alerts = [(data["alert"], data["state"], decode_cursor(event_id) == data["event_id"]) for name, data, event_id in events[1:]]
+        assert alerts == [("Low stock", "raised", True), ("Overstocking", "cleared", True)]
+
+        # Staged, then rolled back: nothing goes out
+        await asyncio.to_thread(consume_supply, db, 1, 5)
+        await asyncio.to_thread(db.rollback)
+        assert await take(subscriber) == b""
+        broker.unsubscribe(subscriber)
+
+    asyncio.run(scenario())
+
+
+def test_events_endpoint_refuses_when_full(monkeypatch):
+    monkeypatch.setattr(push.push_broker, "max_subscribers", 0)
+    response = client.get("/inventory/events")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,64 @@
+import pytest
+import sqlalchemy.exc
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.database.db import SessionLocal, engines
+from backend.models.supplies import Supplies
+from backend.services.data_version import analytics_cache, data_version
+
+client = TestClient(app)
+
+# Statement budget per endpoint. None of these may grow with the number of
+# supplies or usage rows, so a change that makes loading eager (or adds a
+# per-row query) trips the budget.
+QUERY_BUDGETS = {
+    "/inventory/supplies": 1,
+    "/inventory/supplies/1": 1,
+    "/inventory/alerts": 3,  # Feed cursor + alert_state; the first call per process also checks it was built
+    "/inventory/savings": 3,
+    "/inventory/reports/usage-trends": 4,  # Forecast snapshot; when stale or missing, the live statistics too
+    "/inventory/reports/usage-trends?fresh=true": 3,
+    "/inventory/recommendations": 4,  # Forecast snapshot; when stale or missing, the live forecast too
+    "/inventory/recommendations?fresh=true": 3,
+    "/inventory/savings/history": 1,
+    "/inventory/usage/history": 1,
+}
+
+
+@pytest.fixture
+def statements():
+    executed = []
+    listener = lambda conn, cursor, statement, *args: executed.append(statement)
+    # Async handlers (ASYNC_DB) run on their own engine
+    for target in engines:
+        event.listen(target, "before_cursor_execute", listener)
+    yield executed
+    for target in engines:
+        event.remove(target, "before_cursor_execute", listener)
+
+
+@pytest.mark.parametrize("path", sorted(QUERY_BUDGETS))
+def test_endpoint_query_budget(path, statements, monkeypatch):
+    analytics_cache.clear()  # budget the computation, not a cache hit
+    # The data version is re-read at most once per check interval, not per request
+    monkeypatch.setattr(data_version, "check_seconds", 3600)
+    data_version.current()
+    statements.clear()
+    response = client.get(path)
+    assert response.status_code == 200
+    assert len(statements) <= QUERY_BUDGETS[path], statements
+
+
+def test_usage_history_is_not_loaded_implicitly():
+    db = SessionLocal()
+    try:
+        supply = db.query(Supplies).first()
+        with pytest.raises(sqlalchemy.exc.InvalidRequestError):
+            supply.usage_history
+        loaded = db.query(Supplies).options(selectinload(Supplies.usage_history)).first()
+        assert isinstance(loaded.usage_history, list)
+    finally:
+        db.close()
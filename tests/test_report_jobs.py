@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.routes.auth import create_access_token
+from backend.services import report_jobs as report_jobs_module
+from backend.services.report_jobs import ReportJobQueue
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def queue(tmp_path, monkeypatch):
+    queue = ReportJobQueue(directory=str(tmp_path), workers=2)
+    monkeypatch.setattr("backend.routes.inventory.report_jobs", queue)
+    yield queue
+    queue.shutdown()
+
+
+def wait_for(job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/inventory/reports/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("report job did not finish")
+
+
+def test_job_renders_same_file_as_direct_export():
+    created = client.post("/inventory/reports/jobs", json={"format": "csv"})
+    assert created.status_code == 202
+    job = wait_for(created.json()["id"])
+    assert job["status"] == "done" and not job["cached"]
+    download = client.get(f"/inventory/reports/jobs/{job['id']}/download")
+    assert download.status_code == 200
+    assert download.headers["content-type"].startswith("text/csv")
+    assert download.content == client.get("/inventory/reports/usage/export", params={"format": "csv"}).content
+
+
+def test_identical_request_reuses_artifact():
+    first = wait_for(client.post("/inventory/reports/jobs", json={"format": "pdf", "summary": True}).json()["id"])
+    second = client.post("/inventory/reports/jobs", json={"format": "pdf", "summary": True}).json()
+    assert second["status"] == "done" and second["cached"]
+    assert second["id"] != first["id"]
+    assert second["download_url"].endswith(f"/inventory/reports/jobs/{second['id']}/download")
+    other = client.post("/inventory/reports/jobs", json={"format": "pdf"}).json()
+    assert not other["cached"]
+
+
+def test_data_change_invalidates_artifact(monkeypatch, queue):
+    wait_for(client.post("/inventory/reports/jobs", json={"format": "csv"}).json()["id"])
+    monkeypatch.setattr(report_jobs_module, "data_watermark", lambda db: ["changed"])
+    job = client.post("/inventory/reports/jobs", json={"format": "csv"}).json()
+    assert not job["cached"]
+    wait_for(job["id"])
+    # Only the newest rendering of a report is kept
+    assert len([name for name in os.listdir(queue.directory) if not name.endswith(".tmp")]) == 1
+
+
+def test_renaming_a_supply_invalidates_artifact():
+    token = create_access_token(
+        data={"sub": "1", "username": "alice", "first_name": "Alice", "last_name": "Smith", "role": "admin"},
+        expires_delta=timedelta(minutes=5),
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    wait_for(client.post("/inventory/reports/jobs", json={"format": "csv"}).json()["id"])
+    try:
+        assert client.put("/inventory/supplies/1", json={"name": "Printer Paper"}, headers=headers).status_code == 200
+        job = client.post("/inventory/reports/jobs", json={"format": "csv"}).json()
+        assert not job["cached"]
+        wait_for(job["id"])
+        assert b"Printer Paper" in client.get(f"/inventory/reports/jobs/{job['id']}/download").content
+    finally:
+        client.put("/inventory/supplies/1", json={"name": "Paper"}, headers=headers)
+
+
+def test_concurrent_identical_requests_share_a_job(monkeypatch):
+    release = threading.Event()
+
+    def slow_export(**options):
+        release.wait(10)
+        yield b"done"
+
+    monkeypatch.setattr(report_jobs_module, "stream_usage_export", slow_export)
+    first = client.post("/inventory/reports/jobs", json={"format": "excel", "supply_id": 1}).json()
+    second = client.post("/inventory/reports/jobs", json={"format": "excel", "supply_id": 1}).json()
+    assert second["id"] == first["id"]
+    assert client.get(f"/inventory/reports/jobs/{first['id']}/download").status_code == 409
+    release.set()
+    assert wait_for(first["id"])["status"] == "done"
+
+
+def test_failed_job_reports_error(monkeypatch):
+    def broken_export(**options):
+        raise RuntimeError("renderer exploded")
+        yield
+
+    monkeypatch.setattr(report_jobs_module, "stream_usage_export", broken_export)
+    job = wait_for(client.post("/inventory/reports/jobs", json={"format": "csv", "supply_id": 2}).json()["id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "renderer exploded"
+
+
+def test_unknown_job():
+    assert client.get("/inventory/reports/jobs/nope").status_code == 404
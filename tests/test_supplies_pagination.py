@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_cursor_pages_cover_every_supply_once():
+    everything = [s["id"] for s in client.get("/inventory/supplies", params={"limit": 500}).json()]
+    seen, params = [], {"limit": 1}
+    while True:
+        response = client.get("/inventory/supplies", params=params)
+        seen += [s["id"] for s in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 1, "cursor": cursor}
+    assert seen == everything
+
+
+def test_after_id_skips_earlier_rows():
+    supplies = client.get("/inventory/supplies", params={"after_id": 1}).json()
+    assert all(s["id"] > 1 for s in supplies)
+
+
+def test_fields_projection():
+    supplies = client.get("/inventory/supplies", params={"fields": "name,quantity"}).json()
+    assert supplies and all(set(s) == {"id", "name", "quantity"} for s in supplies)
+
+
+def test_invalid_cursor_and_fields_rejected():
+    assert client.get("/inventory/supplies", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/inventory/supplies", params={"fields": "password"}).status_code == 400
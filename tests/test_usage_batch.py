@@ -0,0 +1,120 @@
+import json
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select
+
+from backend.database.db import SessionLocal
+from backend.main import app
+from backend.models.alerts import AlertState
+from backend.models.rollups import UsageDailyRollup, UsageMonthlyRollup
+from backend.models.supplies import Supplies, UsageHistory
+from backend.routes.auth import create_access_token
+from backend.services import usage
+
+client = TestClient(app)
+
+
+def bearer():
+    token = create_access_token(
+        data={"sub": "1", "username": "alice", "first_name": "Alice", "last_name": "Smith", "role": "admin"},
+        expires_delta=timedelta(minutes=5),
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def stock():
+    """
+    Two scratch supplies with 10 and 5 units, removed with their usage afterwards.
+    """
+    with SessionLocal() as db:
+        supplies = [Supplies(name="Batch", category="Test", quantity=quantity) for quantity in (10, 5)]
+        db.add_all(supplies)
+        db.commit()
+        ids = [supply.id for supply in supplies]
+    yield ids
+    with SessionLocal() as db:
+        for model in (UsageHistory, UsageDailyRollup, UsageMonthlyRollup, AlertState, Supplies):
+            column = model.id if model is Supplies else model.supply_id
+            db.execute(delete(model).where(column.in_(ids)))
+        db.commit()
+
+
+def state(ids):
+    with SessionLocal() as db:
+        quantities = [db.get(Supplies, supply_id).quantity for supply_id in ids]
+        logged = [
+            db.scalar(select(func.coalesce(func.sum(UsageHistory.quantity_used), 0)).where(UsageHistory.supply_id == supply_id))
+            for supply_id in ids
+        ]
+    return quantities, logged
+
+
+def post(events, mode="atomic", ndjson=False):
+    headers = bearer()
+    if ndjson:
+        headers["Content-Type"] = "application/x-ndjson"
+        body = "\n".join(event if isinstance(event, str) else json.dumps(event) for event in events)
+    else:
+        headers["Content-Type"] = "application/json"
+        body = json.dumps(events)
+    return client.post("/inventory/usage/batch", params={"mode": mode}, content=body, headers=headers)
+
+
+def test_batch_aggregates_decrements(stock):
+    first, second = stock
+    events = [{"supply_id": first, "quantity_used": 2}, {"supply_id": second, "quantity_used": 1}, {"supply_id": first, "quantity_used": 3}]
+    response = post(events)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["accepted"] == 3 and body["rejected"] == 0
+    assert [result["status"] for result in body["results"]] == ["accepted"] * 3
+    assert len({result["id"] for result in body["results"]}) == 3
+    assert state(stock) == ([5, 4], [5, 1])
+
+
+def test_atomic_batch_rejects_everything(stock):
+    first, second = stock
+    events = [{"supply_id": first, "quantity_used": 2}, {"supply_id": second, "quantity_used": 6}, {"supply_id": first, "quantity_used": 0}]
+    response = post(events)
+    assert response.status_code == 422
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["skipped", "skipped", "rejected"]
+    assert state(stock) == ([10, 5], [0, 0])
+
+
+def test_atomic_batch_reports_stock_failures(stock):
+    first, second = stock
+    response = post([{"supply_id": first, "quantity_used": 2}, {"supply_id": second, "quantity_used": 6}])
+    assert response.status_code == 422
+    assert [result["status"] for result in response.json()["results"]] == ["skipped", "rejected"]
+    assert response.json()["results"][1]["error"] == "Insufficient supply quantity"
+    assert state(stock) == ([10, 5], [0, 0])
+
+
+def test_partial_batch_applies_what_fits(stock):
+    first, second = stock
+    events = [
+        {"supply_id": second, "quantity_used": 3},
+        {"supply_id": second, "quantity_used": 3},  # only 2 left by now
+        {"supply_id": second, "quantity_used": 2},
+        {"supply_id": 987654, "quantity_used": 1},
+        '{"supply_id": ',
+        {"supply_id": first, "quantity_used": 4},
+    ]
+    response = post(events, mode="partial", ndjson=True)
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["accepted", "rejected", "accepted", "rejected", "rejected", "accepted"]
+    assert body["results"][3]["error"] == "Supply not found"
+    assert body["results"][4]["error"] == "Invalid JSON"
+    assert state(stock) == ([6, 0], [4, 5])
+
+
+def test_batch_limits(monkeypatch):
+    assert post({"supply_id": 1, "quantity_used": 1}).status_code == 400
+    monkeypatch.setattr(usage, "MAX_USAGE_BATCH", 2)
+    assert post([{"supply_id": 1, "quantity_used": 1}] * 3).status_code == 413
+    assert client.post("/inventory/usage/batch", json=[]).status_code == 401
@@ -0,0 +1,172 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select
+
+from backend.database.db import SessionLocal
+from backend.main import app
+from backend.models.alerts import AlertState
+from backend.models.rollups import UsageDailyRollup, UsageMonthlyRollup
+from backend.models.supplies import Supplies, UsageHistory
+from backend.routes.auth import create_access_token
+from backend.services.usage_buffer import UsageBuffer
+from tests.conftest import add_supply
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def Session(scratch_sessionmaker):
+    return scratch_sessionmaker
+
+
+def test_concurrent_events_share_commits(Session):
+    supply_id = add_supply(Session, 1000)
+    buffer = UsageBuffer(Session, window_ms=20)
+    futures, lock = [], threading.Lock()
+
+    def producer():
+        for _ in range(20):
+            future = buffer.submit(supply_id, 1)
+            with lock:
+                futures.append(future)
+            future.result(10)
+
+    threads = [threading.Thread(target=producer) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.shutdown()
+
+    assert len({future.result() for future in futures}) == 200
+    stats = buffer.stats()
+    assert stats["flushed_events"] == 200 and stats["depth"] == 0
+    assert stats["flushes"] < 200  # events were grouped
+    with Session() as db:
+        assert db.get(Supplies, supply_id).quantity == 800
+        assert db.scalar(select(func.count(UsageHistory.id))) == 200
+
+
+def test_rejections_come_back_per_event(Session):
+    supply_id = add_supply(Session, 3)
+    buffer = UsageBuffer(Session, window_ms=50)
+    ok, short, missing = buffer.submit(supply_id, 2), buffer.submit(supply_id, 2), buffer.submit(424242, 1)
+    assert ok.result(10)
+    with pytest.raises(HTTPException) as raised:
+        short.result(10)
+    assert raised.value.status_code == 400
+    with pytest.raises(HTTPException) as raised:
+        missing.result(10)
+    assert raised.value.status_code == 404
+    buffer.shutdown()
+    assert buffer.stats()["rejected_events"] == 2
+
+
+def test_full_buffer_applies_backpressure(Session):
+    supply_id = add_supply(Session, 10)
+    buffer = UsageBuffer(Session, window_ms=60_000, capacity=2)
+    buffer.submit(supply_id, 1)
+    buffer.submit(supply_id, 1)
+    with pytest.raises(HTTPException) as raised:
+        buffer.submit(supply_id, 1)
+    assert raised.value.status_code == 503
+    assert raised.value.headers["Retry-After"]
+    assert buffer.stats()["refused_events"] == 1
+    buffer.shutdown()
+
+
+def test_shutdown_flushes_queued_events(Session):
+    supply_id = add_supply(Session, 10)
+    buffer = UsageBuffer(Session, window_ms=60_000)
+    queued = [buffer.submit(supply_id, 1) for _ in range(5)]
+    buffer.shutdown()
+    assert all(future.done() and future.exception() is None for future in queued)
+    with Session() as db:
+        assert db.get(Supplies, supply_id).quantity == 5
+    with pytest.raises(HTTPException):
+        buffer.submit(supply_id, 1)
+
+
+def test_cancelled_handlers_do_not_stop_the_flusher(Session):
+    supply_id = add_supply(Session, 10)
+    flushing, release = threading.Event(), threading.Event()
+
+    def blocking_session():
+        flushing.set()
+        release.wait(10)
+        return Session()
+
+    buffer = UsageBuffer(blocking_session, window_ms=60_000, max_batch=3)
+    # Cancelled while queued: dropped
+    abandoned = buffer.submit(supply_id, 1)
+    assert abandoned.cancel()
+    taken = [buffer.submit(supply_id, 1), buffer.submit(supply_id, 1)]
+    assert flushing.wait(10)
+    # Cancelled once its group is being flushed: still recorded
+    assert not taken[0].cancel()
+    release.set()
+    assert all(future.result(10) for future in taken)
+    later = buffer.submit(supply_id, 1)
+    buffer.shutdown()
+    assert later.result(0)
+    assert buffer.stats()["cancelled_events"] == 1
+    with Session() as db:
+        assert db.get(Supplies, supply_id).quantity == 7
+
+
+def test_crashed_flush_fails_its_group_and_keeps_going(Session, monkeypatch):
+    supply_id = add_supply(Session, 10)
+    buffer = UsageBuffer(Session, window_ms=1)
+    flush = buffer._flush
+
+    def crash_once(group):
+        monkeypatch.setattr(buffer, "_flush", flush)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(buffer, "_flush", crash_once)
+    with pytest.raises(RuntimeError):
+        buffer.submit(supply_id, 1).result(10)
+    assert buffer.submit(supply_id, 1).result(10)
+    buffer.shutdown()
+    assert buffer.stats()["in_flight"] == 0
+
+
+def test_ack_mode_must_be_known(Session):
+    with pytest.raises(ValueError):
+        UsageBuffer(Session, ack="whenever")
+
+
+@pytest.mark.parametrize("ack, expected_status", [("commit", 200), ("enqueue", 202)])
+def test_record_usage_through_buffer(monkeypatch, ack, expected_status):
+    with SessionLocal() as db:
+        supply = Supplies(name="Buffered", category="Test", quantity=5)
+        db.add(supply)
+        db.commit()
+        supply_id = supply.id
+    buffer = UsageBuffer(SessionLocal, window_ms=1, ack=ack)
+    monkeypatch.setattr("backend.routes.inventory.usage_buffer", buffer)
+    token = create_access_token(
+        data={"sub": "1", "username": "alice", "first_name": "Alice", "last_name": "Smith", "role": "admin"},
+        expires_delta=timedelta(minutes=5),
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        response = client.post("/inventory/usage", json={"supply_id": supply_id, "quantity_used": 2}, headers=headers)
+        assert response.status_code == expected_status
+        assert response.json() == {"supply_id": supply_id, "quantity_used": 2}
+        if ack == "commit":
+            short = client.post("/inventory/usage", json={"supply_id": supply_id, "quantity_used": 9}, headers=headers)
+            assert short.status_code == 400
+        buffer.shutdown()
+        with SessionLocal() as db:
+            assert db.get(Supplies, supply_id).quantity == 3
+    finally:
+        with SessionLocal() as db:
+            for model in (UsageHistory, UsageDailyRollup, UsageMonthlyRollup, AlertState):
+                db.execute(delete(model).where(model.supply_id == supply_id))
+            db.execute(delete(Supplies).where(Supplies.id == supply_id))
+            db.commit()
@@ -0,0 +1,38 @@
+from datetime import date
+
+from fastapi.testclient import TestClient
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_default_shape_is_daily_parallel_arrays():
+    history = client.get("/inventory/usage/history").json()
+    assert set(history) == {"dates", "values"}
+    assert len(history["dates"]) == len(history["values"])
+    assert history["dates"] == sorted(history["dates"])
+
+
+def test_weekly_buckets_start_on_monday():
+    history = client.get("/inventory/usage/history", params={"granularity": "week"}).json()
+    assert all(date.fromisoformat(day).weekday() == 0 for day in history["dates"])
+
+
+def test_granularities_cover_the_same_total():
+    daily = client.get("/inventory/usage/history").json()
+    monthly = client.get("/inventory/usage/history", params={"granularity": "month"}).json()
+    assert sum(daily["values"]) == sum(monthly["values"])
+
+
+def test_date_range_is_inclusive():
+    daily = client.get("/inventory/usage/history").json()
+    if not daily["dates"]:
+        return
+    day = daily["dates"][-1]
+    window = client.get("/inventory/usage/history", params={"start": day, "end": day}).json()
+    assert window == {"dates": [day], "values": daily["values"][-1:]}
+
+
+def test_unknown_granularity_rejected():
+    response = client.get("/inventory/usage/history", params={"granularity": "year"})
+    assert response.status_code == 422
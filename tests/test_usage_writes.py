@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from backend.models.rollups import UsageDailyRollup
+from backend.models.supplies import Supplies, UsageHistory
+from backend.services import usage
+from backend.services.usage import record_usage_entry
+from tests.conftest import add_supply
+
+THREADS = 8
+WRITES_PER_THREAD = 25
+
+
+@pytest.fixture
+def Session(scratch_sessionmaker):
+    return scratch_sessionmaker
+
+
+def hammer(Session, supply_id):
+    outcomes, lock = [], threading.Lock()
+
+    def writer():
+        for _ in range(WRITES_PER_THREAD):
+            with Session() as db:
+                try:
+                    record_usage_entry(db, supply_id, 1)
+                    outcome = "ok"
+                except HTTPException as exc:
+                    outcome = exc.status_code
+            with lock:
+                outcomes.append(outcome)
+
+    threads = [threading.Thread(target=writer) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def totals(Session, supply_id):
+    with Session() as db:
+        quantity = db.get(Supplies, supply_id).quantity
+        logged = db.scalar(select(func.coalesce(func.sum(UsageHistory.quantity_used), 0)).where(UsageHistory.supply_id == supply_id))
+        rolled_up = db.scalar(select(func.coalesce(func.sum(UsageDailyRollup.total_used), 0)).where(UsageDailyRollup.supply_id == supply_id))
+    return quantity, logged, rolled_up
+
+
+def test_concurrent_usage_has_no_lost_updates(Session):
+    initial = THREADS * WRITES_PER_THREAD * 2
+    supply_id = add_supply(Session, initial)
+    outcomes = hammer(Session, supply_id)
+    assert outcomes.count("ok") == THREADS * WRITES_PER_THREAD, outcomes
+    quantity, logged, rolled_up = totals(Session, supply_id)
+    assert quantity == initial - THREADS * WRITES_PER_THREAD
+    assert logged == rolled_up == THREADS * WRITES_PER_THREAD
+
+
+def test_concurrent_usage_never_oversells(Session):
+    stock = THREADS * WRITES_PER_THREAD // 2
+    supply_id = add_supply(Session, stock)
+    outcomes = hammer(Session, supply_id)
+    assert outcomes.count("ok") == stock
+    assert outcomes.count(400) == THREADS * WRITES_PER_THREAD - stock
+    assert totals(Session, supply_id) == (0, stock, stock)
+
+
+def test_missing_supply_is_404(Session):
+    with Session() as db, pytest.raises(HTTPException) as raised:
+        record_usage_entry(db, 12345, 1)
+    assert raised.value.status_code == 404
+
+
+def test_busy_database_is_retried(Session, scratch_engine, monkeypatch):
+    retries = []
+    monkeypatch.setattr(usage, "_backoff", lambda attempt: retries.append(attempt) or 0.05)
+    supply_id = add_supply(Session, 10)
+    blocker = sqlite3.connect(scratch_engine.url.database, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")  # hold the write lock past the busy timeout
+    release = threading.Timer(0.15, blocker.commit)
+    release.start()
+    try:
+        with Session() as db:
+            # Lock waits shorter than the blocker, so the first attempt fails with SQLITE_BUSY
+            db.connection().exec_driver_sql("PRAGMA busy_timeout=20")
+            record_usage_entry(db, supply_id, 3)
+    finally:
+        release.join()
+        blocker.close()
+    assert retries
+    assert totals(Session, supply_id) == (7, 3, 3)